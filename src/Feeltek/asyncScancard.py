@@ -0,0 +1,246 @@
+"""
+This code contains the asyncio-native client of the feeltek scancard TCP service.
+AsyncScancard offers the same command surface as Scancard, as coroutines on asyncio
+streams. Requests from concurrent coroutines are written to one persistent connection
+without waiting for earlier replies and are matched to replies in order by a single
+reader task, so waiting on the card never occupies a thread. Qt code drives it through
+utils.helpers.QtAsyncBridge. Like Scancard, it never resends a command in
+NON_IDEMPOTENT_COMMANDS once its request was written.
+
+The client is opt-in: the layer engine and the UI still use the threaded Scancard,
+whose command queue, parameter cache and status service AsyncScancard does not share.
+
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from Feeltek.connectionPool import NON_IDEMPOTENT_COMMANDS, RequestSentError
+from Feeltek.jsonStreamReader import JsonStreamReader
+
+
+class AsyncScancard:
+    """
+    asyncio client for the scancard.
+    Attributes:
+        HOST: The host address.
+        PORT: The port number.
+        timeout: The reply timeout in seconds.
+        retries: Attempts per command on connection errors.
+        retry_delay: Delay in seconds between attempts.
+    Methods:
+        connect(self): Opens the connection and starts the reader task.
+        close(self): Closes the connection and fails unanswered requests.
+        execute_command(self, cmd, data): Sends a command and returns its result.
+        get_working_status(self): Gets the working status text.
+        open_file, close_file, start_mark, stop_mark, ...: Same commands as Scancard.
+    """
+
+    STATUS_MAP = {
+        0: "Waiting",
+        1: "Marking",
+        2: "Previewing",
+        3: "Already working"
+    }
+
+    def __init__(self, host: str = "localhost", port: int = 50000, timeout: float = 5,
+                 retries: int = 3, retry_delay: float = 1.0):
+        self.HOST = host
+        self.PORT = port
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.current_file = None
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        """Open the connection and start the reader task, if not already connected."""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.HOST, self.PORT), timeout=self.timeout)
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_replies(self._reader))
+
+    async def close(self):
+        """Close the connection and fail any unanswered requests."""
+        self._drop_connection(ConnectionResetError("Connection closed by client"))
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+    def _drop_connection(self, error: Exception):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        """Match replies to pending requests in order, for as long as the connection lives."""
+        framer = JsonStreamReader()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    raise ConnectionResetError("Connection closed by scancard host")
+                if reader is not self._reader:
+                    # Superseded by a reconnect; late replies belong to dropped requests
+                    return
+                framer.feed(data)
+                document = framer.next_document()
+                while document is not None:
+                    if self._pending:
+                        future = self._pending.popleft()
+                        if not future.done():
+                            future.set_result(document)
+                    document = framer.next_document()
+        except asyncio.CancelledError:
+            raise
+        except (OSError, ValueError) as e:
+            if reader is self._reader:
+                self._drop_connection(e)
+
+    async def _request(self, payload: bytes) -> Dict[str, Any]:
+        await self.connect()
+        future = asyncio.get_running_loop().create_future()
+        # No await between the write and the append, so pending order matches write order
+        self._writer.write(payload)
+        self._pending.append(future)
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError as e:
+            # A late reply would be matched to the next request; resynchronise by reconnecting
+            self._drop_connection(asyncio.TimeoutError("Scancard reply timed out"))
+            raise RequestSentError("Scancard reply timed out") from e
+        except (OSError, ValueError) as e:
+            raise RequestSentError(f"Connection failed after the request was sent: {e}") from e
+
+    async def execute_command(self, cmd: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Send a command and wait for its reply.
+
+        Returns:
+            dict: {"ret_value": ..., "response": ...} like Scancard.execute_command, or
+                {"ret_value": -1, "error": ...} once all retries failed or the reply to a
+                non-idempotent command was lost.
+        """
+        payload = json.dumps({"sid": 0, "cmd": cmd, "data": data} if data else {"sid": 0, "cmd": cmd}).encode()
+        for attempt in range(self.retries):
+            try:
+                response_data = await self._request(payload)
+                return {"ret_value": response_data.get("ret"), "response": response_data}
+            except (asyncio.TimeoutError, OSError, ValueError) as e:
+                if isinstance(e, RequestSentError) and cmd in NON_IDEMPOTENT_COMMANDS:
+                    # The card may have run it; sending it again could e.g. mark twice
+                    return {"ret_value": -1, "error": f"Reply to {cmd} lost, not resent: {e}"}
+                if attempt + 1 < self.retries:
+                    await asyncio.sleep(self.retry_delay)
+        return {"ret_value": -1, "error": "Command failed after retries"}
+
+    async def get_working_status(self) -> str:
+        """Get the working status text."""
+        try:
+            response_data = await self._request(json.dumps({"sid": 0, "cmd": "get_working_status"}).encode())
+        except (asyncio.TimeoutError, OSError, ValueError) as e:
+            return f"Connection to {self.HOST}:{self.PORT} failed: {e}"
+        return self.STATUS_MAP.get(response_data.get("ret"), "Unknown")
+
+    async def open_file(self, file_path: str):
+        """Open a file on the scancard."""
+        self.current_file = file_path
+        return await self.execute_command("open_file", {"path": file_path})
+
+    async def close_file(self):
+        """Close the current file."""
+        self.current_file = None
+        return await self.execute_command("close_file")
+
+    async def save_file(self, file_path: str, cover: bool):
+        """Save a file on the scancard."""
+        return await self.execute_command("save_file", {"path": file_path, "cover": 1 if cover else 0})
+
+    async def start_mark(self):
+        """Start the marking process."""
+        return await self.execute_command("start_mark")
+
+    async def stop_mark(self):
+        """Stop the marking process."""
+        return await self.execute_command("stop_mark")
+
+    async def start_preview(self):
+        """Start preview mode."""
+        return await self.execute_command("start_preview")
+
+    async def stop_preview(self):
+        """Stop preview mode."""
+        return await self.execute_command("stop_preview")
+
+    async def get_markParameters_by_layer(self, layer_id: int):
+        """Get marking parameters for a layer."""
+        return await self.execute_command("get_markParameters_by_layer", {"layer_id": layer_id})
+
+    async def set_markParameters_by_layer(self, layer_id: int, params: Dict[str, Any]):
+        """Set marking parameters for a layer."""
+        return await self.execute_command("set_markParameters_by_layer", {"layer_id": layer_id, **params})
+
+    async def get_markParameters_by_index(self, index: int, in_index: int):
+        """Get marking parameters by index."""
+        return await self.execute_command("get_markParameters_by_index", {"index": index, "in_index": in_index})
+
+    async def set_markParameters_by_index(self, index: int, in_index: int, params: Dict[str, Any]):
+        """Set marking parameters by index."""
+        return await self.execute_command("set_markParameters_by_index", {"index": index, "in_index": in_index, **params})
+
+    async def download_parameters(self):
+        """Download marking parameters."""
+        return await self.execute_command("download_Parameters")
+
+    async def get_entity_fill_property_by_index(self, index: int, in_index: int):
+        """Get fill properties by index."""
+        return await self.execute_command("get_entity_fill_property_by_index", {"index": index, "in_index": in_index})
+
+    async def set_entity_fill_property_by_index(self, index: int, in_index: int, params: Dict[str, Any]):
+        """Set fill properties by index."""
+        return await self.execute_command("set_entity_fill_property_by_index", {"index": index, "in_index": in_index, **params})
+
+    async def get_entity_count(self):
+        """Get the number of entities."""
+        return await self.execute_command("get_entity_count")
+
+    async def get_name_by_index(self, index: int):
+        """Get name by index."""
+        return await self.execute_command("get_name_by_index", {"index": index})
+
+    async def get_pos_size_by_index(self, index: int):
+        """Get position and size by index."""
+        return await self.execute_command("get_pos_size_by_index", {"index": index})
+
+    async def mark_by_index(self, index: int):
+        """Mark object by index."""
+        return await self.execute_command("mark_by_index", {"index": index})
+
+    async def clear_error(self):
+        """Clear current error."""
+        return await self.execute_command("clear_error")
+
+    async def get_error(self):
+        """Get current error."""
+        return await self.execute_command("get_error")
@@ -0,0 +1,120 @@
+"""
+Micro-benchmarks of reply decode throughput for the scancard client.
+Compares the former single-read decode (decode the whole GB18030 buffer, cut at the
+last '}' and parse) with JsonStreamReader fed the same reply whole, in socket-sized
+chunks and as a pipelined stream of many replies. Run from the src directory:
+
+    python -m Feeltek.benchmarkJsonStreamReader
+
+"""
+
+import json
+import time
+
+from Feeltek.jsonStreamReader import JsonStreamReader
+
+
+def make_replies():
+    """Build representative encoded replies keyed by name."""
+    status = {"sid": 0, "cmd": "get_working_status", "ret": 0}
+    mark_parameters = {
+        "sid": 0, "cmd": "get_markParameters_by_layer", "ret": 1,
+        "data": {
+            "layer_id": 1, "markSpeed": 3000, "jumpSpeed": 5000, "jumpDelay": 100,
+            "laserOnDelay": 100, "polygonDelay": 100, "laserOffDelay": 100,
+            "polygonKillerTime": 100, "laserFrequency": 100, "current": 100,
+            "firstPulseKillerLength": 100, "pulseWidth": 100, "firstPulseWidth": 100,
+            "incrementStep": 100
+        }
+    }
+    fill_property = {
+        "sid": 0, "cmd": "get_entity_fill_property_by_index", "ret": 1,
+        "data": {
+            "index": 1, "in_index": 1, "fill_mode": 1, "bEqualDistance": False,
+            "bSecondFill": False, "bRotateAngle": False, "bFillAsOne": False,
+            "bMoreIntact": False, "bFill3D": False, "loopNum": 1, "iFillMarkTimes": 1,
+            "iCurMarkTimes": 12, "layerId": 1, "fillSpace": 100, "fillAngle": 100,
+            "fillEdgeOffset": 100, "fillStartOffset": 100, "fillEndOffset": 100,
+            "fillLineReduction": 100, "loopSpace": 100, "secondAngle": 100,
+            "dRotateAngle": 100
+        }
+    }
+    large_content = {
+        "sid": 0, "cmd": "get_content_by_index", "ret": 1,
+        "data": {"content": "激光标记{层}\\" * 4000}
+    }
+
+    def encode(reply):
+        return json.dumps(reply, ensure_ascii=False).encode('GB18030')
+
+    return {
+        "status": encode(status),
+        "mark_parameters": encode(mark_parameters),
+        "fill_property": encode(fill_property),
+        "large_content": encode(large_content),
+    }
+
+
+def legacy_decode(raw: bytes):
+    """The former decode path: decode everything, cut at the last brace, parse."""
+    decoded = raw.decode('GB18030', errors='replace')
+    return json.loads(decoded[:decoded.rfind('}') + 1])
+
+
+def stream_decode(raw: bytes, chunk_size: int):
+    """Feed a reply to a fresh reader in chunk_size pieces."""
+    reader = JsonStreamReader()
+    document = None
+    for offset in range(0, len(raw), chunk_size):
+        reader.feed(raw[offset:offset + chunk_size])
+        document = reader.next_document()
+    return document
+
+
+def measure(func, payload_bytes: int, min_time: float = 0.5):
+    """Run func repeatedly for at least min_time seconds and return (calls/s, MB/s)."""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for _ in range(50):
+            func()
+        calls += 50
+        elapsed = time.perf_counter() - start
+    rate = calls / elapsed
+    return rate, rate * payload_bytes / 1e6
+
+
+def main():
+    replies = make_replies()
+    print(f"{'reply':<16}{'bytes':>8}  {'method':<22}{'replies/s':>12}{'MB/s':>10}")
+    for name, raw in replies.items():
+        assert stream_decode(raw, len(raw)) == json.loads(raw.decode('GB18030'))
+        cases = [
+            ("legacy single read", lambda: legacy_decode(raw)),
+            ("stream, whole", lambda: stream_decode(raw, len(raw))),
+            ("stream, 1024 B chunks", lambda: stream_decode(raw, 1024)),
+            ("stream, 64 B chunks", lambda: stream_decode(raw, 64)),
+        ]
+        for method, func in cases:
+            rate, throughput = measure(func, len(raw))
+            print(f"{name:<16}{len(raw):>8}  {method:<22}{rate:>12.0f}{throughput:>10.1f}")
+
+    # Many replies arriving back to back on one connection, as with pipelined commands
+    stream = b"".join([replies["mark_parameters"], replies["fill_property"]] * 250)
+
+    def pipelined():
+        reader = JsonStreamReader()
+        reader.feed(stream)
+        count = 0
+        while reader.next_document() is not None:
+            count += 1
+        return count
+
+    assert pipelined() == 500
+    rate, throughput = measure(pipelined, len(stream))
+    print(f"{'pipelined x500':<16}{len(stream):>8}  {'stream, one buffer':<22}{rate * 500:>12.0f}{throughput:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
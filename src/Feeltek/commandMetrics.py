@@ -0,0 +1,173 @@
+"""
+This code contains the command instrumentation of the feeltek scancard client.
+Every command records its round trip latency into a fixed log-spaced histogram per
+command name, along with retry, timeout and failure counts and reply sizes.
+Recording is a few additions under a lock, so it stays on in production; snapshots
+give counts, means and percentile estimates per command.
+
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional
+
+# Upper bounds of the latency buckets in milliseconds; the last bucket is unbounded
+BUCKET_BOUNDS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class _CommandStats:
+    """Counters of one command name."""
+
+    __slots__ = ("count", "total", "min", "max", "buckets", "retries", "timeouts", "failures",
+                 "reply_count", "reply_bytes", "max_reply_bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.reply_count = 0
+        self.reply_bytes = 0
+        self.max_reply_bytes = 0
+
+
+class CommandMetrics:
+    """
+    Latency histograms and error counters per scancard command.
+    Attributes:
+        latency_observer: Optional callable called with (cmd, seconds) for every answered request.
+        timeout_observer: Optional callable called with cmd for every attempt that timed out.
+    Methods:
+        record_latency(self, cmd, seconds): Records one answered request.
+        record_retry(self, cmd): Records a retried attempt.
+        record_timeout(self, cmd): Records an attempt that timed out.
+        record_failure(self, cmd): Records a command that failed after all attempts.
+        record_reply(self, response, size): Records the size of a reply.
+        snapshot(self): Returns the statistics of every command.
+        format_summary(self): Returns the statistics as a text table.
+        reset(self): Clears all statistics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _CommandStats] = {}
+        self.latency_observer: Optional[Callable[[str, float], None]] = None
+        self.timeout_observer: Optional[Callable[[str], None]] = None
+
+    def _get(self, cmd: str) -> _CommandStats:
+        stats = self._stats.get(cmd)
+        if stats is None:
+            stats = self._stats[cmd] = _CommandStats()
+        return stats
+
+    def record_latency(self, cmd: str, seconds: float):
+        """Record the round trip time of one answered request."""
+        ms = seconds * 1000
+        index = bisect_left(BUCKET_BOUNDS_MS, ms)
+        with self._lock:
+            stats = self._get(cmd)
+            stats.count += 1
+            stats.total += ms
+            stats.buckets[index] += 1
+            if ms < stats.min:
+                stats.min = ms
+            if ms > stats.max:
+                stats.max = ms
+        if self.latency_observer:
+            self.latency_observer(cmd, seconds)
+
+    def record_retry(self, cmd: str):
+        """Record an attempt that is retried."""
+        with self._lock:
+            self._get(cmd).retries += 1
+
+    def record_timeout(self, cmd: str):
+        """Record an attempt that timed out waiting for the reply."""
+        with self._lock:
+            self._get(cmd).timeouts += 1
+        if self.timeout_observer:
+            self.timeout_observer(cmd)
+
+    def record_failure(self, cmd: str):
+        """Record a command that failed after all attempts or was failed fast."""
+        with self._lock:
+            self._get(cmd).failures += 1
+
+    def record_reply(self, response: Dict[str, Any], size: int):
+        """Record the size in bytes of a reply, under the command it echoes."""
+        cmd = response.get("cmd") or "unknown"
+        with self._lock:
+            stats = self._get(cmd)
+            stats.reply_count += 1
+            stats.reply_bytes += size
+            if size > stats.max_reply_bytes:
+                stats.max_reply_bytes = size
+
+    @staticmethod
+    def _percentile(buckets: List[int], count: int, fraction: float, max_ms: float) -> Optional[float]:
+        """Estimate a percentile as the upper bound of the bucket it falls in."""
+        if not count:
+            return None
+        rank = fraction * count
+        seen = 0
+        for index, bucket in enumerate(buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(BUCKET_BOUNDS_MS[index], max_ms) if index < len(BUCKET_BOUNDS_MS) else max_ms
+        return max_ms
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the statistics of every command.
+
+        Returns:
+            dict: Per command name: count, mean/min/max latency and p50/p95/p99
+                estimates in ms, retries, timeouts, failures, mean and max reply
+                bytes, and the raw bucket counts with their bounds.
+        """
+        result = {}
+        with self._lock:
+            for cmd, stats in self._stats.items():
+                buckets = list(stats.buckets)
+                result[cmd] = {
+                    "count": stats.count,
+                    "mean_ms": stats.total / stats.count if stats.count else None,
+                    "min_ms": stats.min if stats.count else None,
+                    "max_ms": stats.max if stats.count else None,
+                    "p50_ms": self._percentile(buckets, stats.count, 0.50, stats.max),
+                    "p95_ms": self._percentile(buckets, stats.count, 0.95, stats.max),
+                    "p99_ms": self._percentile(buckets, stats.count, 0.99, stats.max),
+                    "retries": stats.retries,
+                    "timeouts": stats.timeouts,
+                    "failures": stats.failures,
+                    "mean_reply_bytes": stats.reply_bytes / stats.reply_count if stats.reply_count else None,
+                    "max_reply_bytes": stats.max_reply_bytes,
+                    "buckets": buckets,
+                    "bucket_bounds_ms": list(BUCKET_BOUNDS_MS),
+                }
+        return result
+
+    def format_summary(self) -> str:
+        """Get the statistics as a text table, slowest total time first."""
+        snapshot = self.snapshot()
+        lines = [f"{'command':<36}{'count':>7}{'mean':>9}{'p95':>9}{'max':>9}{'retry':>7}{'tmo':>6}{'fail':>6}{'bytes':>8}"]
+
+        def fmt(value):
+            return f"{value:.1f}" if value is not None else "-"
+
+        for cmd, stats in sorted(snapshot.items(), key=lambda item: -(item[1]["mean_ms"] or 0) * item[1]["count"]):
+            lines.append(
+                f"{cmd:<36}{stats['count']:>7}{fmt(stats['mean_ms']):>9}{fmt(stats['p95_ms']):>9}"
+                f"{fmt(stats['max_ms']):>9}{stats['retries']:>7}{stats['timeouts']:>6}{stats['failures']:>6}"
+                f"{fmt(stats['mean_reply_bytes']):>8}"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        """Clear all statistics."""
+        with self._lock:
+            self._stats.clear()
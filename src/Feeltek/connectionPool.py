@@ -0,0 +1,342 @@
+"""
+This code contains the connection manager for the feeltek scancard TCP service.
+Instead of opening a new socket for every JSON request, a small pool of long-lived
+connections to the card host is kept open and reused. Dropped connections are
+detected before reuse and re-established transparently, and reuse statistics are
+tracked so the effect on the layer cycle can be checked from the app.
+
+"""
+
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from Feeltek.jsonStreamReader import JsonStreamReader
+
+# Commands whose effect repeats if the card receives them twice; never resent once sent
+NON_IDEMPOTENT_COMMANDS = frozenset({
+    "start_mark", "mark_by_index", "start_preview",
+    "translate_entity", "translate_entity_by_index", "rotate_entity", "rotate_entity_by_index",
+    "copy_by_index", "delete_by_index", "TransByModel", "vision_translate", "vision_rotate",
+})
+
+
+class RequestSentError(ConnectionError):
+    """The request went out but the connection failed before its reply arrived."""
+
+
+class ScancardConnection:
+    """
+    A single long-lived TCP connection to the scancard host.
+    Attributes:
+        host: The host address.
+        port: The port number.
+        timeout: The socket timeout in seconds.
+        sock: The underlying socket, or None when disconnected.
+        created_at: When the socket was opened.
+        last_used: When the socket was last used for a request.
+        requests: The number of requests sent over the current socket.
+        reader: The framing reader holding bytes received but not yet consumed.
+    Methods:
+        connect(self): Opens the socket with keepalive enabled.
+        close(self): Closes the socket.
+        is_alive(self): Checks that the peer has not closed the connection.
+        send(self, payload, count, timeout): Sends one or more encoded requests.
+        recv(self, bufsize): Receives reply bytes.
+        read_response(self): Receives one complete JSON reply.
+    """
+
+    # Keepalive tuning applied when the platform supports it (seconds / probe count)
+    KEEPALIVE_OPTIONS = (("TCP_KEEPIDLE", 10), ("TCP_KEEPINTVL", 5), ("TCP_KEEPCNT", 3))
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock: Optional[socket.socket] = None
+        self.created_at = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+        self.reader = JsonStreamReader()
+
+    def connect(self):
+        """Open the socket and enable TCP keepalive and no-delay."""
+        self.close()
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in self.KEEPALIVE_OPTIONS:
+            if hasattr(socket, option):
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+                except OSError:
+                    pass
+        self.sock = sock
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.requests = 0
+        self.reader.reset()
+
+    def close(self):
+        """Close the socket if it is open."""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def is_alive(self) -> bool:
+        """
+        Check that the connection can be reused.
+        An idle socket that is readable has either been closed by the peer or has
+        unsolicited bytes pending; neither is safe to send a new request on.
+        """
+        if self.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def send(self, payload: bytes, count: int = 1, timeout: Optional[float] = None):
+        """Send a payload holding count encoded requests; timeout applies until the replies are read."""
+        self.sock.settimeout(self.timeout if timeout is None else timeout)
+        self.sock.sendall(payload)
+        self.last_used = time.monotonic()
+        self.requests += count
+
+    def recv(self, bufsize: int = 65536) -> bytes:
+        """Receive up to bufsize reply bytes."""
+        data = self.sock.recv(bufsize)
+        self.last_used = time.monotonic()
+        return data
+
+    def read_response(self) -> Dict[str, Any]:
+        """Receive one complete JSON reply, however many reads it takes."""
+        return self.reader.read_document(self.recv)
+
+
+class ScancardConnectionPool:
+    """
+    A pool of long-lived connections to the scancard host.
+    Attributes:
+        host: The host address.
+        port: The port number.
+        timeout: The socket timeout in seconds.
+        max_connections: The maximum number of simultaneously open connections.
+        max_idle: Idle time in seconds after which a pooled connection is recycled.
+        reply_observer: Optional callable called with (reply, size in bytes) for every reply.
+    Methods:
+        connection(self): Context manager yielding a live connection.
+        request(self, payload, on_sent, timeout, idempotent): Sends a request and returns the parsed reply.
+        pipeline(self, payloads, on_response, depth, timeout): Streams requests over one connection.
+        stats(self): Returns connection reuse statistics.
+        close_all(self): Closes every pooled connection.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 5, max_connections: int = 2, max_idle: float = 60.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_idle = max_idle
+        self.reply_observer: Optional[Callable[[Dict[str, Any], int], None]] = None
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle: List[ScancardConnection] = []
+
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "requests": 0,
+            "reused": 0,
+            "reconnects": 0,
+            "failures": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _open(self) -> ScancardConnection:
+        conn = ScancardConnection(self.host, self.port, self.timeout)
+        conn.connect()
+        self._count("connections_opened")
+        return conn
+
+    def _discard(self, conn: ScancardConnection):
+        if conn.sock is not None:
+            conn.close()
+            self._count("connections_closed")
+
+    def _acquire(self) -> ScancardConnection:
+        """Take an idle connection that is still usable, or open a new one."""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._open()
+                idle_for = time.monotonic() - conn.last_used
+                if idle_for < self.max_idle and conn.is_alive():
+                    return conn
+                # The peer dropped it, or it sat idle too long; replace it
+                self._discard(conn)
+                self._count("reconnects")
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, conn: ScancardConnection):
+        if conn.sock is not None:
+            with self._lock:
+                self._idle.append(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Yield a live connection for the duration of the block.
+        The connection is closed instead of returned to the pool if the block raises,
+        since the stream may then hold a partial request or reply.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            self._discard(conn)
+            raise
+        finally:
+            self._release(conn)
+
+    def request(self, payload: bytes, on_sent: Optional[Callable[[], None]] = None,
+                timeout: Optional[float] = None, idempotent: bool = False) -> Dict[str, Any]:
+        """
+        Send a request and return the parsed reply.
+        A reused connection that turns out to be dead while sending is reconnected and
+        the request is sent once more; a failure on a freshly opened connection is
+        raised. Once the request has gone out, a dropped connection raises
+        RequestSentError instead, since the card may already have executed it; only
+        idempotent requests are then sent again. A reply that cannot be decoded
+        discards the connection and the ValueError propagates.
+
+        Args:
+            payload: The encoded request.
+            on_sent: Called once the request has been handed to the socket.
+            timeout: Reply timeout in seconds; defaults to the pool's timeout.
+            idempotent: Whether the request may be resent after it went out.
+
+        Returns:
+            dict: The decoded JSON reply.
+        """
+        for attempt in range(2):
+            with self.connection() as conn:
+                reused = conn.requests > 0
+                sent = False
+                try:
+                    conn.send(payload, timeout=timeout)
+                    sent = True
+                    if on_sent:
+                        on_sent()
+                    response = conn.read_response()
+                    if self.reply_observer:
+                        self.reply_observer(response, conn.reader.last_document_size)
+                except (ConnectionError, BrokenPipeError) as e:
+                    if reused and attempt == 0 and (idempotent or not sent):
+                        self._count("reconnects")
+                        conn.close()
+                        self._count("connections_closed")
+                        continue
+                    self._count("failures")
+                    if sent:
+                        raise RequestSentError(f"Connection lost after sending the request: {e}") from e
+                    raise
+                except OSError:
+                    self._count("failures")
+                    raise
+                with self._lock:
+                    self._stats["requests"] += 1
+                    if reused:
+                        self._stats["reused"] += 1
+                return response
+
+    def pipeline(self, payloads: Iterable[bytes], on_response: Callable[[Dict[str, Any]], None], depth: int = 16,
+                 timeout: Optional[float] = None) -> int:
+        """
+        Stream requests over one connection without waiting for each reply.
+        Up to depth requests are kept unanswered; replies arrive in request order and
+        are handed to on_response one by one. Payloads are pulled from the iterable
+        only when there is room in the window, so the producer can stop early or skip
+        requests based on the replies seen so far.
+
+        Args:
+            payloads: Iterable of encoded requests.
+            on_response: Called with each decoded reply, in request order. An exception
+                raised from it discards the connection and propagates.
+            depth: Maximum number of requests in flight.
+            timeout: Timeout in seconds of each reply; defaults to the pool's timeout.
+
+        Returns:
+            int: The number of replies received.
+        """
+        source = iter(payloads)
+        exhausted = False
+        in_flight = 0
+        received = 0
+        with self.connection() as conn:
+            reused = conn.requests > 0
+            try:
+                while True:
+                    window = []
+                    while not exhausted and in_flight + len(window) < depth:
+                        payload = next(source, None)
+                        if payload is None:
+                            exhausted = True
+                        else:
+                            window.append(payload)
+                    if window:
+                        conn.send(b"".join(window), count=len(window), timeout=timeout)
+                        in_flight += len(window)
+                    if in_flight == 0:
+                        break
+                    response = conn.read_response()
+                    if self.reply_observer:
+                        self.reply_observer(response, conn.reader.last_document_size)
+                    in_flight -= 1
+                    received += 1
+                    on_response(response)
+            except OSError:
+                self._count("failures")
+                raise
+            finally:
+                with self._lock:
+                    self._stats["requests"] += received
+                    self._stats["reused"] += received if reused else max(received - 1, 0)
+        return received
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get connection reuse statistics.
+
+        Returns:
+            dict: Counters plus the reuse ratio and the number of idle connections.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle_connections"] = len(self._idle)
+        stats["reuse_ratio"] = stats["reused"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def close_all(self):
+        """Close every idle pooled connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
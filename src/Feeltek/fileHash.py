@@ -0,0 +1,48 @@
+"""
+This code contains content hashing of the job files opened on the feeltek scancard.
+Results are memoised per path, size and modification time, so a file is only read
+again after it has changed on disk.
+
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+_memo: Dict[str, Tuple[int, int, str]] = {}
+_memo_lock = threading.Lock()
+
+
+def content_hash(file_path: str, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """
+    Get a hash of the file's content.
+
+    Args:
+        file_path: Path of the file.
+        chunk_size: Read size in bytes.
+
+    Returns:
+        str: Hex digest of the content, or None if the file cannot be read.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    key = os.path.abspath(file_path)
+    with _memo_lock:
+        cached = _memo.get(key)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    result = digest.hexdigest()
+    with _memo_lock:
+        _memo[key] = (stat.st_size, stat.st_mtime_ns, result)
+    return result
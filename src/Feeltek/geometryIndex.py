@@ -0,0 +1,247 @@
+"""
+This code contains the on-disk index of the entity geometry of layer files.
+Entity counts, names and bounding boxes of a file only change with its content, yet
+reading them from the feeltek scancard takes a round trip per entity. The index opens
+each layer file once, reads its geometry in one pipelined batch and stores it in a
+compressed .npz file named after the file's content hash, so later layers, later
+builds and UI views read it from local storage instead of the card.
+
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from Feeltek.fileHash import content_hash
+
+# Index folder in the user's application data, independent of the working directory
+DEFAULT_INDEX_DIRECTORY = os.path.join(os.path.expanduser("~"), ".sls-multilayer", "geometry_index")
+
+# Columns of LayerGeometry.boxes, as returned by get_pos_size_by_index
+BOX_FIELDS = ("xPos", "yPos", "zPos", "xSize", "ySize", "zSize")
+
+
+class LayerGeometry:
+    """
+    Entity geometry of one layer file, as stored in the file.
+    Attributes:
+        file_hash: Content hash of the layer file.
+        indices: Entity indices, shape (n,).
+        names: Entity names in index order.
+        boxes: Entity positions and sizes, shape (n, 6) in BOX_FIELDS order.
+    Methods:
+        count(self): Number of entities.
+        positions(self): Entity index -> (xPos, yPos, xSize, ySize).
+        bounds(self): Bounding box of all entities.
+    """
+
+    __slots__ = ("file_hash", "indices", "names", "boxes")
+
+    def __init__(self, file_hash: str, indices: np.ndarray, names: List[str], boxes: np.ndarray):
+        self.file_hash = file_hash
+        self.indices = indices
+        self.names = names
+        self.boxes = boxes
+
+    def count(self) -> int:
+        return len(self.indices)
+
+    def positions(self) -> Dict[int, Tuple[float, float, float, float]]:
+        """Get the position and size of every entity in the format used for partitioning."""
+        return {int(index): (float(box[0]), float(box[1]), float(box[3]), float(box[4]))
+                for index, box in zip(self.indices, self.boxes)}
+
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        """
+        Get the bounding box of all entities, taking positions as entity centres.
+
+        Returns:
+            tuple: (xMin, yMin, xMax, yMax), or None without entities.
+        """
+        if not len(self.boxes):
+            return None
+        half = self.boxes[:, 3:5] / 2
+        lower = (self.boxes[:, 0:2] - half).min(axis=0)
+        upper = (self.boxes[:, 0:2] + half).max(axis=0)
+        return float(lower[0]), float(lower[1]), float(upper[0]), float(upper[1])
+
+
+class LayerGeometryIndex:
+    """
+    Entity geometry of layer files, kept in memory and on disk by content hash.
+    Attributes:
+        directory: Folder holding one .npz file per indexed file content.
+        first_entity_index: Index of the first entity in a job.
+    Methods:
+        get(self, file_path): Gets the geometry of a file if it is indexed.
+        get_by_hash(self, file_hash): Gets the geometry of a file content if it is indexed.
+        put(self, geometry): Stores a geometry in memory and on disk.
+        extract(self, scancard, file_path): Opens a file on the card and indexes its geometry.
+        build(self, scancard, file_paths): Indexes files in the background, skipping indexed ones.
+        cancel_build(self): Stops a running build after the current file.
+    """
+
+    def __init__(self, directory: str = DEFAULT_INDEX_DIRECTORY, first_entity_index: int = 0):
+        self.directory = directory
+        self.first_entity_index = first_entity_index
+        self._memory: Dict[str, LayerGeometry] = {}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.directory, f"{file_hash}.npz")
+
+    def get(self, file_path: Optional[str]) -> Optional[LayerGeometry]:
+        """
+        Get the geometry of a file if it is indexed.
+
+        Returns:
+            LayerGeometry: The stored geometry, or None if the file is not indexed or unreadable.
+        """
+        file_hash = content_hash(file_path) if file_path else None
+        return self.get_by_hash(file_hash) if file_hash else None
+
+    def get_by_hash(self, file_hash: str) -> Optional[LayerGeometry]:
+        """Get the geometry of a file content from memory, or from disk the first time."""
+        with self._lock:
+            geometry = self._memory.get(file_hash)
+        if geometry is not None:
+            return geometry
+        try:
+            with np.load(self._path(file_hash)) as data:
+                geometry = LayerGeometry(file_hash, data["indices"], [str(name) for name in data["names"]], data["boxes"])
+        except (OSError, KeyError, ValueError):
+            return None
+        with self._lock:
+            self._memory[file_hash] = geometry
+        return geometry
+
+    def put(self, geometry: LayerGeometry):
+        """
+        Store a geometry in memory and write it to disk.
+
+        Raises:
+            OSError: If the file cannot be written; the geometry stays indexed in memory.
+        """
+        with self._lock:
+            self._memory[geometry.file_hash] = geometry
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(geometry.file_hash)
+        # Write under a temporary name so a reader never sees half a file
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as file:
+            np.savez_compressed(file, indices=geometry.indices,
+                                names=np.array(geometry.names, dtype=str), boxes=geometry.boxes)
+        os.replace(temporary, path)
+
+    def extract(self, scancard, file_path: str) -> LayerGeometry:
+        """
+        Open a file on the card and index its geometry.
+        Runs synchronously; call it from the scancard's job executor or another worker thread.
+
+        Args:
+            scancard: The Scancard to read the geometry with.
+            file_path: Path of the layer's .emd file.
+
+        Returns:
+            LayerGeometry: The stored geometry.
+
+        Raises:
+            RuntimeError: If the file cannot be opened or a query fails.
+        """
+        file_hash = content_hash(file_path)
+        if file_hash is None:
+            raise RuntimeError(f"Cannot read {file_path}")
+
+        reply = scancard._load_file(file_path)
+        if reply.get("ret_value") != 1:
+            raise RuntimeError(f"Failed to open {file_path}: {reply.get('error', reply.get('ret_value'))}")
+        reply = scancard.get_entity_count().result()
+        if reply.get("ret_value") != 1:
+            raise RuntimeError(f"Failed to get the entity count of {file_path}: {reply.get('error', reply.get('ret_value'))}")
+        count = int((reply.get("response", {}).get("data") or {}).get("count", 0))
+        indices = list(range(self.first_entity_index, self.first_entity_index + count))
+
+        commands = []
+        for index in indices:
+            commands.append(("get_name_by_index", {"index": index}))
+            commands.append(("get_pos_size_by_index", {"index": index}))
+        _, batch = scancard.execute_batch(commands)
+        replies = batch.result()
+
+        names, boxes = [], np.zeros((count, len(BOX_FIELDS)))
+        for row, index in enumerate(indices):
+            name_reply, box_reply = replies[2 * row], replies[2 * row + 1]
+            for reply in (name_reply, box_reply):
+                if reply.get("ret_value") != 1:
+                    raise RuntimeError(f"Failed to read entity {index} of {file_path}: {reply.get('error', reply.get('ret_value'))}")
+            names.append(str((name_reply.get("response", {}).get("data") or {}).get("name", "")))
+            data = box_reply.get("response", {}).get("data") or {}
+            boxes[row] = [float(data.get(field, 0.0)) for field in BOX_FIELDS]
+
+        geometry = LayerGeometry(file_hash, np.array(indices, dtype=np.int32), names, boxes)
+        try:
+            self.put(geometry)
+        except OSError as e:
+            scancard.log_error(f"Failed to write geometry index for {geometry.file_hash}: {e}")
+        return geometry
+
+    def build(self, scancard, file_paths: List[str]) -> Future:
+        """
+        Index layer files in the background, e.g. while the chamber preheats.
+        Files whose content is already indexed, in memory or on disk, are not opened.
+        Each file is a separate job on the scancard's job executor, queued once the
+        previous one is done, so a load_file waits for at most one file. Indexing
+        switches the file open on the card; reload the layer to mark afterwards.
+
+        Args:
+            scancard: The Scancard to read the geometry with.
+            file_paths: Layer files in build order.
+
+        Returns:
+            Future: Resolves to {"indexed", "cached", "failed": [(path, error)], "cancelled"}.
+        """
+        self._cancel.clear()
+        result = Future()
+        summary = {"indexed": 0, "cached": 0, "failed": [], "cancelled": False}
+        pending = []
+        seen = set()
+        for file_path in file_paths:
+            file_hash = content_hash(file_path)
+            if file_hash is not None and (file_hash in seen or self.get_by_hash(file_hash) is not None):
+                summary["cached"] += 1
+                continue
+            seen.add(file_hash)
+            pending.append(file_path)
+        pending.reverse()
+
+        def task(file_path):
+            try:
+                self.extract(scancard, file_path)
+                summary["indexed"] += 1
+            except Exception as e:
+                summary["failed"].append((file_path, str(e)))
+
+        def next_file(_=None):
+            if self._cancel.is_set() and pending:
+                summary["cancelled"] = True
+                pending.clear()
+            if not pending:
+                result.set_result(summary)
+                return
+            try:
+                scancard.job_executor.submit(task, pending.pop()).add_done_callback(next_file)
+            except RuntimeError as e:
+                # The executor was shut down
+                summary["failed"].append((None, str(e)))
+                result.set_result(summary)
+
+        next_file()
+        return result
+
+    def cancel_build(self):
+        """Stop a running build after the file being indexed."""
+        self._cancel.set()
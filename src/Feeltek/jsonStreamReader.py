@@ -0,0 +1,202 @@
+"""
+This code contains the incremental reader for replies of the feeltek scancard TCP service.
+The service answers every request with one JSON document and no length prefix or
+delimiter, so replies are framed by tracking bracket depth over the raw bytes.
+Bytes are buffered until a complete document is available, then the document is
+decoded from GB18030 exactly once and parsed. Leftover bytes stay buffered for the
+next reply, which keeps pipelined requests on one connection in step.
+
+When the buffer holds exactly one reply, which is the usual case, it is decoded and
+parsed directly by the json module without a Python-level scan.
+
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, Optional
+
+# Bytes that change the framing state outside a JSON string
+_STRUCTURAL = re.compile(rb'[{}\[\]"]')
+
+# A run of string content: plain bytes and whole GB18030 two- and four-byte sequences,
+# stopping at a quote, a backslash or an incomplete sequence
+_STRING_RUN = re.compile(
+    rb'(?:[^"\\\x81-\xfe]'
+    rb'|[\x81-\xfe][\x30-\x39][\x81-\xfe][\x30-\x39]'
+    rb'|[\x81-\xfe][\x40-\x7e\x80-\xfe])*'
+)
+
+# Every scancard reply echoes the command name; one occurrence means one reply
+_REPLY_KEY = b'"cmd"'
+
+
+class JsonStreamReader:
+    """
+    Incremental framer for the JSON documents sent back by the scancard.
+    Inside strings, GB18030 multi-byte sequences are consumed as a whole, since their
+    trailing bytes can look like an ASCII backslash or bracket.
+    Attributes:
+        encoding: The text encoding of the replies.
+        max_document_size: The largest accepted document in bytes.
+        last_document_size: The size in bytes of the last document returned.
+    Methods:
+        feed(self, data): Appends received bytes to the buffer.
+        next_document(self): Returns the next complete document, or None.
+        read_document(self, recv, bufsize): Receives until a document is complete.
+        reset(self): Drops buffered bytes and framing state.
+    """
+
+    def __init__(self, encoding: str = 'GB18030', max_document_size: int = 16 * 1024 * 1024):
+        self.encoding = encoding
+        self.max_document_size = max_document_size
+        self.last_document_size = 0
+        self.reset()
+
+    def reset(self):
+        """Drop buffered bytes and framing state."""
+        self._buffer = bytearray()
+        self._pos = 0          # next byte to scan
+        self._start = -1       # offset of the opening bracket of the current document
+        self._depth = 0
+        self._in_string = False
+
+    @property
+    def buffered(self) -> int:
+        """Number of bytes received but not yet returned as a document."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes):
+        """Append received bytes to the buffer."""
+        self._buffer += data
+
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        self.last_document_size = len(raw)
+        return json.loads(raw.decode(self.encoding, errors='replace'))
+
+    def _take_whole_buffer(self) -> Optional[Dict[str, Any]]:
+        """
+        Parse the buffer directly when it plausibly holds exactly one complete reply.
+
+        Returns:
+            dict: The parsed document, or None to fall back to scanning.
+        """
+        if self._start >= 0:
+            return None
+        first = self._buffer.find(_REPLY_KEY)
+        if first < 0 or self._buffer.find(_REPLY_KEY, first + 1) >= 0:
+            return None
+        raw = bytes(self._buffer).strip(b' \t\r\n\x00')
+        if not raw.startswith(b'{') or not raw.endswith(b'}'):
+            return None
+        try:
+            document = self._decode(raw)
+        except json.JSONDecodeError:
+            return None
+        del self._buffer[:]
+        self._pos = 0
+        return document
+
+    def _scan(self) -> int:
+        """
+        Advance the framing state over the buffered bytes.
+
+        Returns:
+            int: The end offset of a complete document, or -1 if more bytes are needed.
+        """
+        buf = self._buffer
+        size = len(buf)
+        pos = self._pos
+
+        if self._start < 0:
+            start = buf.find(b'{', pos)
+            if start < 0:
+                # Nothing but padding so far
+                del buf[:]
+                self._pos = 0
+                return -1
+            self._start = start
+            self._depth = 1
+            pos = start + 1
+
+        while pos < size:
+            if self._in_string:
+                pos = _STRING_RUN.match(buf, pos).end()
+                if pos >= size:
+                    break
+                byte = buf[pos]
+                if byte == 0x22:  # closing quote
+                    self._in_string = False
+                    pos += 1
+                elif byte == 0x5C:  # escape, skip the escaped character
+                    if pos + 1 >= size:
+                        break
+                    pos += 2
+                elif pos + 3 >= size:
+                    # Possibly a multi-byte sequence split across reads
+                    break
+                else:
+                    # Invalid sequence, decoded as a replacement character later
+                    pos += 1
+            else:
+                match = _STRUCTURAL.search(buf, pos)
+                if match is None:
+                    pos = size
+                    break
+                pos = match.start()
+                byte = buf[pos]
+                pos += 1
+                if byte == 0x22:
+                    self._in_string = True
+                elif byte in (0x7B, 0x5B):
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pos = pos
+                        return pos
+
+        self._pos = pos
+        if pos - self._start > self.max_document_size:
+            raise ValueError(f"Reply exceeds {self.max_document_size} bytes without completing a JSON document")
+        return -1
+
+    def next_document(self) -> Optional[Dict[str, Any]]:
+        """
+        Return the next complete document from the buffer.
+
+        Returns:
+            dict: The parsed document, or None if more bytes are needed.
+        """
+        document = self._take_whole_buffer()
+        if document is not None:
+            return document
+        end = self._scan()
+        if end < 0:
+            return None
+        start = self._start
+        raw = bytes(self._buffer[start:end])
+        del self._buffer[:end]
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        return self._decode(raw)
+
+    def read_document(self, recv: Callable[[int], bytes], bufsize: int = 65536) -> Dict[str, Any]:
+        """
+        Receive until a complete document is available and return it.
+
+        Args:
+            recv: Callable returning received bytes, b'' once the peer has closed.
+            bufsize: Receive buffer size.
+
+        Returns:
+            dict: The parsed document.
+        """
+        document = self.next_document()
+        while document is None:
+            data = recv(bufsize)
+            if not data:
+                raise ConnectionResetError("Connection closed before a complete reply was received")
+            self.feed(data)
+            document = self.next_document()
+        return document
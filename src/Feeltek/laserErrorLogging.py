@@ -1,14 +1,24 @@
 """
 This code contains the error logger class to log errors wrt feeltek scancard. 
 The logging level is set to 'INFO' and the logs are stored in a separate log file automatically.
-It makes use of python logging library to implement this.
+It makes use of python logging library to implement this. Records are handed to a
+background listener through a queue, so logging never waits on the disk.
+
+It also contains the error capture of the scancard. Every command result is checked
+as it completes; only a non-success result triggers a get_error on the priority lane,
+and the error is kept in a fixed-size in-memory ring buffer that can be queried per layer.
 
 """
 
 # import neccessary libraries
 import os
+import queue
 import logging
+import threading
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
 
 class LaserErrorLogger:
     """
@@ -17,8 +27,10 @@ class LaserErrorLogger:
         logger (logging.Logger): The custom logger for logging laser errors.
         formatter (logging.Formatter): The formatter for formatting log messages.
         file_handler (logging.FileHandler): The file handler for saving logs to a file.
+        listener (QueueListener): Writes queued records to the file handler in the background.
     Methods:
         __init__(): Initializes the LaserErrorLogger class.
+        stop(): Writes out the queued records and stops the background listener.
     """
     def __init__(self):
 
@@ -51,6 +63,180 @@ class LaserErrorLogger:
         self.file_handler = logging.FileHandler(f"./laser_logs/{fixed_file_name}.log", mode="a", encoding="utf-8")
         self.file_handler.setFormatter(self.formatter)
 
-        # add this file handler to our custom logger
-        self.logger.addHandler(self.file_handler)
+        # the logger only queues records; the listener thread writes them to the file
+        self.queue = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(self.queue))
+        self.listener = QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+
+    def stop(self):
+        """Write out the queued records and stop the background listener."""
+        self.listener.stop()
+        self.file_handler.close()
+
+
+class LaserErrorRecord:
+    """One captured scancard error."""
+
+    __slots__ = ("timestamp", "code", "command", "layer", "description")
+
+    def __init__(self, timestamp: float, code: int, command: str, layer: Optional[int], description: str):
+        self.timestamp = timestamp
+        self.code = code
+        self.command = command
+        self.layer = layer
+        self.description = description
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "code": self.code,
+            "command": self.command,
+            "layer": self.layer,
+            "description": self.description,
+        }
+
+    def __repr__(self):
+        return f"LaserErrorRecord(code={self.code}, command={self.command!r}, layer={self.layer}, description={self.description!r})"
+
+
+class LaserErrorCapture:
+    """
+    Captures scancard command errors into a fixed-size ring buffer.
+    Successful results cost one comparison. A non-success reply from the card is
+    recorded at once with the returned code, and a get_error is sent on the priority
+    lane to fill in the card's own description; while one is in flight further errors
+    do not send another. Connection failures are recorded without asking the card.
+    Records are written to the laser log in the background.
+    Attributes:
+        scancard: The scancard whose commands are observed.
+        capacity: Number of errors kept in memory.
+        layer: Layer recorded with new errors, set by the print process.
+        total: Errors captured since start, including those overwritten.
+    Methods:
+        set_layer(self, layer): Sets the layer recorded with new errors.
+        observe(self, cmd, result): Checks one command result and captures it if it failed.
+        last(self, n, layer): Gets the most recent errors, optionally of one layer.
+        counts_by_code(self): Counts the buffered errors per error code.
+        clear(self): Empties the buffer.
+    """
+
+    # Commands whose ret is not a success flag
+    IGNORED_COMMANDS = frozenset({"get_error"})
+
+    def __init__(self, scancard, capacity: int = 1024, logger: Optional[LaserErrorLogger] = None):
+        self.scancard = scancard
+        self.capacity = capacity
+        self.layer: Optional[int] = None
+        self.total = 0
+        self._buffer: List[Optional[LaserErrorRecord]] = [None] * capacity
+        self._next = 0
+        self._lock = threading.Lock()
+        self._logger = logger
+        self._query_in_flight = False
+
+    def set_layer(self, layer: Optional[int]):
+        """Set the layer recorded with errors from now on."""
+        self.layer = layer
+
+    def observe(self, cmd: str, result: Dict[str, Any]):
+        """
+        Check one command result and capture it if it failed.
+
+        Args:
+            cmd: The command name.
+            result: The result in the format returned by Scancard.execute_command.
+        """
+        code = result.get("ret_value")
+        if code == 1 or cmd in self.IGNORED_COMMANDS:
+            return
+        if "error" in result:
+            # No reply from the card; there is nothing to ask it about
+            self._write(self._record(-1 if code is None else code, cmd, result["error"]))
+            return
+        record = self._record(code, cmd, self.scancard.ERROR_DESCRIPTIONS.get(code, "Unknown error"))
+        self._query_card(record)
+
+    def _record(self, code: int, cmd: str, description: str) -> LaserErrorRecord:
+        record = LaserErrorRecord(time.time(), code, cmd, self.layer, description)
+        with self._lock:
+            self._buffer[self._next] = record
+            self._next = (self._next + 1) % self.capacity
+            self.total += 1
+        return record
+
+    def _query_card(self, record: LaserErrorRecord):
+        """Ask the card for its description of the error, without waiting for it."""
+        with self._lock:
+            in_flight = self._query_in_flight
+            self._query_in_flight = True
+        if in_flight:
+            self._write(record)
+            return
+
+        def on_reply(f):
+            with self._lock:
+                self._query_in_flight = False
+            try:
+                reply = f.result()
+                if "error" not in reply:
+                    # Failed commands mostly return 0; get_error returns the actual error code
+                    if reply.get("ret_value") not in (None, 0, 1):
+                        record.code = reply["ret_value"]
+                    describe = (reply.get("response") or {}).get("data", {}).get("describe")
+                    record.description = describe or self.scancard.ERROR_DESCRIPTIONS.get(record.code, record.description)
+            except Exception:
+                pass
+            self._write(record)
+
+        self.scancard.execute_priority_command("get_error", retries=1).add_done_callback(on_reply)
+
+    def _write(self, record: LaserErrorRecord):
+        """Queue the record for the laser log file."""
+        try:
+            if self._logger is None:
+                self._logger = LaserErrorLogger()
+            self._logger.logger.error(
+                f"E{record.code} - {record.command} - layer {record.layer if record.layer is not None else '-'} - {record.description}"
+            )
+        except OSError as e:
+            self.scancard.log_error(f"Failed to write laser error log: {e}")
+
+    def last(self, n: int = 10, layer: Optional[int] = None) -> List[LaserErrorRecord]:
+        """
+        Get the most recent errors.
+
+        Args:
+            n: Maximum number of errors returned.
+            layer: Only errors recorded during this layer; None for all layers.
+
+        Returns:
+            list: Up to n records, newest first.
+        """
+        result = []
+        with self._lock:
+            index = self._next
+            for _ in range(min(self.total, self.capacity)):
+                index = (index - 1) % self.capacity
+                record = self._buffer[index]
+                if layer is None or record.layer == layer:
+                    result.append(record)
+                    if len(result) >= n:
+                        break
+        return result
+
+    def counts_by_code(self) -> Dict[int, int]:
+        """Count the buffered errors per error code."""
+        counts: Dict[int, int] = {}
+        with self._lock:
+            for record in self._buffer:
+                if record is not None:
+                    counts[record.code] = counts.get(record.code, 0) + 1
+        return counts
 
+    def clear(self):
+        """Empty the buffer."""
+        with self._lock:
+            self._buffer = [None] * self.capacity
+            self._next = 0
+            self.total = 0
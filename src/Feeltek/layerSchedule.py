@@ -0,0 +1,279 @@
+"""
+This code contains the per-layer parameter schedule of a multi-layer print.
+A schedule maps layer ranges to marking and fill parameter sets on top of a base set,
+e.g. different settings for the first layers or for contour passes. It is compiled
+and validated once before the build starts; the compiled schedule knows the full
+parameter set of every layer and applies it through the scancard's parameter cache,
+so only the fields the card does not hold yet are written. Fill parameters go only
+to the entities the schedule lists. Schedules are opt-in: a build uses one only when
+the user picked a schedule file for it.
+
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+# Field name -> accepted type of the marking parameters of set_markParameters_by_layer
+MARK_PARAMETER_FIELDS = {
+    "markSpeed": float, "jumpSpeed": float, "jumpDelay": float, "laserOnDelay": float,
+    "polygonDelay": float, "laserOffDelay": float, "polygonKillerTime": float,
+    "laserFrequency": float, "current": float, "firstPulseKillerLength": float,
+    "pulseWidth": float, "firstPulseWidth": float, "incrementStep": float,
+}
+
+# Field name -> accepted type of the fill parameters of set_entity_fill_property_by_index
+FILL_PARAMETER_FIELDS = {
+    "fill_mode": int, "bEqualDistance": bool, "bSecondFill": bool, "bRotateAngle": bool,
+    "bFillAsOne": bool, "bMoreIntact": bool, "bFill3D": bool, "loopNum": int,
+    "iFillMarkTimes": int, "iCurMarkTimes": int, "layerId": int, "fillSpace": float,
+    "fillAngle": float, "fillEdgeOffset": float, "fillStartOffset": float, "fillEndOffset": float,
+    "fillLineReduction": float, "loopSpace": float, "secondAngle": float, "dRotateAngle": float,
+}
+
+FILL_MODES = range(0, 5)
+
+
+class LayerRange:
+    """Parameter overrides of layers first..last (1-based, inclusive)."""
+
+    def __init__(self, first: int, last: Optional[int], marking: Dict[str, Any], fill: Dict[str, Any], name: str = ""):
+        self.first = first
+        self.last = last  # None: up to the last layer
+        self.marking = marking
+        self.fill = fill
+        self.name = name or f"layers {first}-{last if last is not None else 'end'}"
+
+
+class LayerParameterSchedule:
+    """
+    Layer ranges mapped to marking and fill parameter sets.
+    Ranges are applied in the order they were added, so a later range overrides the
+    fields it sets for the layers it covers.
+    Attributes:
+        base_marking: Marking parameters of every layer not overridden.
+        base_fill: Fill parameters of every layer not overridden.
+        ranges: The layer ranges in the order added.
+        fill_entities: Entity indices the fill parameters go to; required when fill parameters are set.
+    Methods:
+        add_range(self, first, last, marking, fill, name): Adds parameter overrides for a layer range.
+        from_dict(cls, params): Creates a schedule from a parameter dictionary.
+        from_yaml(cls, path): Creates a schedule from a YAML schedule file.
+        validate(self, total_layers): Lists the problems of the schedule.
+        compile(self, total_layers): Validates and precomputes the schedule.
+    """
+
+    def __init__(self, base_marking: Optional[Dict[str, Any]] = None, base_fill: Optional[Dict[str, Any]] = None,
+                 fill_entities: Optional[List[int]] = None):
+        self.base_marking = dict(base_marking or {})
+        self.base_fill = dict(base_fill or {})
+        self.fill_entities = list(fill_entities) if fill_entities is not None else None
+        self.ranges: List[LayerRange] = []
+
+    def add_range(self, first: int, last: Optional[int] = None, marking: Optional[Dict[str, Any]] = None,
+                  fill: Optional[Dict[str, Any]] = None, name: str = "") -> "LayerParameterSchedule":
+        """
+        Add parameter overrides for a layer range.
+
+        Args:
+            first: First layer of the range, 1-based.
+            last: Last layer of the range, inclusive; None for up to the last layer.
+            marking: Marking parameter fields to override.
+            fill: Fill parameter fields to override.
+            name: Label used in validation messages.
+
+        Returns:
+            LayerParameterSchedule: The schedule, for chaining.
+        """
+        self.ranges.append(LayerRange(first, last, dict(marking or {}), dict(fill or {}), name))
+        return self
+
+    @classmethod
+    def from_dict(cls, params: Dict[str, Any]) -> "LayerParameterSchedule":
+        """
+        Create a schedule from a parameter dictionary.
+        Reads "marking_parameters" and "fill_parameters" as the base set, an optional
+        "fill_entities" list of entity indices and an optional "layer_ranges" list of
+        {first, last, marking_parameters, fill_parameters, name}.
+        """
+        schedule = cls(params.get("marking_parameters"), params.get("fill_parameters"), params.get("fill_entities"))
+        for entry in params.get("layer_ranges") or []:
+            schedule.add_range(
+                entry.get("first", 1),
+                entry.get("last"),
+                entry.get("marking_parameters"),
+                entry.get("fill_parameters"),
+                entry.get("name", ""),
+            )
+        return schedule
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "LayerParameterSchedule":
+        """
+        Create a schedule from a YAML schedule file, in the format read by from_dict.
+
+        Raises:
+            ValueError: If the file cannot be read or does not hold a parameter dictionary.
+        """
+        try:
+            with open(path, 'r') as file:
+                params = yaml.safe_load(file) or {}
+        except (OSError, yaml.YAMLError) as e:
+            raise ValueError(f"Failed to read layer parameter schedule {path}: {e}") from e
+        if not isinstance(params, dict):
+            raise ValueError(f"Layer parameter schedule {path} does not hold a parameter dictionary")
+        return cls.from_dict(params)
+
+    @staticmethod
+    def _check_fields(label: str, params: Dict[str, Any], fields: Dict[str, type], problems: List[str]):
+        for field, value in params.items():
+            expected = fields.get(field)
+            if expected is None:
+                problems.append(f"{label}: unknown parameter '{field}'")
+            elif expected is bool:
+                if not isinstance(value, bool):
+                    problems.append(f"{label}: '{field}' must be true or false, got {value!r}")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) \
+                    or (expected is int and not float(value).is_integer()):
+                problems.append(f"{label}: '{field}' must be {'an integer' if expected is int else 'a number'}, got {value!r}")
+            elif field == "fill_mode" and int(value) not in FILL_MODES:
+                problems.append(f"{label}: 'fill_mode' must be 0 to 4, got {value!r}")
+            elif expected is float and value < 0 and not field.endswith(("Angle", "Offset")):
+                problems.append(f"{label}: '{field}' must not be negative, got {value!r}")
+
+    def validate(self, total_layers: int) -> List[str]:
+        """
+        Check the schedule against a build of total_layers layers.
+
+        Returns:
+            list: One message per problem; empty if the schedule is valid.
+        """
+        problems = []
+        if total_layers < 1:
+            problems.append(f"The build has no layers (total_layers={total_layers})")
+        self._check_fields("base marking", self.base_marking, MARK_PARAMETER_FIELDS, problems)
+        self._check_fields("base fill", self.base_fill, FILL_PARAMETER_FIELDS, problems)
+        if self.fill_entities is None:
+            if self.base_fill or any(layer_range.fill for layer_range in self.ranges):
+                problems.append("fill_entities: fill parameters are set but no target entities are listed")
+        else:
+            if not self.fill_entities:
+                problems.append("fill_entities: lists no entities")
+            for index in self.fill_entities:
+                if isinstance(index, bool) or not isinstance(index, int) or index < 0:
+                    problems.append(f"fill_entities: entity index must be a non-negative integer, got {index!r}")
+        for layer_range in self.ranges:
+            last = layer_range.last if layer_range.last is not None else total_layers
+            if not isinstance(layer_range.first, int) or not isinstance(last, int):
+                problems.append(f"{layer_range.name}: layer bounds must be integers")
+            elif layer_range.first < 1 or last < layer_range.first:
+                problems.append(f"{layer_range.name}: invalid layer range {layer_range.first}-{last}")
+            elif layer_range.first > total_layers:
+                problems.append(f"{layer_range.name}: starts after the last layer {total_layers}")
+            if not layer_range.marking and not layer_range.fill:
+                problems.append(f"{layer_range.name}: sets no parameters")
+            self._check_fields(f"{layer_range.name} marking", layer_range.marking, MARK_PARAMETER_FIELDS, problems)
+            self._check_fields(f"{layer_range.name} fill", layer_range.fill, FILL_PARAMETER_FIELDS, problems)
+        return problems
+
+    def compile(self, total_layers: int) -> "CompiledLayerSchedule":
+        """
+        Validate the schedule and precompute every layer's parameters.
+
+        Args:
+            total_layers: Number of layers of the build.
+
+        Returns:
+            CompiledLayerSchedule: The per-layer parameter sets.
+
+        Raises:
+            ValueError: If the schedule is invalid; the message lists every problem.
+        """
+        problems = self.validate(total_layers)
+        if problems:
+            raise ValueError("Invalid layer parameter schedule:\n" + "\n".join(problems))
+
+        # Cut points where some range starts or ends; layers between two cuts share parameters
+        cuts = {1, total_layers + 1}
+        for layer_range in self.ranges:
+            last = min(layer_range.last if layer_range.last is not None else total_layers, total_layers)
+            cuts.update((layer_range.first, last + 1))
+        cuts = sorted(cut for cut in cuts if cut <= total_layers + 1)
+
+        segments: List[Tuple[int, Dict[str, Any], Dict[str, Any]]] = []
+        for start in cuts[:-1]:
+            marking = dict(self.base_marking)
+            fill = dict(self.base_fill)
+            for layer_range in self.ranges:
+                last = layer_range.last if layer_range.last is not None else total_layers
+                if layer_range.first <= start <= last:
+                    marking.update(layer_range.marking)
+                    fill.update(layer_range.fill)
+            if segments and segments[-1][1] == marking and segments[-1][2] == fill:
+                continue
+            segments.append((start, marking, fill))
+        return CompiledLayerSchedule(total_layers, segments, self.fill_entities)
+
+
+class CompiledLayerSchedule:
+    """
+    A validated schedule with the parameter set of every layer precomputed.
+    Attributes:
+        total_layers: Number of layers of the build.
+        fill_entities: Entity indices the fill parameters go to.
+    Methods:
+        parameters_for(self, layer): Returns the marking and fill parameters of a layer.
+        apply(self, scancard, layer, ...): Writes a layer's parameters to the card.
+    """
+
+    def __init__(self, total_layers: int, segments: List[Tuple[int, Dict[str, Any], Dict[str, Any]]],
+                 fill_entities: Optional[List[int]] = None):
+        self.total_layers = total_layers
+        self.fill_entities = fill_entities
+        self._segments = segments
+        self._starts = [start for start, _, _ in segments]
+
+    def _segment(self, layer: int) -> int:
+        if not 1 <= layer <= self.total_layers:
+            raise ValueError(f"Layer {layer} is outside the schedule of {self.total_layers} layers")
+        return bisect_right(self._starts, layer) - 1
+
+    def parameters_for(self, layer: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Get the parameters of a layer.
+
+        Returns:
+            tuple: (marking, fill) parameter dictionaries.
+        """
+        _, marking, fill = self._segments[self._segment(layer)]
+        return dict(marking), dict(fill)
+
+    def apply(self, scancard, layer: int, card_layer_id: int = 1, fill_entities: Optional[List[int]] = None,
+              in_index: int = 1, download: bool = True):
+        """
+        Write a layer's parameters to the card at the layer change.
+        The full target set goes through the scancard's parameter cache, so only fields
+        that differ from what the card holds are sent: the delta to the previous layer
+        while the same file stays open, the full set after a file was (re)opened.
+
+        Args:
+            scancard: The Scancard to write to.
+            layer: Build layer, 1-based.
+            card_layer_id: Pen/layer id on the card the marking parameters go to.
+            fill_entities: Entity indices the fill parameters go to; defaults to the schedule's.
+            in_index: Inner entity index of the fill parameters.
+            download: Send download_Parameters after the changes.
+
+        Returns:
+            Future: Resolves to the flush summary {"written", "failed", "download"}.
+        """
+        marking, fill = self.parameters_for(layer)
+        cache = scancard.parameter_cache
+        if marking:
+            cache.set_mark_parameters(card_layer_id, marking)
+        if fill:
+            for entity_index in self.fill_entities if fill_entities is None else fill_entities:
+                cache.set_fill_parameters(entity_index, in_index, fill)
+        _, summary = cache.flush(download=download)
+        return summary
@@ -0,0 +1,290 @@
+"""
+This code contains the mark order optimizer of the entities of a feeltek scancard job.
+start_mark marks the entities in the order the file stores them. The optimizer reads
+entity positions and sizes once per file content, orders the entity centroids by
+nearest neighbour followed by 2-opt to cut galvo jump distance, optionally penalising
+consecutive entities that are close together so heat is spread across the bed, and
+marks the layer entity by entity with mark_by_index. Each plan reports the estimated
+jump time saved against the file order and the extra time spent per entity on the
+mark_by_index round trip and on detecting its end; when the saving does not cover
+that overhead the layer is marked with a single start_mark instead.
+
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from Feeltek.fileHash import content_hash
+
+
+def path_cost(cost: np.ndarray, order: List[int]) -> float:
+    """Total cost of visiting the nodes in order, starting at node 0 of the cost matrix."""
+    path = [0] + [node + 1 for node in order]
+    return float(cost[path[:-1], path[1:]].sum())
+
+
+def nearest_neighbour(cost: np.ndarray) -> List[int]:
+    """
+    Order nodes greedily from the start node.
+
+    Args:
+        cost: Square matrix of size n + 1; row and column 0 are the start point.
+
+    Returns:
+        list: The n nodes in visiting order, numbered from 0.
+    """
+    n = len(cost) - 1
+    visited = np.zeros(n + 1, dtype=bool)
+    visited[0] = True
+    current, order = 0, []
+    for _ in range(n):
+        row = np.where(visited, np.inf, cost[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        order.append(current - 1)
+    return order
+
+
+def two_opt(cost: np.ndarray, order: List[int], max_passes: int = 20) -> List[int]:
+    """
+    Improve an open path from the start node by reversing segments while that shortens it.
+
+    Args:
+        cost: Square symmetric matrix of size n + 1; row and column 0 are the start point.
+        order: Initial visiting order of the n nodes.
+        max_passes: Upper bound of improvement passes over the path.
+
+    Returns:
+        list: The improved visiting order.
+    """
+    path = np.array([0] + [node + 1 for node in order])
+    n = len(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = path[i - 1], path[i]
+            c = path[i + 1:]
+            # Reversing path[i..j] replaces edges (a, b) and (c_j, d_j) with (a, c_j) and (b, d_j)
+            d = np.append(path[i + 2:], -1)
+            has_next = d >= 0
+            d_safe = np.where(has_next, d, 0)
+            gain = cost[a, b] - cost[a, c] + np.where(has_next, cost[c, d_safe] - cost[b, d_safe], 0.0)
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                path[i:i + j + 2] = path[i:i + j + 2][::-1]
+                improved = True
+        if not improved:
+            break
+    return [int(node) - 1 for node in path[1:]]
+
+
+class MarkOrderOptimizer:
+    """
+    Plans and executes a jump-minimising mark order with mark_by_index.
+    Attributes:
+        scancard: The scancard the layer is loaded on.
+        jump_speed: Galvo jump speed in mm/s used for the time estimate.
+        heat_radius: Distance in mm below which consecutive entities are penalised; 0 disables it.
+        heat_weight: Weight of the heat penalty against jump distance.
+        first_entity_index: Index of the first entity in a job.
+        start_point: Galvo position before the first jump, in mm.
+        entity_poll_interval: Shortest status query interval in seconds while waiting for an entity.
+        max_entity_poll_interval: Longest status query interval the wait backs off to.
+        default_round_trip: Command round trip in seconds assumed before any is measured.
+    Methods:
+        plan(self): Computes the mark order of the loaded file, cached by its content.
+        entity_overhead(self): Estimates the extra time of marking one entity on its own.
+        mark_layer(self, should_stop): Marks the loaded file in the planned order, or with start_mark if that is faster.
+    """
+
+    def __init__(self, scancard, jump_speed: float = 5000.0, heat_radius: float = 0.0, heat_weight: float = 1.0,
+                 first_entity_index: int = 0, start_point=(0.0, 0.0), two_opt_passes: int = 20,
+                 entity_poll_interval: float = 0.02, max_entity_poll_interval: float = 0.25,
+                 default_round_trip: float = 0.01):
+        self.scancard = scancard
+        self.jump_speed = jump_speed
+        self.heat_radius = heat_radius
+        self.heat_weight = heat_weight
+        self.first_entity_index = first_entity_index
+        self.start_point = start_point
+        self.two_opt_passes = two_opt_passes
+        self.entity_poll_interval = entity_poll_interval
+        self.max_entity_poll_interval = max_entity_poll_interval
+        self.default_round_trip = default_round_trip
+        self.last_plan: Optional[Dict[str, Any]] = None
+        # Plans keyed by the content hash of the layer file
+        self._plans: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _read_entities(self) -> Dict[int, np.ndarray]:
+        """Read the centroid and size of every entity of the loaded file, from the geometry index if it has the file."""
+        geometry = self.scancard.cached_geometry()
+        if geometry is not None:
+            return {int(index): box[[0, 1, 3, 4]] for index, box in zip(geometry.indices, geometry.boxes)}
+
+        count_reply = self.scancard.get_entity_count().result()
+        if count_reply.get("ret_value") != 1:
+            raise RuntimeError(f"Failed to get the entity count: {count_reply.get('error', count_reply.get('ret_value'))}")
+        count = int((count_reply.get("response", {}).get("data") or {}).get("count", 0))
+        indices = list(range(self.first_entity_index, self.first_entity_index + count))
+        _, batch = self.scancard.execute_batch([("get_pos_size_by_index", {"index": index}) for index in indices])
+        entities = {}
+        for index, reply in zip(indices, batch.result()):
+            if reply.get("ret_value") != 1:
+                raise RuntimeError(f"Failed to get the position of entity {index}: {reply.get('error', reply.get('ret_value'))}")
+            data = reply.get("response", {}).get("data") or {}
+            entities[index] = np.array([float(data.get("xPos", 0.0)), float(data.get("yPos", 0.0)),
+                                        float(data.get("xSize", 0.0)), float(data.get("ySize", 0.0))])
+        return entities
+
+    def _round_trip(self, cmd: str) -> float:
+        """Median measured round trip of a command in seconds."""
+        stats = self.scancard.metrics.snapshot().get(cmd) if hasattr(self.scancard, "metrics") else None
+        if not stats or stats.get("p50_ms") is None:
+            return self.default_round_trip
+        return stats["p50_ms"] / 1000.0
+
+    def entity_overhead(self) -> float:
+        """
+        Estimate the extra time of marking one entity with mark_by_index.
+        Each entity costs a mark_by_index round trip, then a status round trip and on
+        average half the shortest poll interval until its end is seen: the first status
+        query is timed from the previous entities' mark time, so it mostly lands just
+        after the end and later ones are rarely needed.
+
+        Returns:
+            float: Seconds per entity.
+        """
+        return (self._round_trip("mark_by_index") + self._round_trip("get_working_status")
+                + self.entity_poll_interval / 2)
+
+    def plan(self) -> Dict[str, Any]:
+        """
+        Compute the mark order of the file loaded on the card.
+        Entities are read once per file content; identical layers reuse the order.
+
+        Returns:
+            dict: order (entity indices), file_order_distance and optimized_distance in
+                mm, estimated_saving in seconds of jump time per layer, overhead in
+                seconds of marking entity by entity instead of with one start_mark,
+                and use_order, True if the saving covers the overhead.
+        """
+        plan = dict(self._plan_order())
+        # Marking with start_mark costs one round trip and one end detection for the whole layer
+        plan["overhead"] = max(len(plan["order"]) - 1, 0) * self.entity_overhead()
+        plan["use_order"] = plan["estimated_saving"] > plan["overhead"]
+        return plan
+
+    def _plan_order(self) -> Dict[str, Any]:
+        """Compute the jump-minimising order of the loaded file, cached by its content."""
+        file_hash = content_hash(self.scancard.current_file) if self.scancard.current_file else None
+        with self._lock:
+            if file_hash is not None and file_hash in self._plans:
+                return self._plans[file_hash]
+
+        entities = self._read_entities()
+        indices = list(entities)
+        if len(indices) < 2:
+            plan = {"order": indices, "file_order_distance": 0.0, "optimized_distance": 0.0, "estimated_saving": 0.0}
+        else:
+            points = np.vstack([np.asarray(self.start_point, dtype=float)] + [entities[index][:2] for index in indices])
+            distance = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+            cost = distance.copy()
+            if self.heat_radius > 0:
+                # Jumping to a close neighbour keeps heating the same spot
+                penalty = self.heat_weight * np.clip(self.heat_radius - distance, 0.0, None)
+                penalty[0, :] = penalty[:, 0] = 0.0
+                np.fill_diagonal(penalty, 0.0)
+                cost += penalty
+
+            order = two_opt(cost, nearest_neighbour(cost), self.two_opt_passes)
+            file_order = list(range(len(indices)))
+            if path_cost(cost, file_order) <= path_cost(cost, order):
+                order = file_order
+            file_distance = path_cost(distance, file_order)
+            optimized_distance = path_cost(distance, order)
+            plan = {
+                "order": [indices[node] for node in order],
+                "file_order_distance": file_distance,
+                "optimized_distance": optimized_distance,
+                "estimated_saving": (file_distance - optimized_distance) / self.jump_speed,
+            }
+
+        if file_hash is not None:
+            with self._lock:
+                self._plans[file_hash] = plan
+        return plan
+
+    def mark_layer(self, should_stop: Optional[Callable[[], bool]] = None) -> Future:
+        """
+        Mark the loaded file entity by entity in the planned order.
+        Each entity is started with mark_by_index once the card is back to 'Waiting'.
+        The status is first queried about when the entity is expected to be done, then
+        at intervals doubling from entity_poll_interval up to max_entity_poll_interval,
+        so each entity costs one or two queries on the serialised command queue. If the
+        plan's saving does not cover the per-entity overhead, the layer is marked with
+        start_mark instead.
+        Runs on the scancard's job executor.
+
+        Args:
+            should_stop: Checked between entities and while waiting for each; marking stops once it returns True.
+
+        Returns:
+            Future: Resolves to {"ok", "marked", "mark_time", "plan"} or with "error" on failure.
+        """
+        def task():
+            started = time.monotonic()
+            marked = 0
+            try:
+                plan = self.plan()
+                self.last_plan = plan
+                status_service = self.scancard.status_service
+                if not plan["use_order"]:
+                    # The jumps saved do not pay for marking entity by entity
+                    reply = self.scancard.start_mark().result()
+                    if reply.get("ret_value") != 1:
+                        raise RuntimeError(f"Failed to start marking: {reply.get('error', reply.get('ret_value'))}")
+                    if not status_service.wait_for_mark_complete(should_stop=should_stop):
+                        raise RuntimeError("Stopped while marking")
+                    return {"ok": True, "marked": len(plan["order"]), "mark_time": time.monotonic() - started,
+                            "plan": plan}
+                # Delay of the first status query of an entity, learnt from the entities marked so far
+                first_query = self.entity_poll_interval
+                for index in plan["order"]:
+                    if should_stop is not None and should_stop():
+                        raise RuntimeError(f"Stopped after {marked} of {len(plan['order'])} entities")
+                    reply = self.scancard.mark_by_index(index).result()
+                    if reply.get("ret_value") != 1:
+                        raise RuntimeError(f"Failed to mark entity {index}: {reply.get('error', reply.get('ret_value'))}")
+                    entity_started = time.monotonic()
+                    # Commands are serialised, so every status reply from now on was queried after the
+                    # entity was accepted; no settle time is needed to trust a 'Waiting'
+                    status_service.notify_mark_started(settle_time=0.0)
+                    interval, backoff = first_query, self.entity_poll_interval
+                    # Every wait wakes the status service's poller for one query, so the wait
+                    # intervals decide when the card is asked
+                    queried = []  # times of this entity's status queries since entity_started
+                    while not status_service.wait_for_mark_complete(timeout=interval, should_stop=should_stop):
+                        if should_stop is not None and should_stop():
+                            raise RuntimeError(f"Stopped while marking entity {index}")
+                        queried.append(time.monotonic() - entity_started)
+                        interval, backoff = backoff, min(backoff * 2, self.max_entity_poll_interval)
+                    elapsed = time.monotonic() - entity_started
+                    if len(queried) > 1:
+                        # The entity ended between the last query that still saw it marking and its end being seen
+                        first_query = (queried[-2] + elapsed) / 2
+                    else:
+                        # Seen done at the first query: try a bit earlier next time
+                        first_query = max(0.9 * elapsed, self.entity_poll_interval)
+                    marked += 1
+                return {"ok": True, "marked": marked, "mark_time": time.monotonic() - started, "plan": plan}
+            except Exception as e:
+                self.scancard.log_error(f"Error marking layer in optimized order: {e}")
+                return {"ok": False, "marked": marked, "mark_time": time.monotonic() - started,
+                        "plan": self.last_plan, "error": str(e)}
+
+        return self.scancard.job_executor.submit(task)
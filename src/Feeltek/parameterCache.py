@@ -0,0 +1,241 @@
+"""
+This code contains the write-back cache of marking and fill parameters of the feeltek scancard.
+Parameters read from the card are kept per layer for the file that is currently open,
+so repeated reads are served from memory. Writes only update the cache and mark the
+changed fields dirty; flush sends the dirty fields of the changed layers in one
+pipelined batch followed by a single download_Parameters. Opening or closing a file
+on the card invalidates the cache, since the card reloads parameters from the file.
+
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Set, Tuple
+
+# Cache keys: ("mark", layer_id) and ("fill", index, in_index)
+CacheKey = Tuple[Any, ...]
+
+
+class _Entry:
+    """Cached values of one layer or entity, and which of them still need writing."""
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.dirty: Set[str] = set()
+        self.loaded = False  # values hold the full parameter set read from the card
+
+
+class MarkParameterCache:
+    """
+    Write-back cache of per-layer marking and fill parameters.
+    Attributes:
+        scancard: The scancard the parameters belong to.
+        file: The file the cached parameters belong to.
+        hits: Reads served from memory.
+        misses: Reads that went to the card.
+    Methods:
+        invalidate(self, file_path): Drops all cached parameters, e.g. after a file change.
+        get_mark_parameters(self, layer_id): Gets marking parameters, from memory if cached.
+        get_fill_parameters(self, index, in_index): Gets fill parameters, from memory if cached.
+        set_mark_parameters(self, layer_id, params): Updates marking parameters in the cache.
+        set_fill_parameters(self, index, in_index, params): Updates fill parameters in the cache.
+        note_write(self, key, params, future): Records a write sent directly to the card.
+        dirty_keys(self): Lists the entries with unwritten changes.
+        flush(self, download): Writes the dirty fields to the card.
+    """
+
+    MARK = "mark"
+    FILL = "fill"
+    DOWNLOAD_KEY = ("download",)
+
+    def __init__(self, scancard):
+        self.scancard = scancard
+        self.file: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[CacheKey, _Entry] = {}
+        self._generation = 0  # bumped on invalidation so late replies for an old file are ignored
+        self._lock = threading.Lock()
+
+    def invalidate(self, file_path: Optional[str] = None):
+        """Drop all cached parameters and unwritten changes, and note the file now open."""
+        with self._lock:
+            self.file = file_path
+            self._entries.clear()
+            self._generation += 1
+
+    def _get(self, key: CacheKey, cmd: str, data: Dict[str, Any]) -> Future:
+        """Serve a read from memory, or fetch it from the card and cache the reply."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.loaded:
+                self.hits += 1
+                future = Future()
+                future.set_result({"ret_value": 1, "response": {"cmd": cmd, "ret": 1, "data": dict(entry.values)}, "cached": True})
+                return future
+            self.misses += 1
+            generation = self._generation
+
+        card_future = self.scancard.execute_command(cmd, data)
+        future = Future()
+
+        def on_reply(f: Future):
+            result = f.result()
+            if result.get("ret_value") == 1:
+                values = dict(result.get("response", {}).get("data") or {})
+                with self._lock:
+                    if generation == self._generation:
+                        entry = self._entries.setdefault(key, _Entry())
+                        # Changes made while the read was in flight win over the card's values
+                        for field in entry.dirty:
+                            values[field] = entry.values[field]
+                        entry.values = values
+                        entry.loaded = True
+                        if entry.dirty:
+                            result = {**result, "response": {**result["response"], "data": dict(values)}}
+            future.set_result(result)
+
+        card_future.add_done_callback(on_reply)
+        return future
+
+    def get_mark_parameters(self, layer_id: int) -> Future:
+        """
+        Get marking parameters for a layer.
+
+        Returns:
+            Future: Resolves to the same result format as Scancard.get_markParameters_by_layer.
+        """
+        return self._get((self.MARK, layer_id), "get_markParameters_by_layer", {"layer_id": layer_id})
+
+    def get_fill_parameters(self, index: int, in_index: int = 1) -> Future:
+        """
+        Get fill parameters by index.
+
+        Returns:
+            Future: Resolves to the same result format as Scancard.get_entity_fill_property_by_index.
+        """
+        return self._get((self.FILL, index, in_index), "get_entity_fill_property_by_index",
+                         {"index": index, "in_index": in_index})
+
+    def _set(self, key: CacheKey, params: Dict[str, Any]) -> int:
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            changed = 0
+            for field, value in params.items():
+                if field in entry.values and entry.values[field] == value:
+                    continue
+                entry.values[field] = value
+                entry.dirty.add(field)
+                changed += 1
+            return changed
+
+    def set_mark_parameters(self, layer_id: int, params: Dict[str, Any]) -> int:
+        """
+        Update marking parameters of a layer in the cache.
+        Fields equal to the cached value are left clean; fields of a layer that was
+        never read are all treated as changed.
+
+        Returns:
+            int: The number of fields marked dirty.
+        """
+        return self._set((self.MARK, layer_id), params)
+
+    def set_fill_parameters(self, index: int, in_index: int, params: Dict[str, Any]) -> int:
+        """
+        Update fill parameters by index in the cache.
+
+        Returns:
+            int: The number of fields marked dirty.
+        """
+        return self._set((self.FILL, index, in_index), params)
+
+    def note_write(self, key: CacheKey, params: Dict[str, Any], future: Future):
+        """Record a write sent to the card outside the cache once it succeeds."""
+        with self._lock:
+            generation = self._generation
+
+        def on_reply(f: Future):
+            if f.cancelled() or f.result().get("ret_value") != 1:
+                return
+            with self._lock:
+                entry = self._entries.get(key)
+                if generation != self._generation or entry is None:
+                    return
+                for field, value in params.items():
+                    entry.values[field] = value
+                    entry.dirty.discard(field)
+
+        future.add_done_callback(on_reply)
+
+    def dirty_keys(self):
+        """List the cache keys with unwritten changes."""
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.dirty]
+
+    def _command_for(self, key: CacheKey, fields: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        if key[0] == self.MARK:
+            return "set_markParameters_by_layer", {"layer_id": key[1], **fields}
+        return "set_entity_fill_property_by_index", {"index": key[1], "in_index": key[2], **fields}
+
+    def flush(self, download: bool = True) -> Tuple[Dict[CacheKey, Future], Future]:
+        """
+        Write the dirty fields of every changed entry to the card.
+        All writes and one download_Parameters go out as a single pipelined batch.
+        Fields are marked clean once their write succeeds and unchanged since; a failed
+        or cancelled write leaves them dirty for the next flush.
+
+        Args:
+            download: Append download_Parameters so the card applies the changes.
+
+        Returns:
+            tuple: (futures, aggregate). futures maps each written cache key, and
+                DOWNLOAD_KEY if a download was queued, to its command future; aggregate
+                resolves to {"written": [...], "failed": [...], "download": result}.
+        """
+        with self._lock:
+            generation = self._generation
+            snapshot = [
+                (key, {field: entry.values[field] for field in entry.dirty})
+                for key, entry in self._entries.items() if entry.dirty
+            ]
+
+        if not snapshot:
+            aggregate = Future()
+            aggregate.set_result({"written": [], "failed": [], "download": None})
+            return {}, aggregate
+
+        commands = [self._command_for(key, fields) for key, fields in snapshot]
+        if download:
+            commands.append(("download_Parameters", None))
+        batch_futures, batch = self.scancard.execute_batch(commands)
+
+        futures: Dict[CacheKey, Future] = {}
+        for (key, fields), future in zip(snapshot, batch_futures):
+            futures[key] = future
+
+            def on_written(f: Future, key=key, fields=fields):
+                if f.cancelled() or f.result().get("ret_value") != 1:
+                    return
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if generation != self._generation or entry is None:
+                        return
+                    for field, value in fields.items():
+                        if entry.values.get(field) == value:
+                            entry.dirty.discard(field)
+
+            future.add_done_callback(on_written)
+        if download:
+            futures[self.DOWNLOAD_KEY] = batch_futures[-1]
+
+        aggregate = Future()
+
+        def on_batch(f: Future):
+            results = f.result()
+            summary = {"written": [], "failed": [], "download": results[-1] if download else None}
+            for (key, _), result in zip(snapshot, results):
+                (summary["written"] if result.get("ret_value") == 1 else summary["failed"]).append(key)
+            aggregate.set_result(summary)
+
+        batch.add_done_callback(on_batch)
+        return futures, aggregate
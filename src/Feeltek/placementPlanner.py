@@ -0,0 +1,287 @@
+"""
+This code contains the placement planner of the entities of a feeltek scancard job.
+A target layout gives every entity's position, rotation and optionally size. The
+planner keeps the pose of every entity on the card, composes the transform from the
+current to the target pose of all entities at once as homogeneous matrices in NumPy,
+and reduces it to the fewest commands: a rigid move with rotation becomes a single
+rotation about its fixed point, and a move shared by every entity of the job becomes
+one whole-template command. All commands go out in one pipelined batch. The resulting
+poses are cached, so applying the layout already on the card sends nothing.
+
+Positions are the entity positions reported by get_pos_size_by_index, taken as the
+entity centre; angles are in degrees, counterclockwise, relative to the file as opened.
+
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Position tolerance in mm and angle tolerance in degrees below which nothing is sent
+POSITION_TOLERANCE = 1e-4
+ANGLE_TOLERANCE = 1e-4
+
+Layout = Dict[int, Dict[str, float]]
+Command = Tuple[str, Dict[str, Any]]
+
+
+def pose_matrices(poses: np.ndarray) -> np.ndarray:
+    """
+    Build homogeneous 2D transforms from poses.
+
+    Args:
+        poses: Array of shape (n, 3) with x, y and angle in degrees per row.
+
+    Returns:
+        np.ndarray: Array of shape (n, 3, 3) mapping entity coordinates to job coordinates.
+    """
+    theta = np.radians(poses[:, 2])
+    cos, sin = np.cos(theta), np.sin(theta)
+    matrices = np.zeros((len(poses), 3, 3))
+    matrices[:, 0, 0] = cos
+    matrices[:, 0, 1] = -sin
+    matrices[:, 1, 0] = sin
+    matrices[:, 1, 1] = cos
+    matrices[:, 0, 2] = poses[:, 0]
+    matrices[:, 1, 2] = poses[:, 1]
+    matrices[:, 2, 2] = 1.0
+    return matrices
+
+
+def rigid_deltas(current: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compose the transforms taking every current pose to its target pose.
+
+    Args:
+        current: Array of shape (n, 3) of current x, y, angle.
+        target: Array of shape (n, 3) of target x, y, angle.
+
+    Returns:
+        tuple: (angles, translations, centres). angles (n,) is the rotation of each
+            delta in degrees, translations (n, 2) its translation part, and centres
+            (n, 2) the fixed point of each delta with a rotation (NaN without one),
+            so the delta equals a single rotation about that point.
+    """
+    deltas = pose_matrices(target) @ np.linalg.inv(pose_matrices(current))
+    angles = np.degrees(np.arctan2(deltas[:, 1, 0], deltas[:, 0, 0]))
+    translations = deltas[:, :2, 2]
+
+    centres = np.full((len(current), 2), np.nan)
+    rotating = np.abs(angles) > ANGLE_TOLERANCE
+    if rotating.any():
+        # The fixed point p of x -> Rx + t solves (I - R) p = t
+        fixed = np.eye(2) - deltas[rotating, :2, :2]
+        centres[rotating] = np.linalg.solve(fixed, translations[rotating][:, :, None])[:, :, 0]
+    return angles, translations, centres
+
+
+class PlacementPlanner:
+    """
+    Plans and applies entity layouts with the minimal set of scancard commands.
+    Attributes:
+        scancard: The scancard the entities are on.
+        file: The file the cached poses belong to.
+        commands_sent: Transform commands sent so far.
+        commands_saved: Commands avoided against one call per entity and transform.
+    Methods:
+        invalidate(self, file_path): Drops all cached poses, e.g. after a file change.
+        plan(self, layout): Computes the commands that move the entities to a layout.
+        apply(self, layout): Sends the commands of a layout and caches the resulting poses.
+    """
+
+    def __init__(self, scancard):
+        self.scancard = scancard
+        self.file: Optional[str] = None
+        self.commands_sent = 0
+        self.commands_saved = 0
+        # Entity index -> {"x", "y", "angle", "zPos", "xSize", "ySize", "zSize"}
+        self._poses: Dict[int, Dict[str, float]] = {}
+        self._entity_count: Optional[int] = None
+        self._applied_layout: Optional[Layout] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, file_path: Optional[str] = None):
+        """Drop all cached poses and note the file now open."""
+        with self._lock:
+            self.file = file_path
+            self._poses.clear()
+            self._entity_count = None
+            self._applied_layout = None
+            self._generation += 1
+
+    def _load_poses(self, indices: List[int]):
+        """Read the poses of entities not cached yet, and the entity count, in one batch."""
+        with self._lock:
+            generation = self._generation
+            missing = [index for index in indices if index not in self._poses]
+            need_count = self._entity_count is None
+        commands = [("get_pos_size_by_index", {"index": index}) for index in missing]
+        if need_count:
+            commands.append(("get_entity_count", None))
+        if not commands:
+            return
+
+        _, batch = self.scancard.execute_batch(commands)
+        results = batch.result()
+        with self._lock:
+            if generation != self._generation:
+                raise RuntimeError("The file changed while entity positions were read")
+            for index, result in zip(missing, results):
+                if result.get("ret_value") != 1:
+                    raise RuntimeError(f"Failed to read the position of entity {index}: "
+                                       f"{result.get('error', result.get('ret_value'))}")
+                data = result.get("response", {}).get("data") or {}
+                self._poses[index] = {
+                    "x": float(data.get("xPos", 0.0)), "y": float(data.get("yPos", 0.0)), "angle": 0.0,
+                    "zPos": float(data.get("zPos", 0.0)), "xSize": float(data.get("xSize", 0.0)),
+                    "ySize": float(data.get("ySize", 0.0)), "zSize": float(data.get("zSize", 0.0)),
+                }
+            if need_count and results[-1].get("ret_value") == 1:
+                self._entity_count = int((results[-1].get("response", {}).get("data") or {}).get("count", 0))
+
+    def _targets(self, layout: Layout) -> Dict[int, Dict[str, float]]:
+        """Complete every target pose with the current values of the fields it leaves out."""
+        targets = {}
+        for index, target in layout.items():
+            pose = dict(self._poses[index])
+            pose.update({field: float(value) for field, value in target.items() if field in pose})
+            targets[index] = pose
+        return targets
+
+    def plan(self, layout: Layout) -> Tuple[List[Command], Dict[int, List[int]]]:
+        """
+        Compute the commands that move the entities to a layout.
+        Entity poses not cached yet are read from the card first.
+
+        Args:
+            layout: Entity index -> {"x", "y", "angle", and optionally "xSize", "ySize"};
+                fields left out keep their current value.
+
+        Returns:
+            tuple: (commands, owners). commands is the list of (cmd, data) to send in
+                order; owners maps each command position to the entity indices it moves.
+        """
+        indices = sorted(layout)
+        self._load_poses(indices)
+        with self._lock:
+            targets = self._targets(layout)
+            current = {index: dict(self._poses[index]) for index in indices}
+            entity_count = self._entity_count
+
+        commands: List[Command] = []
+        owners: Dict[int, List[int]] = {}
+
+        def add(cmd, data, entities):
+            owners[len(commands)] = entities
+            commands.append((cmd, data))
+
+        resized = [index for index in indices
+                   if abs(targets[index]["xSize"] - current[index]["xSize"]) > POSITION_TOLERANCE
+                   or abs(targets[index]["ySize"] - current[index]["ySize"]) > POSITION_TOLERANCE]
+        rigid = [index for index in indices if index not in resized]
+
+        # Size changes: set_pos_size acts on the unrotated entity, so undo and redo the rotation around it
+        for index in resized:
+            cur, tgt = current[index], targets[index]
+            if abs(cur["angle"]) > ANGLE_TOLERANCE:
+                add("rotate_entity_by_index", {"index": index, "cx": cur["x"], "cy": cur["y"], "fAngle": -cur["angle"]}, [index])
+            add("set_pos_size_by_index", {
+                "index": index, "xPos": tgt["x"], "yPos": tgt["y"], "zPos": tgt["zPos"],
+                "xSize": tgt["xSize"], "ySize": tgt["ySize"], "zSize": tgt["zSize"]}, [index])
+            if abs(tgt["angle"]) > ANGLE_TOLERANCE:
+                add("rotate_entity_by_index", {"index": index, "cx": tgt["x"], "cy": tgt["y"], "fAngle": tgt["angle"]}, [index])
+
+        if rigid:
+            cur = np.array([[current[i]["x"], current[i]["y"], current[i]["angle"]] for i in rigid])
+            tgt = np.array([[targets[i]["x"], targets[i]["y"], targets[i]["angle"]] for i in rigid])
+            angles, translations, centres = rigid_deltas(cur, tgt)
+            rotating = np.abs(angles) > ANGLE_TOLERANCE
+            moving = rotating | (np.abs(translations) > POSITION_TOLERANCE).any(axis=1)
+
+            # One whole-template command when every entity of the job moves the same way
+            shared = (
+                not resized and entity_count is not None and len(rigid) == entity_count and moving.all()
+                and np.allclose(angles, angles[0], atol=ANGLE_TOLERANCE)
+                and np.allclose(translations, translations[0], atol=POSITION_TOLERANCE)
+            )
+            if shared and len(rigid) > 1:
+                if rotating[0]:
+                    add("rotate_entity", {"cx": float(centres[0, 0]), "cy": float(centres[0, 1]), "fAngle": float(angles[0])}, rigid)
+                else:
+                    add("translate_entity", {"dx": float(translations[0, 0]), "dy": float(translations[0, 1])}, rigid)
+            else:
+                for row, index in enumerate(rigid):
+                    if rotating[row]:
+                        add("rotate_entity_by_index", {"index": index, "cx": float(centres[row, 0]),
+                                                       "cy": float(centres[row, 1]), "fAngle": float(angles[row])}, [index])
+                    elif moving[row]:
+                        add("translate_entity_by_index", {"index": index, "dx": float(translations[row, 0]),
+                                                          "dy": float(translations[row, 1])}, [index])
+
+        # Against a translate, a rotate and a set_pos_size per entity
+        naive = sum(1 + (abs(targets[i]["angle"] - current[i]["angle"]) > ANGLE_TOLERANCE) + (i in resized)
+                    for i in indices if targets[i] != current[i])
+        with self._lock:
+            self.commands_saved += max(naive - len(commands), 0)
+        return commands, owners
+
+    def apply(self, layout: Layout) -> Future:
+        """
+        Move the entities to a layout with the minimal set of commands in one batch.
+        Applying the layout that is already on the card resolves at once without
+        sending anything.
+
+        Args:
+            layout: Entity index -> {"x", "y", "angle", and optionally "xSize", "ySize"}.
+
+        Returns:
+            Future: Resolves to {"commands": number sent, "failed": entity indices whose
+                commands failed, "skipped": True if the layout was already applied}.
+        """
+        layout = {index: dict(target) for index, target in layout.items()}
+        with self._lock:
+            if self._applied_layout == layout:
+                future = Future()
+                future.set_result({"commands": 0, "failed": [], "skipped": True})
+                return future
+
+        def task():
+            try:
+                commands, owners = self.plan(layout)
+                with self._lock:
+                    generation = self._generation
+                    targets = self._targets(layout)
+                if not commands:
+                    with self._lock:
+                        self._applied_layout = layout
+                    return {"commands": 0, "failed": [], "skipped": False}
+
+                _, batch = self.scancard.execute_batch(commands)
+                self.scancard.geometry_changed = True
+                results = batch.result()
+
+                failed = set()
+                with self._lock:
+                    self.commands_sent += len(commands)
+                    for position, result in enumerate(results):
+                        if result.get("ret_value") == 1:
+                            continue
+                        for index in owners[position]:
+                            failed.add(index)
+                            # Without a reply the command may or may not have run; re-read next time
+                            if "error" in result:
+                                self._poses.pop(index, None)
+                    if generation == self._generation:
+                        for index, pose in targets.items():
+                            if index not in failed and index in self._poses:
+                                self._poses[index] = pose
+                        self._applied_layout = None if failed else layout
+                return {"commands": len(commands), "failed": sorted(failed), "skipped": False}
+            except Exception as e:
+                self.scancard.log_error(f"Error applying entity layout: {e}")
+                return {"commands": 0, "failed": sorted(layout), "skipped": False, "error": str(e)}
+
+        return self.scancard.job_executor.submit(task)
@@ -2,9 +2,20 @@ import threading
 import socket
 import json
 import time
-from typing import Optional, Dict, Any, List
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from concurrent.futures import ThreadPoolExecutor, Future
 from PyQt5.QtCore import QMutex
+from Feeltek.connectionPool import ScancardConnectionPool, RequestSentError, NON_IDEMPOTENT_COMMANDS
+from Feeltek.statusService import ScancardStatusService
+from Feeltek.parameterCache import MarkParameterCache
+from Feeltek.placementPlanner import PlacementPlanner
+from Feeltek.fileHash import content_hash
+from Feeltek.scancardHealth import ScancardHealth
+from Feeltek.commandMetrics import CommandMetrics
+from Feeltek.timeoutPolicy import TimeoutPolicy
+from Feeltek.laserErrorLogging import LaserErrorCapture
+from Feeltek.geometryIndex import LayerGeometryIndex
 
 class Scancard:
     """
@@ -24,8 +35,17 @@ class Scancard:
         formatted_response: The formatted response.
         layer_id: The layer ID.
     Methods:
-        __init__(self, parent=None): Initializes the Scancard object.
+        __init__(self, parent=None, host, port): Initializes the Scancard object for a card endpoint.
         api(self): Sends an API request to localhost:50000 and prints out the response.
+        connection_stats(self): Gets connection reuse statistics of the connection pool.
+        execute_batch(self, commands, stop_on_error): Executes several commands pipelined over one connection.
+        execute_priority_command(self, cmd, data): Executes a safety-critical command ahead of the queue.
+        priority_latency_stats(self): Gets call-to-wire latency statistics of priority commands.
+        health_stats(self): Gets connection health and circuit breaker counters.
+        command_metrics(self): Gets latency histograms and retry counters per command.
+        command_timeouts(self): Gets the current adaptive reply timeout per command.
+        recent_errors(self, n, layer): Gets the last captured command errors, optionally of one layer.
+        validate_layers(self, first_layer, last_layer): Validates a range of layers in one pipelined batch.
         get_working_status(self): Gets the working status of the Scancard.
         set_markparameters_by_index(self): Updates mark parameters by index.
         set_markparameters_by_layer(self): Updates mark parameters by layer.
@@ -33,6 +53,9 @@ class Scancard:
         get_markparameters_by_layer(self): Gets a list of mark parameter values by layer.
         get_log(self): Gets the log.
         open_file(self): Opens an .emd file on the Scancard.
+        load_file(self, file_path): Swaps to a file unless identical content is already loaded.
+        prefetch_file_hash(self, file_path): Hashes an upcoming file in the background.
+        cached_geometry(self): Gets the indexed entity geometry of the loaded file.
         close_file(self): Closes a file on the Scancard.
         start_mark(self): Starts marking.
         stop_mark(self): Stops marking.
@@ -61,6 +84,7 @@ class Scancard:
         get_content_by_name(self, name): Gets content based on name.
         set_content_by_name(self, name, content): Sets content based on name.
         delete_by_index(self, index): Deletes objects based on index.
+        delete_entities(self, indices): Deletes several objects in one batch.
         copy_by_index(self, index): Copies objects based on index.
         mark_by_index(self, index): Marks objects by index.
         read_input(self): Reads input.
@@ -116,14 +140,14 @@ class Scancard:
         44: "Failed to enable the visual positioning module (the dongle does not contain its Function)"
     }
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, host: str = "localhost", port: int = 50000):
         try:
             self.parent = parent
             self.input_file_path = ""  # path to .emd file created
             self.input_file = ""       # name of the .emd file created
             self.input_cli = ""
-            self.HOST = "localhost"
-            self.PORT = 50000
+            self.HOST = host
+            self.PORT = port
             self.timeout = 5
             self.file = ""
             self.ret_value = 1
@@ -138,6 +162,61 @@ class Scancard:
             self.executor = ThreadPoolExecutor(max_workers=1)
             self.mutex = QMutex()
 
+            # Per-command latency histograms, retry/timeout counters and reply sizes
+            self.metrics = CommandMetrics()
+
+            # Reply timeouts per command, learned from the latencies recorded in metrics
+            self.timeout_policy = TimeoutPolicy()
+            self.metrics.latency_observer = self.timeout_policy.record_latency
+            self.metrics.timeout_observer = self.timeout_policy.record_timeout
+
+            # Long-lived sockets to the card host, reused across commands
+            self.connection_pool = ScancardConnectionPool(self.HOST, self.PORT, timeout=self.timeout)
+            self.connection_pool.reply_observer = self.metrics.record_reply
+
+            # Jobs that issue their own commands must not occupy the command executor
+            self.job_executor = ThreadPoolExecutor(max_workers=1)
+
+            # Safety-critical commands bypass the command queue on their own connection
+            self.priority_executor = ThreadPoolExecutor(max_workers=1)
+            self.priority_pool = ScancardConnectionPool(self.HOST, self.PORT, timeout=self.timeout, max_connections=1)
+            self.priority_pool.reply_observer = self.metrics.record_reply
+            self.priority_latencies = deque(maxlen=200)  # (cmd, seconds from call to wire)
+            self._priority_pending = 0
+            self._priority_lock = threading.Lock()
+            self._priority_idle = threading.Event()
+            self._priority_idle.set()
+
+            # Failed command results with the card's error description, per layer
+            self.error_capture = LaserErrorCapture(self)
+
+            # Connection health; fails commands fast while the card host is down
+            self.health = ScancardHealth(self.HOST, self.PORT)
+
+            # Single owner of working status polling
+            self.status_service = ScancardStatusService(self)
+
+            # Marking and fill parameters of the open file, served from memory
+            self.parameter_cache = MarkParameterCache(self)
+
+            # Entity poses of the open file, moved with the fewest transform commands
+            self.placement_planner = PlacementPlanner(self)
+
+            # Entity counts, names and boxes of layer files, read from disk instead of the card
+            self.geometry_index = LayerGeometryIndex()
+            self.geometry_changed = False  # entities moved or edited since the file was opened
+
+            # Content hash of the file loaded on the card, computed in the background, so an
+            # identical next layer file does not need a close/open swap
+            self.hash_executor = ThreadPoolExecutor(max_workers=1)
+            self._loaded_hash: Optional[Future] = None
+            self.file_swaps_skipped = 0
+            self.health.add_listener(self._forget_loaded_file)
+
+            # Layer validation results keyed by (file content hash, entity index, subindex)
+            self._validation_cache = {}
+            self._validation_lock = threading.Lock()
+
             # Track file queues for multi-layer printing
             self.file_queue = []
             self.current_file_index = -1
@@ -148,29 +227,32 @@ class Scancard:
     def api(self):
         try:
             json_string = json.dumps(self.req)
-            with socket.create_connection((self.HOST, self.PORT), timeout=self.timeout) as sock:
-                self.log_info(f"{self.function}-> Connecting to {self.HOST}:{self.PORT}...")
-                sock.sendall(json_string.encode())
-                self.log_info(f"{self.function}-> Sending {self.req} to {self.HOST}:{self.PORT} with timeout of {self.timeout}s")
-                ret = sock.recv(1024)
-                if ret:
-                    self.handle_response(ret)
-                else:
-                    self.log_error(f"E203 - {self.function} not successful - Request {self.req} TIMED OUT!!")
+            self.log_info(f"{self.function}-> Sending {self.req} to {self.HOST}:{self.PORT} with timeout of {self.timeout}s")
+            response_data = self.connection_pool.request(json_string.encode())
+            self.handle_response(response_data)
         except (socket.timeout, socket.error, json.JSONDecodeError) as e:
             self.log_error(f"E200 - {self.function} not successful \n {e}")
 
-    def handle_response(self, response: bytes):
-        try:
-            ret_decoded = response.decode('GB18030', errors='replace')
-            json_end_index = ret_decoded.rfind('}') + 1
-            json_content = ret_decoded[:json_end_index]
-            response_data = json.loads(json_content)
-            formatted_json = json.dumps(response_data, indent=4, ensure_ascii=False)
-            self.ret_value = response_data.get("ret")
-            self.log_info(f"{self.function}-> Response received from {self.HOST}:{self.PORT} - {formatted_json}")
-        except json.JSONDecodeError as e:
-            self.log_error(f"E202 - {self.function} not successful \n {e}")
+    def handle_response(self, response_data: Dict[str, Any]):
+        formatted_json = json.dumps(response_data, indent=4, ensure_ascii=False)
+        self.ret_value = response_data.get("ret")
+        self.log_info(f"{self.function}-> Response received from {self.HOST}:{self.PORT} - {formatted_json}")
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Get connection reuse statistics of the connection pool."""
+        return self.connection_pool.stats()
+
+    def command_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get latency histograms, retry/timeout/failure counts and reply sizes per command."""
+        return self.metrics.snapshot()
+
+    def command_timeouts(self) -> Dict[str, Dict[str, float]]:
+        """Get the current reply timeout, window size and timeouts in a row per command."""
+        return self.timeout_policy.snapshot()
+
+    def health_stats(self) -> Dict[str, Any]:
+        """Get connection health and circuit breaker counters."""
+        return self.health.stats()
 
     def log_info(self, message: str):
         # print({"info": message})
@@ -185,40 +267,53 @@ class Scancard:
         if data:
             self.req["data"] = data
 
+    def _yield_to_priority(self):
+        """Hold back a queued request while a safety-critical command is waiting to go out."""
+        if not self._priority_idle.is_set():
+            self._priority_idle.wait(self.timeout)
+
     def execute_command(self, cmd: str, data: Optional[Dict[str, Any]] = None, retries=3, retry_delay=1.0) -> Future:
         def task():
             attempts = 0
             while attempts < retries:
+                if not self.health.allow_request():
+                    self.log_error(f"Command {cmd} failed fast, scancard is down")
+                    self.metrics.record_failure(cmd)
+                    return self.health.unavailable_result()
                 try:
+                    self._yield_to_priority()
                     json_string = json.dumps({"sid": 0, "cmd": cmd, "data": data} if data else {"sid": 0, "cmd": cmd})
-                    with socket.create_connection((self.HOST, self.PORT), timeout=self.timeout) as sock:
-                        sock.sendall(json_string.encode())
-                        ret = sock.recv(1024)
-                        if ret:
-                            ret_decoded = ret.decode('GB18030', errors='replace')
-                            json_end_index = ret_decoded.rfind('}') + 1
-                            json_content = ret_decoded[:json_end_index]
-                            response_data = json.loads(json_content)
-                            self.log_info(f"Command {cmd} executed successfully")
-                            return {"ret_value": response_data.get("ret"), "response": response_data}
-                        else:
-                            self.log_error(f"No response received for command: {cmd}")
-                            attempts += 1
-                            if attempts < retries:
-                                time.sleep(retry_delay)
-                                self.log_info(f"Retrying command {cmd}, attempt {attempts+1}/{retries}")
-                            continue
+                    started = time.perf_counter()
+                    response_data = self.connection_pool.request(json_string.encode(), timeout=self.timeout_policy.timeout_for(cmd),
+                                                                 idempotent=cmd not in NON_IDEMPOTENT_COMMANDS)
+                    self.metrics.record_latency(cmd, time.perf_counter() - started)
+                    self.health.record_success()
+                    self.log_info(f"Command {cmd} executed successfully")
+                    return {"ret_value": response_data.get("ret"), "response": response_data}
                 except (socket.timeout, socket.error) as e:
                     self.log_error(f"Socket error executing command {cmd}: {e}")
+                    self.health.record_failure(e)
+                    if isinstance(e, socket.timeout):
+                        self.metrics.record_timeout(cmd)
+                    if isinstance(e, (RequestSentError, socket.timeout)) and cmd in NON_IDEMPOTENT_COMMANDS:
+                        # The card may have run it; sending it again could e.g. mark twice
+                        self.metrics.record_failure(cmd)
+                        return {"ret_value": -1, "error": f"Reply to {cmd} lost, not resent: {e}"}
                     attempts += 1
                     if attempts < retries:
+                        self.metrics.record_retry(cmd)
                         time.sleep(retry_delay)
                         self.log_info(f"Retrying command {cmd}, attempt {attempts+1}/{retries}")
                     continue
                 except json.JSONDecodeError as e:
                     self.log_error(f"JSON decode error executing command {cmd}: {e}")
+                    if cmd in NON_IDEMPOTENT_COMMANDS:
+                        # A garbled reply means the request was delivered
+                        self.metrics.record_failure(cmd)
+                        return {"ret_value": -1, "error": f"Reply to {cmd} unreadable, not resent: {e}"}
                     attempts += 1
                     if attempts < retries:
+                        self.metrics.record_retry(cmd)
                         time.sleep(retry_delay)
                         self.log_info(f"Retrying command {cmd}, attempt {attempts+1}/{retries}")
                     continue
@@ -228,13 +323,248 @@ class Scancard:
             
             # If we've reached this point, all retries failed
             self.log_error(f"Command {cmd} failed after {retries} attempts")
+            self.metrics.record_failure(cmd)
             return {"ret_value": -1, "error": "Command failed after retries"}
 
+        if not self.health.allow_request():
+            self.metrics.record_failure(cmd)
+            return self._completed_future(self.health.unavailable_result())
+
+        self.mutex.lock()
+        future = self.executor.submit(task)
+        future.add_done_callback(lambda f: self.mutex.unlock())
+        future.add_done_callback(lambda f: self.error_capture.observe(cmd, f.result()))
+        return future
+
+    def _completed_future(self, result) -> Future:
+        """Wrap a result in an already completed future."""
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def execute_batch(self, commands: List[Tuple[str, Optional[Dict[str, Any]]]], stop_on_error=False,
+                      pipeline_depth=16, retries=3, retry_delay=1.0) -> Tuple[List[Future], Future]:
+        """
+        Execute several commands pipelined over one connection.
+        Requests are streamed without waiting for each reply, so a batch is limited by
+        the card's processing time rather than one round trip per command. A command
+        whose future is cancelled before its request goes out is not sent.
+
+        Args:
+            commands: List of (cmd, data) tuples; data may be None.
+            stop_on_error: Stop sending once a command does not return 1. Commands
+                already in flight still complete; the rest are skipped.
+            pipeline_depth: Maximum number of unanswered requests on the connection.
+            retries: Connection attempts before unanswered commands are failed.
+            retry_delay: Delay in seconds between connection attempts.
+
+        Returns:
+            tuple: (futures, aggregate). futures holds one Future per command with the
+                same result format as execute_command; aggregate resolves to the list
+                of all results, in command order, once every command has finished.
+        """
+        futures = [Future() for _ in commands]
+        aggregate = Future()
+
+        def task():
+            pending = deque(range(len(commands)))
+            in_flight = deque()
+            started = set()
+            sent_at = {}
+            state = {"stop": False}
+
+            def requests():
+                while pending and not state["stop"]:
+                    # Pause between requests while a priority command goes out
+                    self._yield_to_priority()
+                    i = pending.popleft()
+                    if i not in started:
+                        if not futures[i].set_running_or_notify_cancel():
+                            continue
+                        started.add(i)
+                    cmd, data = commands[i]
+                    in_flight.append(i)
+                    sent_at[i] = time.perf_counter()
+                    yield json.dumps({"sid": 0, "cmd": cmd, "data": data} if data else {"sid": 0, "cmd": cmd}).encode()
+
+            def on_response(response_data):
+                self.health.record_success()
+                i = in_flight.popleft()
+                cmd = commands[i][0]
+                self.metrics.record_latency(cmd, time.perf_counter() - sent_at[i])
+                if response_data.get("cmd") not in (None, cmd):
+                    raise ValueError(f"Reply to {response_data.get('cmd')} received while waiting for {cmd}")
+                result = {"ret_value": response_data.get("ret"), "response": response_data}
+                futures[i].set_result(result)
+                if stop_on_error and result["ret_value"] != 1:
+                    self.log_error(f"Batch command {cmd} failed, skipping the remaining commands")
+                    state["stop"] = True
+
+            try:
+                attempts = 0
+                while pending and not state["stop"]:
+                    if not self.health.allow_request():
+                        self.log_error("Batch stopped, scancard is down")
+                        break
+                    try:
+                        self.connection_pool.pipeline(requests(), on_response, depth=pipeline_depth,
+                                                      timeout=self.timeout_policy.timeout_for_batch(commands))
+                    except (socket.timeout, socket.error, ValueError) as e:
+                        self.log_error(f"Error executing batch of {len(commands)} commands: {e}")
+                        if not isinstance(e, ValueError):
+                            self.health.record_failure(e)
+                        if isinstance(e, socket.timeout) and in_flight:
+                            self.metrics.record_timeout(commands[in_flight[0]][0])
+                        # Commands that change the job may have been applied; fail them instead of resending
+                        for i in [i for i in in_flight if commands[i][0] in NON_IDEMPOTENT_COMMANDS]:
+                            in_flight.remove(i)
+                            self.metrics.record_failure(commands[i][0])
+                            futures[i].set_result({"ret_value": -1,
+                                                   "error": f"Reply to {commands[i][0]} lost, not resent: {e}"})
+                            if stop_on_error:
+                                state["stop"] = True
+                        # Resend the unanswered commands first, in their original order
+                        pending.extendleft(reversed(in_flight))
+                        attempts += 1
+                        if attempts >= retries:
+                            in_flight.clear()
+                            break
+                        for i in in_flight:
+                            self.metrics.record_retry(commands[i][0])
+                        in_flight.clear()
+                        time.sleep(retry_delay)
+                        self.log_info(f"Retrying batch, attempt {attempts+1}/{retries}")
+
+                failed = {"ret_value": -1, "error": "Command failed after retries"}
+                skipped = {"ret_value": -1, "error": "Skipped after an earlier command failed"}
+                if pending and not state["stop"] and not self.health.allow_request():
+                    failed = skipped = self.health.unavailable_result()
+                for i in pending:
+                    if i in started:
+                        self.metrics.record_failure(commands[i][0])
+                        futures[i].set_result(failed)
+                    elif futures[i].set_running_or_notify_cancel():
+                        futures[i].set_result(skipped)
+            except Exception as e:
+                self.log_error(f"Unexpected error executing batch: {e}")
+                for future in futures:
+                    if not future.done():
+                        if future.running() or future.set_running_or_notify_cancel():
+                            future.set_result({"ret_value": -1, "error": f"Unexpected error: {e}"})
+
+            aggregate.set_result([
+                {"ret_value": -1, "error": "Cancelled"} if future.cancelled() else future.result()
+                for future in futures
+            ])
+            return aggregate.result()
+
+        if not self.health.allow_request():
+            # Nothing is queued while the card is down
+            task()
+            return futures, aggregate
+
+        for (cmd, _), command_future in zip(commands, futures):
+            command_future.add_done_callback(
+                lambda f, cmd=cmd: f.cancelled() or self.error_capture.observe(cmd, f.result()))
+
         self.mutex.lock()
         future = self.executor.submit(task)
         future.add_done_callback(lambda f: self.mutex.unlock())
+        return futures, aggregate
+
+    def execute_priority_command(self, cmd: str, data: Optional[Dict[str, Any]] = None, retries=3, retry_delay=0.2) -> Future:
+        """
+        Execute a safety-critical command ahead of every queued command.
+        It is sent on a dedicated connection without taking the command mutex, and
+        queued commands and batches hold back their next request until it is answered.
+        The time from this call until the request is on the wire is recorded.
+
+        Args:
+            cmd: The command name.
+            data: Optional command data.
+            retries: Attempts before giving up.
+            retry_delay: Delay in seconds between attempts.
+
+        Returns:
+            Future: Same result format as execute_command.
+        """
+        submitted = time.monotonic()
+        if not self.health.allow_request():
+            # A stop is still worth one attempt while the card counts as down
+            retries = 1
+        with self._priority_lock:
+            self._priority_pending += 1
+            self._priority_idle.clear()
+
+        sent = []
+
+        def on_sent():
+            # Only the first attempt counts towards call-to-wire latency
+            if not sent:
+                sent.append(time.monotonic())
+                self.priority_latencies.append((cmd, sent[0] - submitted))
+
+        def task():
+            attempts = 0
+            try:
+                payload = json.dumps({"sid": 0, "cmd": cmd, "data": data} if data else {"sid": 0, "cmd": cmd}).encode()
+                while attempts < retries:
+                    try:
+                        started = time.perf_counter()
+                        response_data = self.priority_pool.request(payload, on_sent=on_sent,
+                                                                   timeout=self.timeout_policy.timeout_for(cmd),
+                                                                   idempotent=cmd not in NON_IDEMPOTENT_COMMANDS)
+                        self.metrics.record_latency(cmd, time.perf_counter() - started)
+                        self.health.record_success()
+                        self.log_info(f"Priority command {cmd} executed successfully")
+                        return {"ret_value": response_data.get("ret"), "response": response_data}
+                    except (socket.timeout, socket.error, json.JSONDecodeError, ValueError) as e:
+                        self.log_error(f"Error executing priority command {cmd}: {e}")
+                        if not isinstance(e, ValueError):
+                            self.health.record_failure(e)
+                        if isinstance(e, socket.timeout):
+                            self.metrics.record_timeout(cmd)
+                        if isinstance(e, (RequestSentError, socket.timeout, ValueError)) and cmd in NON_IDEMPOTENT_COMMANDS:
+                            # Sent and lost or garbled in reply; the card may have run it
+                            self.metrics.record_failure(cmd)
+                            return {"ret_value": -1, "error": f"Reply to {cmd} lost, not resent: {e}"}
+                        attempts += 1
+                        if attempts < retries:
+                            self.metrics.record_retry(cmd)
+                            time.sleep(retry_delay)
+                self.log_error(f"Priority command {cmd} failed after {retries} attempts")
+                self.metrics.record_failure(cmd)
+                return {"ret_value": -1, "error": "Command failed after retries"}
+            finally:
+                with self._priority_lock:
+                    self._priority_pending -= 1
+                    if self._priority_pending == 0:
+                        self._priority_idle.set()
+
+        future = self.priority_executor.submit(task)
+        future.add_done_callback(lambda f: self.error_capture.observe(cmd, f.result()))
         return future
 
+    def priority_latency_stats(self) -> Dict[str, Any]:
+        """
+        Get the time from calling a priority command until its request was on the wire.
+
+        Returns:
+            dict: Sample count and last, mean, median, 95th percentile and worst latency in ms.
+        """
+        samples = list(self.priority_latencies)
+        if not samples:
+            return {"count": 0}
+        latencies = sorted(latency * 1000 for _, latency in samples)
+        return {
+            "count": len(latencies),
+            "last_ms": samples[-1][1] * 1000,
+            "mean_ms": sum(latencies) / len(latencies),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max_ms": latencies[-1],
+        }
+
     def get_working_status(self):
         status_map = {
             0: "Waiting",
@@ -246,29 +576,34 @@ class Scancard:
         def task():
             self.create_request("get_working_status")
             self.function = "Getting working status"
+            if not self.health.allow_request():
+                return f"Connection to {self.HOST}:{self.PORT} failed: {self.health.unavailable_result()['error']}"
             try:
                 json_string = json.dumps(self.req)
-                with socket.create_connection((self.HOST, self.PORT), timeout=self.timeout) as sock:
-                    self.log_info(f"{self.function}-> Connecting to {self.HOST}:{self.PORT}...")
-                    sock.sendall(json_string.encode())
-                    self.log_info(f"{self.function}-> Sending {self.req} to {self.HOST}:{self.PORT} with timeout of {self.timeout}s")
-                    ret = sock.recv(1024)
-                    if ret:
-                        ret_decoded = ret.decode('GB18030', errors='replace')
-                        json_end_index = ret_decoded.rfind('}') + 1
-                        json_content = ret_decoded[:json_end_index]
-                        response_data = json.loads(json_content)
-                        connection_status = response_data.get("ret")
-                        status_text = status_map.get(connection_status, "Unknown")
-                        self.log_info(f"{self.function}-> Response received from {self.HOST}:{self.PORT} - {status_text}")
-                        return status_text
-                    else:
-                        self.log_error(f"E203 - {self.function} not successful - Request {self.req} TIMED OUT!!")
-                        return "No response received."
+                self.log_info(f"{self.function}-> Sending {self.req} to {self.HOST}:{self.PORT} with timeout of {self.timeout_policy.timeout_for('get_working_status')}s")
+                started = time.perf_counter()
+                response_data = self.connection_pool.request(json_string.encode(),
+                                                             timeout=self.timeout_policy.timeout_for("get_working_status"),
+                                                             idempotent=True)
+                self.metrics.record_latency("get_working_status", time.perf_counter() - started)
+                self.health.record_success()
+                connection_status = response_data.get("ret")
+                status_text = status_map.get(connection_status, "Unknown")
+                self.log_info(f"{self.function}-> Response received from {self.HOST}:{self.PORT} - {status_text}")
+                return status_text
             except (socket.timeout, socket.error, json.JSONDecodeError) as e:
                 self.log_error(f"E200 - {self.function} not successful \n {e}")
+                # A slow status reply is not a dead card; only connection errors count towards the breaker
+                if not isinstance(e, (json.JSONDecodeError, socket.timeout)):
+                    self.health.record_failure(e)
+                if isinstance(e, socket.timeout):
+                    self.metrics.record_timeout("get_working_status")
+                self.metrics.record_failure("get_working_status")
                 return f"Connection to {self.HOST}:{self.PORT} failed: {e}"
 
+        if not self.health.allow_request():
+            return self._completed_future(f"Connection to {self.HOST}:{self.PORT} failed: {self.health.unavailable_result()['error']}")
+
         self.mutex.lock()
         future = self.executor.submit(task)
         future.add_done_callback(lambda f: self.mutex.unlock())
@@ -277,13 +612,75 @@ class Scancard:
     def open_file(self, file_path: str):
         """Open a file on the scancard."""
         self.current_file = file_path
+        self._loaded_hash = None
+        self.geometry_changed = False
+        self.parameter_cache.invalidate(file_path)
+        self.placement_planner.invalidate(file_path)
         return self.execute_command("open_file", {"path": file_path})
 
     def close_file(self):
         """Close the current file."""
         self.current_file = None
+        self._loaded_hash = None
+        self.geometry_changed = False
+        self.parameter_cache.invalidate()
+        self.placement_planner.invalidate()
         return self.execute_command("close_file")
 
+    def _forget_loaded_file(self, state: str):
+        """Health listener; after losing the card its loaded file is unknown."""
+        if state == self.health.DOWN:
+            self._loaded_hash = None
+
+    def prefetch_file_hash(self, file_path: str) -> Future:
+        """Hash a file in the background so a later load_file compares without reading it."""
+        return self.hash_executor.submit(content_hash, file_path)
+
+    def _load_file(self, file_path: str) -> Dict[str, Any]:
+        """Swap to a file and wait for it; see load_file."""
+        loaded = self._loaded_hash
+        if loaded is not None:
+            loaded_hash = loaded.result()
+            if loaded_hash is not None and content_hash(file_path) == loaded_hash:
+                # Identical content is already on the card, including any parameters set since
+                self.current_file = file_path
+                self.file_swaps_skipped += 1
+                return {"ret_value": 1, "response": None, "skipped": True}
+
+        self.close_file().result()
+        result = self.open_file(file_path).result()
+        if result.get("ret_value") == 1:
+            self._loaded_hash = self.prefetch_file_hash(file_path)
+        return result
+
+    def cached_geometry(self):
+        """
+        Get the entity geometry of the loaded file from the geometry index.
+
+        Returns:
+            LayerGeometry: The geometry, or None if the file is not indexed or its entities
+                were moved or edited on the card since it was opened.
+        """
+        if self.geometry_changed or self.current_file is None:
+            return None
+        return self.geometry_index.get(self.current_file)
+
+    def load_file(self, file_path: str) -> Future:
+        """
+        Load a file on the scancard, closing the current one first.
+        If the file is byte-identical to the one already loaded the close/open swap is
+        skipped and the result carries "skipped": True. Hashes are computed in the
+        background and memoised per file, so the check is free for unchanged files.
+        Runs on the job executor; do not wait on it from another job.
+
+        Args:
+            file_path: Path of the .emd file.
+
+        Returns:
+            Future: Resolves to the open_file result, or a success result if skipped.
+        """
+        return self.job_executor.submit(self._load_file, file_path)
+
     def save_file(self, file_path: str, cover: bool):
         """Save a file on the scancard."""
         return self.execute_command("save_file", {"path": file_path, "cover": 1 if cover else 0})
@@ -291,11 +688,12 @@ class Scancard:
     def start_mark(self):
         """Start the marking process."""
         future = self.execute_command("start_mark")
+        self.status_service.notify_mark_started()
         return future
 
     def stop_mark(self):
         """Stop the marking process."""
-        future = self.execute_command("stop_mark")
+        future = self.execute_priority_command("stop_mark")
         return future
 
     def start_preview(self):
@@ -318,7 +716,9 @@ class Scancard:
 
         self.current_file_index += 1
         file_path = self.file_queue[self.current_file_index]
-        return self.open_file(file_path)
+        if self.current_file_index + 1 < len(self.file_queue):
+            self.prefetch_file_hash(self.file_queue[self.current_file_index + 1])
+        return self.load_file(file_path)
 
     def get_current_file_index(self) -> int:
         """Get the current file index in the queue."""
@@ -335,7 +735,9 @@ class Scancard:
     def set_markParameters_by_layer(self, layer_id: int, params: Dict[str, Any]):
         """Set marking parameters for a layer."""
         data = {"layer_id": layer_id, **params}
-        return self.execute_command("set_markParameters_by_layer", data)
+        future = self.execute_command("set_markParameters_by_layer", data)
+        self.parameter_cache.note_write((MarkParameterCache.MARK, layer_id), params, future)
+        return future
 
     def get_markParameters_by_index(self, index: int, in_index: int):
         """Get marking parameters by index."""
@@ -357,7 +759,9 @@ class Scancard:
     def set_entity_fill_property_by_index(self, index: int, in_index: int, params: Dict[str, Any]):
         """Set fill properties by index."""
         data = {"index": index, "in_index": in_index, **params}
-        return self.execute_command("set_entity_fill_property_by_index", data)
+        future = self.execute_command("set_entity_fill_property_by_index", data)
+        self.parameter_cache.note_write((MarkParameterCache.FILL, index, in_index), params, future)
+        return future
 
     def get_entity_count(self):
         """Get the number of entities."""
@@ -365,22 +769,27 @@ class Scancard:
 
     def translate_entity(self, dx: float, dy: float):
         """Translate all entities."""
+        self._entities_moved()
         return self.execute_command("translate_entity", {"dx": dx, "dy": dy})
 
     def rotate_entity(self, cx: float, cy: float, fAngle: float):
         """Rotate all entities."""
+        self._entities_moved()
         return self.execute_command("rotate_entity", {"cx": cx, "cy": cy, "fAngle": fAngle})
 
     def translate_entity_by_index(self, index: int, dx: float, dy: float):
         """Translate entity by index."""
+        self._entities_moved()
         return self.execute_command("translate_entity_by_index", {"index": index, "dx": dx, "dy": dy})
 
     def rotate_entity_by_index(self, index: int, cx: float, cy: float, fAngle: float):
         """Rotate entity by index."""
+        self._entities_moved()
         return self.execute_command("rotate_entity_by_index", {"index": index, "cx": cx, "cy": cy, "fAngle": fAngle})
 
     def trans_by_model(self, dx: float, dy: float, dz: float, axis: str, fAngle: float, fScale: float):
         """Model transformation."""
+        self._entities_moved()
         return self.execute_command("TransByModel", {"dx": dx, "dy": dy, "dz": dz, "axis": axis, "fAngle": fAngle, "fScale": fScale})
 
     def get_name_by_index(self, index: int):
@@ -405,6 +814,7 @@ class Scancard:
 
     def set_pos_size_by_index(self, index: int, xPos: float, yPos: float, zPos: float, xSize: float, ySize: float, zSize: float):
         """Set position and size by index."""
+        self._entities_moved()
         return self.execute_command("set_pos_size_by_index", {
             "index": index, 
             "xPos": xPos, 
@@ -426,17 +836,46 @@ class Scancard:
         """Set content by name."""
         return self.execute_command("set_content_by_name", {"name": name, "content": content})
 
+    def _entities_moved(self):
+        """Entity poses changed outside the placement planner."""
+        self.geometry_changed = True
+        self.placement_planner.invalidate(self.current_file)
+
+    def _job_modified(self):
+        """The job on the card no longer matches its file, so it cannot be reused by load_file."""
+        self._loaded_hash = None
+        self._entities_moved()
+
     def delete_by_index(self, index: int):
         """Delete object by index."""
+        self._job_modified()
         return self.execute_command("delete_by_index", {"index": index})
 
+    def delete_entities(self, indices: List[int]) -> Future:
+        """
+        Delete several objects in one pipelined batch.
+        Highest indices go first, so deleting does not shift the ones still to delete.
+
+        Args:
+            indices: Entity indices to delete.
+
+        Returns:
+            Future: Resolves to the list of results, highest index first.
+        """
+        self._job_modified()
+        _, aggregate = self.execute_batch([("delete_by_index", {"index": index}) for index in sorted(indices, reverse=True)])
+        return aggregate
+
     def copy_by_index(self, index: int):
         """Copy object by index."""
+        self._job_modified()
         return self.execute_command("copy_by_index", {"index": index})
 
     def mark_by_index(self, index: int):
         """Mark object by index."""
-        return self.execute_command("mark_by_index", {"index": index})
+        future = self.execute_command("mark_by_index", {"index": index})
+        self.status_service.notify_mark_started()
+        return future
 
     def read_input(self):
         """Read input pins."""
@@ -448,14 +887,24 @@ class Scancard:
 
     def clear_error(self):
         """Clear current error."""
-        return self.execute_command("clear_error")
+        return self.execute_priority_command("clear_error")
 
     def get_error(self):
         """Get current error."""
-        future = self.execute_command("get_error")
-        future.add_done_callback(lambda f: self.log_info(f"Error description: {self.ERROR_DESCRIPTIONS.get(self.ret_value, 'Unknown error')}"))
+        future = self.execute_priority_command("get_error")
+        future.add_done_callback(lambda f: self.log_info(f"Error description: {self.describe_error(f.result())}"))
         return future
 
+    def describe_error(self, result: Dict[str, Any]) -> str:
+        """Describe the error of a get_error result from its own reply, not shared state."""
+        response = result.get("response") or {}
+        describe = (response.get("data") or {}).get("describe")
+        return describe or self.ERROR_DESCRIPTIONS.get(result.get("ret_value"), result.get("error", "Unknown error"))
+
+    def recent_errors(self, n: int = 10, layer: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the last n captured errors, newest first, optionally of one layer only."""
+        return [record.as_dict() for record in self.error_capture.last(n, layer)]
+
     def enable_vision(self, bEnVision: bool):
         """Enable or disable vision system."""
         return self.execute_command("enable_vision", {"bEnVision": bEnVision})
@@ -506,39 +955,98 @@ class Scancard:
                 - valid: True if layer and entity exist, False otherwise
                 - message: Description of any validation issues
         """
+        futures, _ = self.validate_layers(layer_id, layer_id, entity_index, entity_subindex)
+        return futures[layer_id]
+
+    def validate_layers(self, first_layer: int, last_layer: int, entity_index=1, entity_subindex=1,
+                        on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                        pipeline_depth=16) -> Tuple[Dict[int, Future], Future]:
+        """
+        Validates a range of layers and their entity in one pipelined batch.
+        The entity check is the same for every layer and is sent once. Results are
+        cached against the content hash of the open file, so validating the same job
+        again is answered from memory.
+
+        Args:
+            first_layer: The first layer ID to validate
+            last_layer: The last layer ID to validate, inclusive
+            entity_index: The entity index to validate
+            entity_subindex: The entity subindex to validate
+            on_result: Optional callback called with (layer_id, result) as each layer
+                completes, from a worker thread
+            pipeline_depth: Maximum number of unanswered requests on the connection
+
+        Returns:
+            tuple: (futures, aggregate). futures maps each layer ID to a Future with the
+                same result as validate_layer_entity; cancelling one before its request
+                goes out skips it. aggregate resolves to a dict of all results by layer.
+        """
+        layers = list(range(first_layer, last_layer + 1))
+        futures = {layer: Future() for layer in layers}
+        aggregate = Future()
+
+        def resolve(layer, result):
+            if futures[layer].set_running_or_notify_cancel():
+                futures[layer].set_result(result)
+                if on_result:
+                    try:
+                        on_result(layer, result)
+                    except Exception as e:
+                        self.log_error(f"Validation result callback failed for layer {layer}: {e}")
+
         def task():
-            # First check if we can get marking parameters for this layer
             try:
-                mark_params_future = self.get_markParameters_by_layer(layer_id)
-                mark_params_result = mark_params_future.result()
-                
-                if not mark_params_result or mark_params_result.get("ret_value") != 1:
-                    return {
-                        "valid": False, 
-                        "message": f"Layer {layer_id} does not exist or cannot be accessed"
-                    }
-                
-                # Next check if we can get fill properties for this entity
-                fill_props_future = self.get_entity_fill_property_by_index(entity_index, entity_subindex)
-                fill_props_result = fill_props_future.result()
-                
-                if not fill_props_result or fill_props_result.get("ret_value") != 1:
-                    return {
-                        "valid": False, 
-                        "message": f"Entity at index {entity_index},{entity_subindex} does not exist"
-                    }
-                
-                # Both checks passed
-                return {"valid": True, "message": "Layer and entity validated"}
-                
+                file_hash = content_hash(self.current_file) if self.current_file else None
+                cache_key = (file_hash, entity_index, entity_subindex) if file_hash else None
+                with self._validation_lock:
+                    cached = dict(self._validation_cache.get(cache_key, {})) if cache_key else {}
+
+                remaining = []
+                for layer in layers:
+                    if layer in cached:
+                        resolve(layer, cached[layer])
+                    else:
+                        remaining.append(layer)
+
+                if remaining:
+                    commands = [("get_entity_fill_property_by_index", {"index": entity_index, "in_index": entity_subindex})]
+                    commands += [("get_markParameters_by_layer", {"layer_id": layer}) for layer in remaining]
+                    batch_futures, batch = self.execute_batch(commands, pipeline_depth=pipeline_depth)
+
+                    def on_layer(f: Future, layer):
+                        if f.cancelled():
+                            return
+                        mark_params_result = f.result()
+                        fill_props_result = batch_futures[0].result()
+                        if not mark_params_result or mark_params_result.get("ret_value") != 1:
+                            result = {"valid": False, "message": f"Layer {layer} does not exist or cannot be accessed"}
+                        elif not fill_props_result or fill_props_result.get("ret_value") != 1:
+                            result = {"valid": False, "message": f"Entity at index {entity_index},{entity_subindex} does not exist"}
+                        else:
+                            result = {"valid": True, "message": "Layer and entity validated"}
+                        # Connection failures are not cached, so the next validation retries them
+                        if cache_key and "error" not in mark_params_result and "error" not in fill_props_result:
+                            with self._validation_lock:
+                                self._validation_cache.setdefault(cache_key, {})[layer] = result
+                        resolve(layer, result)
+
+                    for layer, batch_future in zip(remaining, batch_futures[1:]):
+                        futures[layer].add_done_callback(lambda f, bf=batch_future: f.cancelled() and bf.cancel())
+                        batch_future.add_done_callback(lambda f, layer=layer: on_layer(f, layer))
+                    batch.result()
             except Exception as e:
-                self.log_error(f"Error validating layer {layer_id}, entity {entity_index},{entity_subindex}: {e}")
-                return {"valid": False, "message": f"Validation error: {str(e)}"}
-        
-        self.mutex.lock()
-        future = self.executor.submit(task)
-        future.add_done_callback(lambda f: self.mutex.unlock())
-        return future                
+                self.log_error(f"Error validating layers {first_layer}-{last_layer}: {e}")
+                for layer in layers:
+                    if not futures[layer].done():
+                        resolve(layer, {"valid": False, "message": f"Validation error: {str(e)}"})
+
+            results = {layer: future.result() for layer, future in futures.items() if not future.cancelled()}
+            aggregate.set_result(results)
+            return results
+
+        # Runs its own batch, so it must not occupy the command executor
+        self.job_executor.submit(task)
+        return futures, aggregate
 
     def process_multiple_files(self, file_paths: List[str], callback=None):
         """Process multiple files in sequence.
@@ -553,11 +1061,12 @@ class Scancard:
         def task():
             results = []
             for i, file_path in enumerate(file_paths):
-                # Close any open file
-                close_result = self.close_file().result()
-                
-                # Open new file
-                open_result = self.open_file(file_path).result()
+                # Hash the next file while this one is marked
+                if i + 1 < len(file_paths):
+                    self.prefetch_file_hash(file_paths[i + 1])
+
+                # Swap files unless the next one is identical to the loaded one
+                open_result = self._load_file(file_path)
                 if open_result.get("ret_value") != 1:
                     results.append({
                         "file": file_path,
@@ -577,11 +1086,7 @@ class Scancard:
                     continue
                 
                 # Wait for marking to complete
-                while True:
-                    status = self.get_working_status().result()
-                    if status == "Waiting":
-                        break
-                    time.sleep(0.5)
+                self.status_service.wait_for_mark_complete()
                 
                 results.append({
                     "file": file_path,
@@ -594,4 +1099,4 @@ class Scancard:
             
             return results
         
-        return self.executor.submit(task)
\ No newline at end of file
+        return self.job_executor.submit(task)
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+This code contains the orchestration of several feeltek scancards, one per laser.
+Every card loads the same layer file; the layer's entities are partitioned between
+the cards, by index or by region from get_pos_size_by_index, and each card deletes
+the entities it does not own before all cards start marking together. A layer is
+done only when every card reports 'Waiting' again, so with balanced partitions the
+layer's mark time scales down with the number of lasers.
+
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from Feeltek.fileHash import content_hash
+from Feeltek.scanCard import Scancard
+
+BY_INDEX = "index"
+BY_REGION = "region"
+
+
+def partition_by_index(indices: Sequence[int], parts: int) -> List[List[int]]:
+    """
+    Split entity indices into contiguous runs of near-equal length.
+
+    Args:
+        indices: Entity indices in order.
+        parts: Number of runs.
+
+    Returns:
+        list: One list of indices per part; some may be empty if there are fewer entities.
+    """
+    size, extra = divmod(len(indices), parts)
+    result, start = [], 0
+    for part in range(parts):
+        end = start + size + (1 if part < extra else 0)
+        result.append(list(indices[start:end]))
+        start = end
+    return result
+
+
+def partition_by_region(positions: Dict[int, Tuple[float, float, float, float]], parts: int) -> List[List[int]]:
+    """
+    Split entities into vertical strips of near-equal area, left to right.
+    Area stands in for marking time, and strips keep each laser in its own part of the field.
+
+    Args:
+        positions: Entity index -> (xPos, yPos, xSize, ySize).
+        parts: Number of strips.
+
+    Returns:
+        list: One list of indices per strip.
+    """
+    ordered = sorted(positions, key=lambda index: (positions[index][0], index))
+    weights = {index: max(positions[index][2] * positions[index][3], 1e-9) for index in ordered}
+    total = sum(weights.values())
+    result: List[List[int]] = [[] for _ in range(parts)]
+    part, filled = 0, 0.0
+    for index in ordered:
+        # Move to the next strip once this one is closer to its share without the entity than with it
+        target = total * (part + 1) / parts
+        if part < parts - 1 and result[part] and filled + weights[index] / 2 > target:
+            part += 1
+        result[part].append(index)
+        filled += weights[index]
+    return result
+
+
+class ScancardGroup:
+    """
+    Drives several scancards concurrently as one multi-laser marker.
+    Attributes:
+        cards: The Scancard of each laser.
+        strategy: How entities are split between cards, BY_REGION or BY_INDEX.
+        first_entity_index: Index of the first entity in a job.
+        mark_timeout: Maximum seconds to wait for a card to finish a layer, or None.
+        layers_marked: Layers completed on every card.
+    Methods:
+        from_endpoints(cls, endpoints, **kwargs): Creates a group with one Scancard per (host, port).
+        partition(self, file_path): Splits the entities of the loaded file between the cards.
+        mark_layer(self, file_path): Marks one layer file split across all cards.
+        stop_mark(self): Stops marking on every card.
+        working_statuses(self): Gets the working status of every card.
+        all_waiting(self): Checks whether every card reports 'Waiting'.
+    """
+
+    def __init__(self, cards: List[Scancard], strategy: str = BY_REGION, first_entity_index: int = 0,
+                 mark_timeout: Optional[float] = None):
+        if not cards:
+            raise ValueError("A scancard group needs at least one card")
+        if strategy not in (BY_INDEX, BY_REGION):
+            raise ValueError(f"Unknown partition strategy: {strategy}")
+        self.cards = list(cards)
+        self.strategy = strategy
+        self.first_entity_index = first_entity_index
+        self.mark_timeout = mark_timeout
+        self.layers_marked = 0
+        self.last_layer: Dict[str, Any] = {}
+
+        # Partitions keyed by (file content hash, strategy, number of cards)
+        self._partitions: Dict[Tuple[Optional[str], str, int], List[List[int]]] = {}
+        self._lock = threading.Lock()
+        self._layer_executor = ThreadPoolExecutor(max_workers=1)
+        self._card_executor = ThreadPoolExecutor(max_workers=len(self.cards))
+
+    @classmethod
+    def from_endpoints(cls, endpoints: Sequence[Tuple[str, int]], **kwargs) -> "ScancardGroup":
+        """Create a group with one Scancard per (host, port) endpoint."""
+        return cls([Scancard(host=host, port=port) for host, port in endpoints], **kwargs)
+
+    def _name(self, card: Scancard) -> str:
+        return f"{card.HOST}:{card.PORT}"
+
+    def partition(self, file_path: str) -> List[List[int]]:
+        """
+        Split the entities of the file loaded on the first card between the cards.
+        Partitions are cached by the file's content hash, so identical layers are not read again,
+        and files in the geometry index are partitioned without querying the card.
+
+        Returns:
+            list: The entity indices each card marks, in card order.
+        """
+        key = (content_hash(file_path), self.strategy, len(self.cards))
+        with self._lock:
+            if key[0] is not None and key in self._partitions:
+                return self._partitions[key]
+
+        card = self.cards[0]
+        geometry = card.geometry_index.get_by_hash(key[0]) if key[0] is not None else None
+        if geometry is not None:
+            indices = [int(index) for index in geometry.indices]
+            positions = geometry.positions()
+        else:
+            result = card.get_entity_count().result()
+            if result.get("ret_value") != 1:
+                raise RuntimeError(f"Failed to get the entity count from {self._name(card)}: "
+                                   f"{result.get('error', result.get('ret_value'))}")
+            count = int((result.get("response", {}).get("data") or {}).get("count", 0))
+            indices = list(range(self.first_entity_index, self.first_entity_index + count))
+            positions = None
+
+        if self.strategy == BY_INDEX or len(self.cards) == 1:
+            partition = partition_by_index(indices, len(self.cards))
+        else:
+            if positions is None:
+                _, batch = card.execute_batch([("get_pos_size_by_index", {"index": index}) for index in indices])
+                positions = {}
+                for index, reply in zip(indices, batch.result()):
+                    if reply.get("ret_value") != 1:
+                        raise RuntimeError(f"Failed to get the position of entity {index}: "
+                                           f"{reply.get('error', reply.get('ret_value'))}")
+                    data = reply.get("response", {}).get("data") or {}
+                    positions[index] = (float(data.get("xPos", 0.0)), float(data.get("yPos", 0.0)),
+                                        float(data.get("xSize", 0.0)), float(data.get("ySize", 0.0)))
+            partition = partition_by_region(positions, len(self.cards))
+
+        if key[0] is not None:
+            with self._lock:
+                self._partitions[key] = partition
+        return partition
+
+    def _mark_share(self, card: Scancard, owned: List[int], all_indices: List[int],
+                    barrier: threading.Barrier) -> Dict[str, Any]:
+        """Reduce one card's job to its entities, start together with the others and wait for the end."""
+        outcome: Dict[str, Any] = {"card": self._name(card), "entities": owned, "ok": False}
+        try:
+            owned_set = set(owned)
+            others = [index for index in all_indices if index not in owned_set]
+            if others:
+                for reply in card.delete_entities(others).result():
+                    if reply.get("ret_value") != 1:
+                        raise RuntimeError(f"Failed to delete entities: {reply.get('error', reply.get('ret_value'))}")
+            barrier.wait(timeout=card.timeout * 4)
+
+            started = time.monotonic()
+            reply = card.start_mark().result()
+            if reply.get("ret_value") != 1:
+                raise RuntimeError(f"Failed to start marking: {reply.get('error', reply.get('ret_value'))}")
+            if not card.status_service.wait_for_mark_complete(timeout=self.mark_timeout):
+                raise RuntimeError("Timed out waiting for marking to complete")
+            outcome["mark_time"] = time.monotonic() - started
+            outcome["ok"] = True
+        except threading.BrokenBarrierError:
+            outcome["error"] = "Another card failed before marking started"
+        except Exception as e:
+            barrier.abort()
+            outcome["error"] = str(e)
+        return outcome
+
+    def mark_layer(self, file_path: str) -> Future:
+        """
+        Mark one layer file split across all cards.
+        Every card loads the file, keeps only its share of the entities and all cards
+        start marking together. The layer is done once every card is back to 'Waiting'.
+
+        Args:
+            file_path: Path of the layer's .emd file.
+
+        Returns:
+            Future: Resolves to {"ok", "layer_time", "cards": [per-card outcome]}; each
+                outcome holds the card, its entities, ok, mark_time or error.
+        """
+        def task():
+            started = time.monotonic()
+            try:
+                loads = [card.load_file(file_path) for card in self.cards]
+                for card, load in zip(self.cards, loads):
+                    reply = load.result()
+                    if reply.get("ret_value") != 1:
+                        raise RuntimeError(f"{self._name(card)} failed to open {file_path}: "
+                                           f"{reply.get('error', reply.get('ret_value'))}")
+                partition = self.partition(file_path)
+            except Exception as e:
+                summary = {"ok": False, "layer_time": time.monotonic() - started, "error": str(e), "cards": []}
+                self.last_layer = summary
+                return summary
+
+            all_indices = [index for owned in partition for index in owned]
+            active = [(card, owned) for card, owned in zip(self.cards, partition) if owned]
+            barrier = threading.Barrier(len(active))
+            shares = [self._card_executor.submit(self._mark_share, card, owned, all_indices, barrier)
+                      for card, owned in active]
+            outcomes = [share.result() for share in shares]
+
+            ok = all(outcome["ok"] for outcome in outcomes) and self.all_waiting()
+            if ok:
+                self.layers_marked += 1
+            summary = {"ok": ok, "layer_time": time.monotonic() - started, "cards": outcomes}
+            self.last_layer = summary
+            return summary
+
+        return self._layer_executor.submit(task)
+
+    def stop_mark(self) -> List[Future]:
+        """Stop marking on every card on their priority lanes."""
+        return [card.stop_mark() for card in self.cards]
+
+    def working_statuses(self) -> Dict[str, str]:
+        """Get the working status text of every card."""
+        futures = [(self._name(card), card.status_service.request_status()) for card in self.cards]
+        return {name: future.result() for name, future in futures}
+
+    def all_waiting(self) -> bool:
+        """Check whether every card reports 'Waiting'."""
+        return all(status == "Waiting" for status in self.working_statuses().values())
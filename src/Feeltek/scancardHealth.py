@@ -0,0 +1,202 @@
+"""
+This code contains the health model and circuit breaker of the feeltek scancard connection.
+Command outcomes are recorded as they happen. A few consecutive connection failures
+mark the card as down and open the breaker, after which queued and new commands fail
+immediately instead of each spending their retries and timeouts. A background probe
+checks the card host with a short timeout and closes the breaker as soon as it
+answers again.
+
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from Feeltek.connectionPool import ScancardConnection
+
+
+class ScancardHealth(QObject):
+    """
+    Connection health of the scancard with a circuit breaker.
+    Attributes:
+        host: The host address probed.
+        port: The port number probed.
+        failure_threshold: Consecutive failures after which the card counts as down.
+        probe_interval: Initial delay in seconds between probes while down.
+        max_probe_interval: Upper bound the probe delay backs off to.
+        probe_timeout: Socket timeout of a probe in seconds.
+        state: One of CONNECTED, DEGRADED or DOWN.
+    Methods:
+        allow_request(self): Checks whether commands may be sent.
+        record_success(self): Records a command that got a reply.
+        record_failure(self, error): Records a command that failed to reach the card.
+        unavailable_result(self): Result returned for commands failed by the breaker.
+        probe(self): Checks once whether the card host answers.
+        add_listener(self, callback): Registers a state change callback.
+        stats(self): Returns health counters.
+    """
+
+    state_changed = pyqtSignal(str)
+
+    CONNECTED = "Connected"
+    DEGRADED = "Degraded"
+    DOWN = "Down"
+
+    def __init__(self, host: str, port: int, failure_threshold: int = 3, probe_interval: float = 1.0,
+                 max_probe_interval: float = 15.0, probe_timeout: float = 1.0):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.probe_timeout = probe_timeout
+
+        self.state = self.CONNECTED
+        self.consecutive_failures = 0
+        self.last_error = ""
+        self.down_since = 0.0
+        self.times_opened = 0
+        self.fast_failures = 0
+        self.probes = 0
+
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """Register a callback called with the new state on every change."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str], None]):
+        """Remove a previously registered state change callback."""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def allow_request(self) -> bool:
+        """
+        Check whether commands may be sent.
+
+        Returns:
+            bool: False while the breaker is open; the caller should fail immediately.
+        """
+        if self.state != self.DOWN:
+            return True
+        with self._lock:
+            self.fast_failures += 1
+        return False
+
+    def unavailable_result(self) -> Dict[str, Any]:
+        """Result returned for commands failed by the open breaker."""
+        return {"ret_value": -1, "error": f"Scancard unavailable: {self.last_error}"}
+
+    def _set_state(self, state: str):
+        # Called with the lock held; returns the listeners to notify
+        if state == self.state:
+            return []
+        self.state = state
+        return list(self._listeners)
+
+    def _notify(self, state: str, listeners: List[Callable[[str], None]]):
+        self.state_changed.emit(state)
+        for callback in listeners:
+            try:
+                callback(state)
+            except Exception as e:
+                print(f"Scancard health listener failed: {e}")
+
+    def record_success(self):
+        """Record a command that got a reply from the card."""
+        if self.state == self.CONNECTED and self.consecutive_failures == 0:
+            return
+        with self._lock:
+            self.consecutive_failures = 0
+            changed = self.state != self.CONNECTED
+            listeners = self._set_state(self.CONNECTED)
+        if changed:
+            self._notify(self.CONNECTED, listeners)
+
+    def record_failure(self, error: Exception):
+        """Record a command that failed to reach the card or got no reply."""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            if self.state == self.DOWN:
+                return
+            if self.consecutive_failures >= self.failure_threshold:
+                new_state = self.DOWN
+                self.down_since = time.monotonic()
+                self.times_opened += 1
+            else:
+                new_state = self.DEGRADED
+            changed = new_state != self.state
+            listeners = self._set_state(new_state)
+        if changed:
+            self._notify(new_state, listeners)
+        if new_state == self.DOWN:
+            self._start_probing()
+
+    def probe(self) -> bool:
+        """
+        Check once whether the card host answers a status request.
+
+        Returns:
+            bool: True if a reply was received.
+        """
+        conn = ScancardConnection(self.host, self.port, self.probe_timeout)
+        try:
+            conn.connect()
+            conn.send(json.dumps({"sid": 0, "cmd": "get_working_status"}).encode())
+            conn.read_response()
+            return True
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self.last_error = str(e)
+            return False
+        finally:
+            conn.close()
+
+    def _start_probing(self):
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="scancard-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        interval = self.probe_interval
+        while True:
+            with self._lock:
+                if self.state != self.DOWN:
+                    self._probe_thread = None
+                    return
+            time.sleep(interval)
+            with self._lock:
+                self.probes += 1
+            if self.probe():
+                self.record_success()
+            interval = min(interval * 2, self.max_probe_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get health counters.
+
+        Returns:
+            dict: State, failure counts, how often the breaker opened, probes sent,
+                commands failed fast and seconds spent down so far.
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "last_error": self.last_error,
+                "times_opened": self.times_opened,
+                "probes": self.probes,
+                "fast_failures": self.fast_failures,
+                "down_for": time.monotonic() - self.down_since if self.state == self.DOWN else 0.0,
+            }
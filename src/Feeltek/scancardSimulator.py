@@ -0,0 +1,435 @@
+"""
+This code contains a local simulator of the feeltek scancard TCP service.
+It listens on localhost:50000 by default and speaks the same JSON command set as the
+service, so the real Scancard client, the status service and the layer loop can be
+benchmarked and tested without hardware. Profiles set per-command latencies and
+marking durations, and can inject dropped replies, partial replies, disconnects and
+the error codes of Scancard.ERROR_DESCRIPTIONS. Run from the src directory:
+
+    python -m Feeltek.scancardSimulator --profile typical
+    python -m Feeltek.scancardSimulator --profile flaky --mark-time "img_*.emd=4.5" --seed 1
+
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from Feeltek.jsonStreamReader import JsonStreamReader
+from Feeltek.scanCard import Scancard
+
+# Latency in seconds is base latency + per-command extra + uniform jitter.
+# Fault rates are probabilities per command.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "ideal": {
+        "latency": 0.0, "jitter": 0.0, "command_latency": {},
+        "mark_time": 0.5,
+        "drop_rate": 0.0, "partial_rate": 0.0, "disconnect_rate": 0.0, "error_rate": 0.0,
+    },
+    "typical": {
+        "latency": 0.002, "jitter": 0.001,
+        "command_latency": {"open_file": 0.15, "close_file": 0.02, "save_file": 0.2, "download_Parameters": 0.05},
+        "mark_time": 2.0,
+        "drop_rate": 0.0, "partial_rate": 0.0, "disconnect_rate": 0.0, "error_rate": 0.0,
+    },
+    "slow": {
+        "latency": 0.02, "jitter": 0.01,
+        "command_latency": {"open_file": 0.8, "close_file": 0.1, "save_file": 1.0, "download_Parameters": 0.3},
+        "mark_time": 5.0,
+        "drop_rate": 0.0, "partial_rate": 0.0, "disconnect_rate": 0.0, "error_rate": 0.0,
+    },
+    "flaky": {
+        "latency": 0.005, "jitter": 0.02,
+        "command_latency": {"open_file": 0.2, "download_Parameters": 0.05},
+        "mark_time": 2.0,
+        "drop_rate": 0.01, "partial_rate": 0.01, "disconnect_rate": 0.01, "error_rate": 0.02,
+    },
+}
+
+DEFAULT_MARK_PARAMETERS = {
+    "markSpeed": 3000, "jumpSpeed": 5000, "jumpDelay": 100, "laserOnDelay": 100,
+    "polygonDelay": 100, "laserOffDelay": 100, "polygonKillerTime": 100,
+    "laserFrequency": 100, "current": 100, "firstPulseKillerLength": 100,
+    "pulseWidth": 100, "firstPulseWidth": 100, "incrementStep": 100,
+}
+
+DEFAULT_FILL_PARAMETERS = {
+    "fill_mode": 1, "bEqualDistance": False, "bSecondFill": False, "bRotateAngle": False,
+    "bFillAsOne": False, "bMoreIntact": False, "bFill3D": False, "loopNum": 1,
+    "iFillMarkTimes": 1, "iCurMarkTimes": 12, "layerId": 1, "fillSpace": 100,
+    "fillAngle": 100, "fillEdgeOffset": 100, "fillStartOffset": 100, "fillEndOffset": 100,
+    "fillLineReduction": 100, "loopSpace": 100, "secondAngle": 100, "dRotateAngle": 100,
+}
+
+
+class ScancardSimulator:
+    """
+    A TCP server that behaves like the scancard service.
+    Attributes:
+        host: The address to listen on.
+        port: The port to listen on.
+        profile: Latency and fault settings, see PROFILES.
+        mark_times: List of (file pattern, seconds) overriding the profile's mark_time.
+        entity_count: Number of entities reported for every open file.
+        error_codes: Error codes injected by error_rate.
+        fail_commands: Commands that always fail with a given error code.
+        serialize: Process commands of all connections one at a time, like the device.
+        stats: Counter of handled commands and injected faults.
+    Methods:
+        start(self): Starts serving in a background thread.
+        stop(self): Stops serving and closes all connections.
+        serve_forever(self): Serves in the calling thread.
+        handle_command(self, request): Returns the reply to one request.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 50000, profile: str = "typical",
+                 mark_times=None, entity_count: int = 1, error_codes=None,
+                 fail_commands: Optional[Dict[str, int]] = None, serialize: bool = True,
+                 check_files: bool = False, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.profile = dict(PROFILES[profile])
+        self.mark_times = list(mark_times or [])
+        self.entity_count = entity_count
+        self.error_codes = list(error_codes or [code for code in Scancard.ERROR_DESCRIPTIONS if code != 0])
+        self.fail_commands = dict(fail_commands or {})
+        self.serialize = serialize
+        self.check_files = check_files
+        self.random = random.Random(seed)
+        self.stats = Counter()
+
+        self.current_file: Optional[str] = None
+        self.marking_until = 0.0
+        self.previewing = False
+        self.error_code = 0
+        self.mark_parameters: Dict[int, Dict[str, Any]] = {}
+        self.fill_parameters: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.positions: Dict[int, Dict[str, float]] = {}
+        self.deleted = 0  # entities deleted from the open file
+
+        self._device_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._connections = set()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    # Server
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._listen()
+        self._thread = threading.Thread(target=self._accept_loop, name="scancard-simulator", daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted."""
+        self._listen()
+        self._accept_loop()
+
+    def stop(self):
+        """Stop serving and close all connections."""
+        self._running = False
+        if self._server is not None:
+            self._server.close()
+        for conn in list(self._connections):
+            self._close(conn)
+
+    def _listen(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen(16)
+        self._server = server
+        self._running = True
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connections.add(conn)
+            self.stats["connections"] += 1
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _close(self, conn: socket.socket):
+        self._connections.discard(conn)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def _serve_connection(self, conn: socket.socket):
+        reader = JsonStreamReader()
+        try:
+            while self._running:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                reader.feed(data)
+                request = reader.next_document()
+                while request is not None:
+                    if not self._reply(conn, request):
+                        return
+                    request = reader.next_document()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._close(conn)
+
+    def _reply(self, conn: socket.socket, request: Dict[str, Any]) -> bool:
+        """Process one request and send its reply, or inject a fault. Returns False once closed."""
+        cmd = request.get("cmd", "")
+        profile = self.profile
+        delay = profile["latency"] + profile["command_latency"].get(cmd, 0.0) + self.random.uniform(0, profile["jitter"])
+
+        if self.serialize:
+            with self._device_lock:
+                time.sleep(delay)
+                reply = self.handle_command(request)
+        else:
+            time.sleep(delay)
+            reply = self.handle_command(request)
+
+        fault = self.random.random()
+        if fault < profile["drop_rate"]:
+            self.stats["dropped"] += 1
+            return True
+        fault -= profile["drop_rate"]
+        payload = json.dumps(reply, ensure_ascii=False).encode("GB18030")
+        if fault < profile["partial_rate"]:
+            self.stats["partial"] += 1
+            conn.sendall(payload[:max(1, len(payload) // 2)])
+            self._close(conn)
+            return False
+        fault -= profile["partial_rate"]
+        if fault < profile["disconnect_rate"]:
+            self.stats["disconnected"] += 1
+            self._close(conn)
+            return False
+        conn.sendall(payload)
+        return True
+
+    # Device model
+
+    def mark_time_for(self, file_path: Optional[str]) -> float:
+        """Get the marking duration of a file from the overrides, else the profile."""
+        name = os.path.basename(file_path or "")
+        for pattern, seconds in self.mark_times:
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(file_path or "", pattern):
+                return seconds
+        return self.profile["mark_time"]
+
+    def _fail(self, code: int) -> int:
+        self.error_code = code
+        self.stats["errors"] += 1
+        # Codes above 0 are reported as failures by commands, like the service
+        return 0 if code > 0 else code
+
+    def handle_command(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the reply to one request, updating the simulated device state.
+
+        Args:
+            request: The decoded request.
+
+        Returns:
+            dict: The reply document.
+        """
+        cmd = request.get("cmd", "")
+        data = request.get("data") or {}
+        reply: Dict[str, Any] = {"sid": request.get("sid", 0), "cmd": cmd, "ret": 1}
+
+        with self._state_lock:
+            self.stats[cmd] += 1
+            now = time.monotonic()
+            marking = now < self.marking_until
+
+            if cmd == "get_working_status":
+                reply["ret"] = 1 if marking else 2 if self.previewing else 0
+                return reply
+            if cmd == "get_error":
+                reply["ret"] = self.error_code
+                reply["data"] = {"describe": Scancard.ERROR_DESCRIPTIONS.get(self.error_code, "Unknown error")}
+                return reply
+            if cmd == "clear_error":
+                self.error_code = 0
+                return reply
+            if cmd == "stop_mark":
+                self.marking_until = 0.0
+                return reply
+
+            if cmd in self.fail_commands:
+                reply["ret"] = self._fail(self.fail_commands[cmd])
+                return reply
+            if self.profile["error_rate"] and self.random.random() < self.profile["error_rate"]:
+                reply["ret"] = self._fail(self.random.choice(self.error_codes))
+                return reply
+
+            if cmd == "open_file":
+                path = data.get("path", "")
+                if self.check_files and not os.path.exists(path):
+                    reply["ret"] = -2
+                    self.error_code = 32
+                    return reply
+                self.current_file = path
+                self.mark_parameters.clear()
+                self.fill_parameters.clear()
+                self.positions.clear()
+                self.deleted = 0
+            elif cmd == "close_file":
+                self.current_file = None
+            elif cmd == "start_mark":
+                if marking:
+                    reply["ret"] = self._fail(28)
+                elif self.current_file is None:
+                    reply["ret"] = self._fail(13)
+                else:
+                    # Marking time scales with the entities left in the job
+                    remaining = max(self.entity_count - self.deleted, 0) / max(self.entity_count, 1)
+                    self.marking_until = now + self.mark_time_for(self.current_file) * remaining
+            elif cmd == "delete_by_index":
+                if self.current_file is None or not 0 <= data.get("index", 0) < self.entity_count - self.deleted:
+                    reply["ret"] = self._fail(34)
+                else:
+                    self.deleted += 1
+            elif cmd == "mark_by_index":
+                if marking:
+                    reply["ret"] = self._fail(28)
+                elif not 0 <= data.get("index", 0) <= self.entity_count:
+                    reply["ret"] = self._fail(33)
+                else:
+                    self.marking_until = now + self.mark_time_for(self.current_file) / max(self.entity_count, 1)
+            elif cmd == "start_preview":
+                if marking:
+                    reply["ret"] = self._fail(38)
+                else:
+                    self.previewing = True
+            elif cmd == "stop_preview":
+                self.previewing = False
+            elif cmd == "get_markParameters_by_layer":
+                layer_id = data.get("layer_id", 0)
+                if not 0 <= layer_id <= 254:
+                    reply["ret"] = self._fail(37)
+                else:
+                    reply["data"] = {"layer_id": layer_id, **DEFAULT_MARK_PARAMETERS, **self.mark_parameters.get(layer_id, {})}
+            elif cmd == "set_markParameters_by_layer":
+                layer_id = data.get("layer_id", 0)
+                if not 0 <= layer_id <= 254:
+                    reply["ret"] = self._fail(37)
+                else:
+                    fields = {k: v for k, v in data.items() if k != "layer_id"}
+                    self.mark_parameters.setdefault(layer_id, {}).update(fields)
+            elif cmd in ("get_markParameters_by_index", "get_entity_fill_property_by_index"):
+                key = (data.get("index", 0), data.get("in_index", 0))
+                if not 0 <= key[0] <= self.entity_count:
+                    reply["ret"] = self._fail(33)
+                elif cmd == "get_markParameters_by_index":
+                    reply["data"] = {"index": key[0], "in_index": key[1], **DEFAULT_MARK_PARAMETERS}
+                else:
+                    reply["data"] = {"index": key[0], "in_index": key[1], **DEFAULT_FILL_PARAMETERS, **self.fill_parameters.get(key, {})}
+            elif cmd == "set_entity_fill_property_by_index":
+                key = (data.get("index", 0), data.get("in_index", 0))
+                if not 0 <= key[0] <= self.entity_count:
+                    reply["ret"] = self._fail(33)
+                else:
+                    fields = {k: v for k, v in data.items() if k not in ("index", "in_index")}
+                    self.fill_parameters.setdefault(key, {}).update(fields)
+            elif cmd == "get_entity_count":
+                reply["data"] = {"count": self.entity_count - self.deleted if self.current_file else 0}
+            elif cmd == "get_pos_size_by_index":
+                index = data.get("index", 0)
+                reply["data"] = self.positions.get(index, {
+                    "xPos": 10.0 * index, "yPos": 0.0, "zPos": 0.0, "xSize": 8.0, "ySize": 8.0, "zSize": 0.0})
+            elif cmd == "set_pos_size_by_index":
+                index = data.get("index", 0)
+                self.positions[index] = {k: v for k, v in data.items() if k != "index"}
+            elif cmd == "get_name_by_index":
+                reply["data"] = {"name": f"entity_{data.get('index', 0)}"}
+            elif cmd in ("get_content_by_index", "get_content_by_name"):
+                reply["data"] = {"content": ""}
+            elif cmd == "read_input":
+                reply["data"] = {"input": 0xFF}
+            elif cmd == "write_output":
+                reply["data"] = {"output": data.get("output", 0)}
+            # Every other documented command is accepted without state changes
+        return reply
+
+
+def parse_mark_time(value: str) -> Tuple[str, float]:
+    """Parse a PATTERN=SECONDS marking duration override."""
+    pattern, _, seconds = value.rpartition("=")
+    if not pattern:
+        raise argparse.ArgumentTypeError("expected PATTERN=SECONDS")
+    return pattern, float(seconds)
+
+
+def parse_fail_command(value: str) -> Tuple[str, int]:
+    """Parse a CMD=CODE forced failure."""
+    cmd, _, code = value.partition("=")
+    if code and int(code) not in Scancard.ERROR_DESCRIPTIONS:
+        raise argparse.ArgumentTypeError(f"unknown error code {code}")
+    return cmd, int(code or 14)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the feeltek scancard TCP service.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=50000)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical")
+    parser.add_argument("--latency", type=float, help="Base reply latency in seconds")
+    parser.add_argument("--jitter", type=float, help="Uniform extra latency in seconds")
+    parser.add_argument("--command-latency", action="append", type=parse_mark_time, default=[],
+                        metavar="CMD=SECONDS", help="Extra latency of one command")
+    parser.add_argument("--mark-time", action="append", type=parse_mark_time, default=[],
+                        metavar="PATTERN=SECONDS", help="Marking duration of files matching a pattern")
+    parser.add_argument("--default-mark-time", type=float, help="Marking duration of other files")
+    parser.add_argument("--entities", type=int, default=1, help="Entity count of every file")
+    parser.add_argument("--drop-rate", type=float, help="Probability of sending no reply")
+    parser.add_argument("--partial-rate", type=float, help="Probability of sending half a reply and closing")
+    parser.add_argument("--disconnect-rate", type=float, help="Probability of closing instead of replying")
+    parser.add_argument("--error-rate", type=float, help="Probability of failing a command with an error code")
+    parser.add_argument("--error-codes", type=lambda s: [int(c) for c in s.split(",")],
+                        help="Comma separated error codes used by --error-rate")
+    parser.add_argument("--fail", action="append", type=parse_fail_command, default=[],
+                        metavar="CMD=CODE", help="Always fail a command with an error code")
+    parser.add_argument("--parallel", action="store_true", help="Process connections concurrently")
+    parser.add_argument("--check-files", action="store_true", help="Fail open_file for missing files")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    simulator = ScancardSimulator(
+        args.host, args.port, args.profile, mark_times=args.mark_time, entity_count=args.entities,
+        error_codes=args.error_codes, fail_commands=dict(args.fail), serialize=not args.parallel,
+        check_files=args.check_files, seed=args.seed)
+    overrides = {
+        "latency": args.latency, "jitter": args.jitter, "mark_time": args.default_mark_time,
+        "drop_rate": args.drop_rate, "partial_rate": args.partial_rate,
+        "disconnect_rate": args.disconnect_rate, "error_rate": args.error_rate,
+    }
+    simulator.profile.update({key: value for key, value in overrides.items() if value is not None})
+    simulator.profile["command_latency"] = {**simulator.profile["command_latency"], **dict(args.command_latency)}
+
+    print(f"Scancard simulator listening on {args.host}:{args.port} with profile '{args.profile}'")
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        print("Commands handled:")
+        for key, count in sorted(simulator.stats.items()):
+            print(f"  {key:<36}{count:>8}")
+
+
+if __name__ == "__main__":
+    main()
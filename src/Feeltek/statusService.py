@@ -0,0 +1,242 @@
+"""
+This code contains the shared working status service of the feeltek scancard.
+A single background poller owns all get_working_status traffic: it polls quickly while
+the card is marking or previewing and backs off while it is idle. Concurrent status
+requests are merged into one in-flight query, and status changes are published as Qt
+signals and plain callbacks. Threads that need to wait for the end of a mark block on
+a condition that is notified by the poller instead of polling on their own.
+
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class ScancardStatusService(QObject):
+    """
+    Owns polling of the scancard working status.
+    Attributes:
+        scancard: The scancard whose get_working_status is polled.
+        fast_interval: Poll interval in seconds while marking or previewing.
+        idle_interval: Initial poll interval in seconds while idle.
+        max_idle_interval: Upper bound the idle interval backs off to.
+        mark_settle_time: Time in seconds after start_mark during which a 'Waiting'
+            status is not trusted to mean the mark has finished.
+    Methods:
+        start(self): Starts the background poller.
+        stop(self): Stops the background poller.
+        request_status(self): Returns a future for the status, sharing an in-flight query.
+        refresh(self, timeout): Queries the status and waits for it.
+        notify_mark_started(self, settle_time): Switches to fast polling after start_mark.
+        wait_for_mark_complete(self, timeout, should_stop): Blocks until the card is back to 'Waiting'.
+        interrupt(self): Wakes the threads waiting for a mark so they re-check should_stop.
+        add_listener(self, callback): Registers a status change callback.
+        remove_listener(self, callback): Removes a status change callback.
+    """
+
+    status_changed = pyqtSignal(str)  # emitted when the status text changes
+    status_polled = pyqtSignal(str)   # emitted for every completed query
+
+    ACTIVE_STATUSES = ("Marking", "Previewing", "Already working")
+    IDLE_STATUS = "Waiting"
+
+    def __init__(self, scancard, fast_interval: float = 0.25, idle_interval: float = 1.0,
+                 max_idle_interval: float = 5.0, mark_settle_time: float = 1.0):
+        super().__init__()
+        self.scancard = scancard
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.mark_settle_time = mark_settle_time
+
+        self.status = "Unknown"
+        self.last_update_time = 0.0
+        self.queries = 0
+        self.merged_requests = 0
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._inflight: Optional[Future] = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._mark_started_at = 0.0
+        self._active_since_mark = False
+        self._settle_time = mark_settle_time
+
+        self._running = False
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the background poller."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._poll_loop, name="scancard-status", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background poller."""
+        self._running = False
+        self._wake.set()
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """Register a callback called with the new status text on every change."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str], None]):
+        """Remove a previously registered status change callback."""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def request_status(self) -> Future:
+        """
+        Get a future for the working status.
+        If a query is already in flight, its future is shared instead of sending a new one.
+
+        Returns:
+            Future: Resolves to the status text returned by Scancard.get_working_status.
+        """
+        with self._lock:
+            if self._inflight is not None:
+                self.merged_requests += 1
+                return self._inflight
+            # Claim the slot with a placeholder; the query itself may block on the scancard mutex
+            future = Future()
+            self._inflight = future
+            self.queries += 1
+        future.add_done_callback(self._on_status)
+        try:
+            query = self.scancard.get_working_status()
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        query.add_done_callback(lambda f: self._chain(f, future))
+        return future
+
+    @staticmethod
+    def _chain(source: Future, target: Future):
+        """Copy the outcome of the scancard query into the shared future."""
+        try:
+            target.set_result(source.result())
+        except Exception as e:
+            target.set_exception(e)
+
+    def refresh(self, timeout: Optional[float] = None) -> str:
+        """Query the status, sharing any in-flight query, and wait for the result."""
+        return self.request_status().result(timeout=timeout)
+
+    def notify_mark_started(self, settle_time: Optional[float] = None):
+        """
+        Note that marking was just started so polling switches to the fast interval.
+
+        Args:
+            settle_time: Settle time of this mark; defaults to mark_settle_time. Short
+                marks such as a single mark_by_index may finish before ever being seen active.
+        """
+        with self._lock:
+            self._mark_started_at = time.monotonic()
+            self._active_since_mark = False
+            self._settle_time = self.mark_settle_time if settle_time is None else settle_time
+        self._wake.set()
+
+    def wait_for_mark_complete(self, timeout: Optional[float] = None,
+                               should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Block until the mark started last has finished.
+        The mark counts as finished once the card reports 'Waiting' after having
+        reported an active status, or once it reports 'Waiting' from a query made
+        after mark_settle_time has passed since start_mark.
+
+        Args:
+            timeout: Maximum time to wait in seconds, or None to wait indefinitely.
+            should_stop: Checked whenever the waiter wakes; the wait gives up once it returns True.
+
+        Returns:
+            bool: True if the mark finished, False if the timeout expired or should_stop returned True.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._running:
+            self.start()
+        self._wake.set()
+        with self._condition:
+            while not self._mark_complete():
+                if should_stop is not None and should_stop():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def interrupt(self):
+        """Wake every thread in wait_for_mark_complete, e.g. after a stop request."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def _mark_complete(self) -> bool:
+        if self.status != self.IDLE_STATUS:
+            return False
+        if self._active_since_mark:
+            return True
+        return self.last_update_time - self._mark_started_at >= self._settle_time
+
+    def _on_status(self, future: Future):
+        try:
+            status = future.result()
+        except Exception as e:
+            status = f"Status query failed: {e}"
+        if not isinstance(status, str):
+            status = str(status)
+
+        with self._condition:
+            if self._inflight is future:
+                self._inflight = None
+            changed = status != self.status
+            self.status = status
+            # The reply reflects the card state when the query was sent, roughly now minus the round trip
+            self.last_update_time = time.monotonic()
+            if status in self.ACTIVE_STATUSES:
+                self._active_since_mark = True
+            listeners = list(self._listeners) if changed else []
+            self._condition.notify_all()
+
+        self.status_polled.emit(status)
+        if changed:
+            self.status_changed.emit(status)
+            for callback in listeners:
+                try:
+                    callback(status)
+                except Exception as e:
+                    self.scancard.log_error(f"Scancard status listener failed: {e}")
+
+    def _next_interval(self, idle_interval: float) -> float:
+        with self._lock:
+            marking = self.status in self.ACTIVE_STATUSES
+            recently_started = time.monotonic() - self._mark_started_at < self.mark_settle_time * 2
+        if marking or recently_started:
+            return self.fast_interval
+        return idle_interval
+
+    def _poll_loop(self):
+        idle_interval = self.idle_interval
+        while self._running:
+            previous = self.status
+            try:
+                self.refresh(timeout=max(getattr(self.scancard, "timeout", 5) * 4, 1.0))
+            except Exception as e:
+                self.scancard.log_error(f"Scancard status poll failed: {e}")
+
+            # Back off while nothing changes, start over on any change
+            if self.status == previous and self.status not in self.ACTIVE_STATUSES:
+                idle_interval = min(idle_interval * 1.5, self.max_idle_interval)
+            else:
+                idle_interval = self.idle_interval
+
+            self._wake.wait(self._next_interval(idle_interval))
+            self._wake.clear()
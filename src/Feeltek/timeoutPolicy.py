@@ -0,0 +1,125 @@
+"""
+This code contains the adaptive reply timeouts of the feeltek scancard commands.
+Instead of one fixed socket timeout, every command gets a timeout derived from a
+rolling window of its own observed latencies: a multiple of a high percentile,
+clamped between a floor and a ceiling for that command. A hung status poll then
+fails in a few hundred milliseconds while open_file or download_Parameters get the
+time they actually need. Until a command has enough samples it gets its ceiling,
+and each timeout in a row doubles its timeout until a reply comes back.
+Commands that must not run twice, such as start_mark, never learn a timeout: a
+slow acknowledgement of one would otherwise look like a lost reply.
+
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, FrozenSet, Optional, Tuple
+
+from Feeltek.connectionPool import NON_IDEMPOTENT_COMMANDS
+
+# Command name -> (floor, ceiling) in seconds
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "get_working_status": (0.5, 2.0),
+    "get_error": (0.2, 2.0),
+    "stop_mark": (0.2, 2.0),
+    "open_file": (2.0, 60.0),
+    "save_file": (2.0, 60.0),
+    "download_Parameters": (2.0, 60.0),
+}
+
+
+class TimeoutPolicy:
+    """
+    Per-command reply timeouts learned from observed latency.
+    Attributes:
+        percentile: Latency percentile the timeout is based on, between 0 and 1.
+        multiplier: Factor applied to the percentile latency.
+        window: Number of recent latencies kept per command.
+        min_samples: Samples needed before a command's timeout is learned.
+        default_limits: (floor, ceiling) in seconds of commands without their own limits.
+        limits: Command name -> (floor, ceiling) in seconds.
+        fixed_commands: Commands that always get their ceiling.
+    Methods:
+        record_latency(self, cmd, seconds): Adds an answered request to the command's window.
+        record_timeout(self, cmd): Notes a request that timed out.
+        timeout_for(self, cmd): Gets the reply timeout of a command.
+        timeout_for_batch(self, commands): Gets the reply timeout of a pipelined batch.
+        snapshot(self): Gets the current timeout and sample count per command.
+    """
+
+    def __init__(self, percentile: float = 0.99, multiplier: float = 3.0, window: int = 200, min_samples: int = 20,
+                 default_limits: Tuple[float, float] = (1.0, 10.0), limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 fixed_commands: FrozenSet[str] = NON_IDEMPOTENT_COMMANDS):
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.window = window
+        self.min_samples = min_samples
+        self.default_limits = default_limits
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.fixed_commands = fixed_commands
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._timeouts_in_row: Dict[str, int] = {}
+        # Command name -> learned timeout, recomputed when a new sample arrives
+        self._learned: Dict[str, Optional[float]] = {}
+
+    def record_latency(self, cmd: str, seconds: float):
+        """Add the round trip time of an answered request to the command's window."""
+        with self._lock:
+            samples = self._samples.get(cmd)
+            if samples is None:
+                samples = self._samples[cmd] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self._timeouts_in_row[cmd] = 0
+            self._learned.pop(cmd, None)
+
+    def record_timeout(self, cmd: str):
+        """Note a request that timed out; the next attempt waits twice as long."""
+        with self._lock:
+            self._timeouts_in_row[cmd] = self._timeouts_in_row.get(cmd, 0) + 1
+
+    def _learn(self, cmd: str) -> Optional[float]:
+        samples = self._samples.get(cmd)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))] * self.multiplier
+
+    def timeout_for(self, cmd: str) -> float:
+        """
+        Get the reply timeout of a command.
+
+        Returns:
+            float: Seconds to wait for the reply.
+        """
+        floor, ceiling = self.limits.get(cmd, self.default_limits)
+        if cmd in self.fixed_commands:
+            return ceiling
+        with self._lock:
+            if cmd in self._learned:
+                learned = self._learned[cmd]
+            else:
+                learned = self._learned[cmd] = self._learn(cmd)
+            timeouts_in_row = self._timeouts_in_row.get(cmd, 0)
+        if learned is None:
+            return ceiling
+        return min(max(learned, floor) * 2 ** timeouts_in_row, ceiling)
+
+    def timeout_for_batch(self, commands) -> float:
+        """Get the reply timeout of a pipelined batch: the longest of its commands."""
+        return max((self.timeout_for(cmd) for cmd in {cmd for cmd, _ in commands}), default=self.default_limits[1])
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the current timeout of every command seen so far.
+
+        Returns:
+            dict: Per command name: timeout in seconds, samples in the window and timeouts in a row.
+        """
+        with self._lock:
+            commands = list(self._samples.keys() | self._timeouts_in_row.keys())
+            counts = {cmd: len(self._samples.get(cmd, ())) for cmd in commands}
+            in_row = {cmd: self._timeouts_in_row.get(cmd, 0) for cmd in commands}
+        return {cmd: {"timeout": self.timeout_for(cmd), "samples": counts[cmd], "timeouts_in_row": in_row[cmd]}
+                for cmd in commands}
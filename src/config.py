@@ -1,2 +1,3 @@
 class Config:
-    DEVELOPMENT_MODE = True  # Set to False in production
\ No newline at end of file
+    DEVELOPMENT_MODE = True  # Set to False in production
+    SCANCARD_SIMULATOR_PROFILE = None  # e.g. "typical": in development mode, use the real Scancard against Feeltek.scancardSimulator
@@ -0,0 +1,142 @@
+import time
+import logging
+
+from layerManager.layerProfiler import LayerProfiler, OVERLAPPING_PHASES, PAUSE_PHASES
+
+class BuildTimeEstimator:
+    """
+    Predicts the remaining time and finish time of a build.
+    The layer time is an exponentially weighted moving average of the current build's
+    layer times, seeded with the sum of the per-phase mean times of past builds' phase
+    profiles, so the estimate is useful from the first layer and follows the live build
+    after a few layers. Every update is constant time.
+    """
+
+    def __init__(self, alpha=0.3, default_layer_time=None):
+        """
+        Initialize the build time estimator.
+
+        Args:
+            alpha (float): Weight of the latest layer time in the moving average
+            default_layer_time (float, optional): Layer time in seconds used without history
+        """
+        self.alpha = alpha
+        self.default_layer_time = default_layer_time
+        self.history_layer_time = None
+        self.history_phase_times = {}
+        self.layer_time = default_layer_time
+        self.total_layers = 0
+        self.layers_done = 0
+        self.layer_started_at = None
+
+        self.logger = logging.getLogger(__name__)
+
+    def load_history(self, profiler, builds=5):
+        """
+        Seed the layer time from the phase times of past builds.
+        Every phase's mean time per layer is kept in history_phase_times; the layer time
+        is their sum. Pauses and phases overlapping others are left out.
+
+        Args:
+            profiler (LayerProfiler): Profiler whose saved profiles are read
+            builds (int): Number of most recent builds to use
+
+        Returns:
+            float: The historical layer time in seconds, or None without history
+        """
+        totals, layers = {}, 0
+        for profile_file in profiler.list_profiles()[:builds]:
+            if profile_file == profiler.profile_file:
+                continue
+            for record in LayerProfiler.load(profile_file):
+                for phase, seconds in record.get("phases", {}).items():
+                    if phase not in OVERLAPPING_PHASES and phase not in PAUSE_PHASES:
+                        totals[phase] = totals.get(phase, 0.0) + seconds
+                layers += 1
+        # A phase missing from a layer took no time on it, so every mean is per layer of the history
+        self.history_phase_times = {phase: total / layers for phase, total in totals.items()}
+        self.history_layer_time = sum(self.history_phase_times.values()) if layers else None
+        if self.layers_done == 0 and self.history_layer_time is not None:
+            self.layer_time = self.history_layer_time
+        return self.history_layer_time
+
+    def start_build(self, total_layers, layers_done=0):
+        """
+        Start estimating a build.
+
+        Args:
+            total_layers (int): Number of layers of the build
+            layers_done (int): Layers already printed, e.g. when resuming
+        """
+        self.total_layers = total_layers
+        self.layers_done = layers_done
+        self.layer_started_at = None
+        self.layer_time = self.history_layer_time if self.history_layer_time is not None else self.default_layer_time
+
+    def layer_started(self, now=None):
+        """Note that the next layer has started."""
+        self.layer_started_at = time.monotonic() if now is None else now
+
+    def layer_finished(self, seconds=None, now=None):
+        """
+        Add a finished layer to the moving average.
+
+        Args:
+            seconds (float, optional): The layer's wall time; defaults to the time since layer_started
+        """
+        now = time.monotonic() if now is None else now
+        if seconds is None and self.layer_started_at is not None:
+            seconds = now - self.layer_started_at
+        self.layers_done += 1
+        self.layer_started_at = None
+        if seconds is None:
+            return
+        if self.layer_time is None:
+            self.layer_time = seconds
+        else:
+            self.layer_time = self.alpha * seconds + (1 - self.alpha) * self.layer_time
+
+    def estimate(self):
+        """
+        Get the current estimate.
+
+        Returns:
+            dict: layers_done, total_layers, progress in percent, layer_time, and
+                remaining (seconds) and finish (Unix timestamp), which are None until
+                there is a layer time to go by
+        """
+        remaining = finish = None
+        if self.layer_time is not None:
+            layers_left = max(self.total_layers - self.layers_done, 0)
+            remaining = layers_left * self.layer_time
+            if self.layer_started_at is not None and layers_left:
+                # Credit the part of the current layer already done
+                remaining -= min(time.monotonic() - self.layer_started_at, self.layer_time)
+            finish = time.time() + remaining
+        return {
+            "layers_done": self.layers_done,
+            "total_layers": self.total_layers,
+            "progress": int(self.layers_done / self.total_layers * 100) if self.total_layers else 0,
+            "layer_time": self.layer_time,
+            "remaining": remaining,
+            "finish": finish,
+        }
+
+    @staticmethod
+    def format_estimate(estimate):
+        """
+        Format an estimate for display.
+
+        Args:
+            estimate (dict): As returned by estimate()
+
+        Returns:
+            str: e.g. "Layer 12/400 - 1:02:15 left - done at 17:45"
+        """
+        text = f"Layer {estimate['layers_done']}/{estimate['total_layers']}"
+        if estimate["remaining"] is None:
+            return f"{text} - estimating..."
+        minutes, seconds = divmod(int(estimate["remaining"]), 60)
+        hours, minutes = divmod(minutes, 60)
+        finish = time.strftime("%H:%M", time.localtime(estimate["finish"]))
+        return f"{text} - {hours}:{minutes:02d}:{seconds:02d} left - done at {finish}"
@@ -0,0 +1,309 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+# Steps of every layer, in order
+LAYER_STEPS = ("prepare_wait", "heat_wait", "mark", "recoat", "checkpoint")
+
+# Optional steps run once per build: before the first layer of a new build, after the last layer
+BUILD_STEPS = ("setup", "finish")
+
+class LayerCancelled(Exception):
+    """Raised inside a step once the print has been aborted or stopped."""
+
+class LayerStepFailed(Exception):
+    """Raised when a layer step reports failure."""
+
+class CancellationToken:
+    """
+    Abort and pause state shared by the engine and its steps.
+    Wraps the process events the device waits already block on, so cancelling wakes
+    those waits at once. Steps call check() between device operations and use the
+    token's waits inside them; both raise LayerCancelled after an abort.
+    """
+
+    def __init__(self, events):
+        """
+        Initialize the cancellation token.
+
+        Args:
+            events (ProcessEvents): Run, pause and stop state of the process
+        """
+        self.events = events
+        self.reason = None
+        self.on_pause = None
+        self.on_resume = None
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self.reason is not None or not self.events.running
+
+    @property
+    def paused(self):
+        return self.events.paused
+
+    def add_callback(self, callback):
+        """Register a callable run once on cancellation, e.g. to stop the laser."""
+        self._callbacks.append(callback)
+
+    def cancel(self, reason="Aborted"):
+        """
+        Cancel the print: stop the process events and run the cancellation callbacks.
+
+        Args:
+            reason (str): Why the print was cancelled
+        """
+        if self.reason is not None:
+            return
+        self.reason = reason
+        self.events.stop()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Cancellation callback failed: {e}")
+
+    def check(self):
+        """Raise LayerCancelled if the print was cancelled."""
+        if self.cancelled:
+            raise LayerCancelled(self.reason or "Stopped")
+
+    def notify(self, *args):
+        """Wake the waits to re-check their conditions."""
+        self.events.notify()
+
+    def wait_for(self, predicate, timeout=None):
+        """
+        Block until a condition holds.
+
+        Returns:
+            bool: True if the condition holds, False on timeout
+        """
+        result = self.events.wait_for(predicate, timeout)
+        self.check()
+        return result
+
+    def wait_for_future(self, future):
+        """Block until a future is done and get its result."""
+        future.add_done_callback(self.notify)
+        self.wait_for(future.done)
+        return future.result()
+
+    def wait_while_paused(self):
+        """
+        Block while the print is paused.
+
+        Returns:
+            bool: True if the print was paused
+        """
+        if self.events.paused and self.on_pause is not None:
+            self.on_pause()
+        held = self.events.paused
+        self.events.wait_while_paused()
+        self.check()
+        if held and self.on_resume is not None:
+            self.on_resume()
+        return held
+
+    def sleep(self, seconds):
+        """Sleep unless the print is cancelled first."""
+        self.events.sleep(seconds)
+        self.check()
+
+class LayerExecutionEngine:
+    """
+    Runs a build as a state machine of explicit layer steps on a dedicated worker.
+    Every layer goes through LAYER_STEPS; each step is a callable taking the layer
+    index and the cancellation token. The optional BUILD_STEPS take only the token:
+    setup runs before the first layer unless a build is resumed, finish after the
+    last layer. Pause is honoured between steps and inside
+    waits that support it, abort is checked between steps and wakes every device
+    wait, so both take effect within milliseconds instead of after the current layer.
+    Pause and abort latencies are measured for every build.
+    """
+
+    IDLE = "idle"
+    RUNNING = "running"
+    PAUSED = "paused"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+    FAILED = "failed"
+
+    def __init__(self, steps, events, profiler=None, on_state=None, on_layer_started=None, on_layer_done=None):
+        """
+        Initialize the layer execution engine.
+
+        Args:
+            steps (dict): Step name -> callable(index, token) returning True on success; the
+                optional "setup" and "finish" steps are callable(token)
+            events (ProcessEvents): Run, pause and stop state the device waits block on
+            profiler (LayerProfiler, optional): Times every step as a phase of its layer
+            on_state (callable, optional): Called with (state, layer, step) on every transition
+            on_layer_started (callable, optional): Called with the layer index before its first step
+            on_layer_done (callable, optional): Called with the layer index after its last step
+        """
+        missing = [step for step in LAYER_STEPS if step not in steps]
+        if missing:
+            raise ValueError(f"Missing layer steps: {', '.join(missing)}")
+        self.steps = steps
+        self.events = events
+        self.profiler = profiler
+        self.on_state = on_state
+        self.on_layer_started = on_layer_started
+        self.on_layer_done = on_layer_done
+
+        self.state = self.IDLE
+        self.current_layer = None
+        self.current_step = None
+        self.token = None
+        self.pause_latencies = []
+        self.abort_latency = None
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="layer-engine")
+
+        # Configure logging
+        self.logger = logging.getLogger(__name__)
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+
+    @property
+    def running(self):
+        return self.state in (self.RUNNING, self.PAUSED)
+
+    def run(self, total_layers, start_index=0, cancel_callbacks=()):
+        """
+        Run layers start_index to total_layers - 1 on the engine's worker.
+
+        Args:
+            total_layers (int): Number of layers of the build
+            start_index (int): Index of the first layer to run, e.g. when resuming
+            cancel_callbacks (iterable): Callables run once when the build is cancelled
+
+        Returns:
+            Future: Resolves to {"state", "layers_done", "reason", "pause_latencies", "abort_latency"}
+        """
+        if self.running:
+            raise RuntimeError("A build is already running")
+        self.events.start()
+        self.token = CancellationToken(self.events)
+        self.token.on_pause = lambda: self._set_state(self.PAUSED)
+        self.token.on_resume = self._resumed
+        for callback in cancel_callbacks:
+            self.token.add_callback(callback)
+        self.pause_latencies = []
+        self.abort_latency = None
+        self.current_layer = None
+        self._set_state(self.RUNNING)
+        return self.executor.submit(self._run, total_layers, start_index, self.token)
+
+    def pause(self):
+        """Hold the build at its next step or pausable wait."""
+        self.events.pause()
+
+    def resume(self):
+        """Continue a paused build."""
+        self.events.resume()
+
+    def abort(self, reason="Aborted by user"):
+        """Abort the build; the running step is interrupted."""
+        if self.token is not None:
+            self.token.cancel(reason)
+
+    def _run(self, total_layers, start_index, token):
+        layers_done = 0
+        reason = None
+        try:
+            if start_index == 0:
+                self._run_build_step("setup", token)
+            for index in range(start_index, total_layers):
+                layer = index + 1
+                self.current_layer = layer
+                if self.on_layer_started is not None:
+                    self.on_layer_started(index)
+                for step in LAYER_STEPS:
+                    paused_at = time.perf_counter()
+                    if token.wait_while_paused() and self.profiler is not None:
+                        self.profiler.record(layer, "pause", time.perf_counter() - paused_at)
+                    self.current_step = step
+                    span = self.profiler.span(layer, step) if self.profiler is not None else nullcontext()
+                    with span:
+                        ok = self.steps[step](index, token)
+                    token.check()
+                    if not ok:
+                        raise LayerStepFailed(f"Step {step} failed on layer {layer}")
+                if self.profiler is not None:
+                    self.profiler.end_layer(layer)
+                layers_done += 1
+                if self.on_layer_done is not None:
+                    self.on_layer_done(index)
+            self.current_layer = None
+            self._run_build_step("finish", token)
+            state = self.COMPLETED
+        except LayerCancelled as e:
+            state = self.ABORTED
+            reason = str(e)
+            if self.events.stop_requested_at is not None:
+                self.abort_latency = time.monotonic() - self.events.stop_requested_at
+            # Also stop the devices when the process was stopped without the token
+            token.cancel(reason)
+            self.logger.info(f"Build aborted on layer {self.current_layer} during {self.current_step} "
+                             f"({reason}), {self._format_latency(self.abort_latency)} after the request")
+        except Exception as e:
+            state = self.FAILED
+            reason = str(e)
+            # Stop the devices as on an abort, e.g. the laser after a failed mark
+            token.cancel(reason)
+            self.logger.error(f"Build failed on layer {self.current_layer} during {self.current_step}: {e}")
+        self._collect_pause_latency()
+        self.current_step = None
+        self._set_state(state)
+        return {
+            "state": state,
+            "layers_done": layers_done,
+            "reason": reason,
+            "pause_latencies": list(self.pause_latencies),
+            "abort_latency": self.abort_latency,
+        }
+
+    def _run_build_step(self, step, token):
+        """Run one of the BUILD_STEPS if the build has it."""
+        if step not in self.steps:
+            return
+        token.wait_while_paused()
+        self.current_step = step
+        ok = self.steps[step](token)
+        token.check()
+        if not ok:
+            raise LayerStepFailed(f"Step {step} failed")
+
+    def _resumed(self):
+        self._collect_pause_latency()
+        self._set_state(self.RUNNING)
+
+    def _collect_pause_latency(self):
+        latency = self.events.take_pause_latency()
+        if latency is not None:
+            self.pause_latencies.append(latency)
+            self.logger.info(f"Build paused on layer {self.current_layer} during {self.current_step}, "
+                             f"{self._format_latency(latency)} after the request")
+
+    def _set_state(self, state):
+        self.state = state
+        if self.on_state is not None:
+            try:
+                self.on_state(state, self.current_layer, self.current_step)
+            except Exception as e:
+                self.logger.error(f"State callback failed: {e}")
+
+    @staticmethod
+    def _format_latency(seconds):
+        return "unknown time" if seconds is None else f"{seconds * 1000:.1f} ms"
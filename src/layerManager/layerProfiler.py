@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+# Phases that run alongside others and do not add to a layer's wall time
+OVERLAPPING_PHASES = frozenset({"prepare"})
+
+# Phases spent paused by the operator, which say nothing about the next build
+PAUSE_PHASES = frozenset({"pause"})
+
+class LayerProfiler:
+    """
+    Records how long each layer spends in each phase of a build.
+    Phases are timed as named spans (e.g. temperature_wait, mark, recoat) and every
+    finished layer is appended as one JSON line to the build's profile file, so a
+    build can be summarised while it runs or after it ended.
+    """
+
+    def __init__(self, profile_dir="layer_profiles"):
+        """
+        Initialize the layer profiler.
+
+        Args:
+            profile_dir (str): Directory to store the per-build profile files
+        """
+        self.profile_dir = profile_dir
+        self.profile_file = None
+        self.layers = {}  # layer -> {phase: seconds}, layers not written yet
+        self.records = []  # finished layers of the current build
+        self._lock = threading.Lock()
+
+        # Configure logging
+        self.logger = logging.getLogger(__name__)
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+
+    def start_build(self, name="build"):
+        """
+        Start profiling a new build in its own profile file.
+
+        Args:
+            name (str): Prefix of the profile file name
+
+        Returns:
+            str: Path to the profile file
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        with self._lock:
+            self.profile_file = os.path.join(self.profile_dir, f"{name}_{timestamp}.jsonl")
+            self.layers = {}
+            self.records = []
+        return self.profile_file
+
+    def record(self, layer, phase, seconds):
+        """
+        Add time spent in a phase to a layer.
+
+        Args:
+            layer (int): Build layer, 1-based
+            phase (str): Phase name
+            seconds (float): Duration to add
+        """
+        with self._lock:
+            phases = self.layers.setdefault(layer, {})
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def span(self, layer, phase):
+        """
+        Time the enclosed block as a phase of a layer.
+
+        Args:
+            layer (int): Build layer, 1-based
+            phase (str): Phase name
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(layer, phase, time.perf_counter() - started)
+
+    def end_layer(self, layer):
+        """
+        Finish a layer and append its phase times to the profile file.
+        The layer's total leaves out OVERLAPPING_PHASES, e.g. the next layer's
+        preparation running during the previous recoat.
+
+        Args:
+            layer (int): Build layer, 1-based
+
+        Returns:
+            dict: The layer record, or None if nothing was recorded for it
+        """
+        with self._lock:
+            phases = self.layers.pop(layer, None)
+            if phases is None:
+                return None
+            record = {
+                "layer": layer,
+                "time": time.time(),
+                "total": sum(seconds for phase, seconds in phases.items() if phase not in OVERLAPPING_PHASES),
+                "phases": phases,
+            }
+            self.records.append(record)
+            profile_file = self.profile_file
+        if profile_file is not None:
+            try:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                with open(profile_file, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                self.logger.error(f"Error writing layer profile: {e}")
+        return record
+
+    @staticmethod
+    def load(profile_file):
+        """
+        Load the layer records of a profile file.
+
+        Args:
+            profile_file (str): Path to the profile file
+
+        Returns:
+            list: The layer records, skipping unreadable lines
+        """
+        records = []
+        try:
+            with open(profile_file, 'r') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+    def list_profiles(self):
+        """
+        List the profile files of past builds, newest first.
+
+        Returns:
+            list: Paths to the profile files
+        """
+        try:
+            files = [os.path.join(self.profile_dir, f) for f in os.listdir(self.profile_dir) if f.endswith(".jsonl")]
+        except OSError:
+            return []
+        return sorted(files, key=os.path.getmtime, reverse=True)
+
+    @staticmethod
+    def summarize(records):
+        """
+        Summarise layer records per phase.
+
+        Args:
+            records (list): Layer records as written by end_layer
+
+        Returns:
+            dict: Per phase: layers, total, mean, p95 and max seconds, the layer of
+                the max, and the share of all recorded time
+        """
+        per_phase = {}
+        for record in records:
+            for phase, seconds in record.get("phases", {}).items():
+                per_phase.setdefault(phase, []).append((seconds, record.get("layer")))
+        grand_total = sum(seconds for values in per_phase.values() for seconds, _ in values)
+
+        summary = {}
+        for phase, values in per_phase.items():
+            durations = sorted(seconds for seconds, _ in values)
+            worst, worst_layer = max(values, key=lambda value: value[0])
+            total = sum(durations)
+            summary[phase] = {
+                "layers": len(durations),
+                "total": total,
+                "mean": total / len(durations),
+                "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                "max": worst,
+                "worst_layer": worst_layer,
+                "share": total / grand_total if grand_total else 0.0,
+            }
+        return summary
+
+    def summary(self):
+        """Summarise the layers of the current build per phase."""
+        with self._lock:
+            records = list(self.records)
+        return self.summarize(records)
+
+    def format_summary(self, records=None):
+        """
+        Format a per-phase summary as a text table, largest share of build time first.
+
+        Args:
+            records (list, optional): Layer records; defaults to the current build
+
+        Returns:
+            str: The table
+        """
+        summary = self.summary() if records is None else self.summarize(records)
+        lines = [f"{'phase':<20}{'layers':>8}{'mean s':>10}{'p95 s':>10}{'max s':>10}{'worst':>8}{'share':>8}"]
+        for phase, stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+            lines.append(
+                f"{phase:<20}{stats['layers']:>8}{stats['mean']:>10.2f}{stats['p95']:>10.2f}"
+                f"{stats['max']:>10.2f}{str(stats['worst_layer']):>8}{stats['share'] * 100:>7.1f}%"
+            )
+        return "\n".join(lines)
@@ -9,6 +9,8 @@ class PrinterStatus(QObject):
     rgb_frame_updated = pyqtSignal(np.ndarray)
     maxtemp_updated = pyqtSignal(float)  # Add the maxtemp_updated signal
     scancard_status_updated = pyqtSignal(str)  # Add the scancard_status_updated signal
+    build_estimate_updated = pyqtSignal(dict)  # remaining time and finish time of the build
+    setpoint_updated = pyqtSignal(float)  # chamber temperature setpoint changed
 
     def __init__(self):
         super().__init__()
@@ -39,6 +41,7 @@ class PrinterStatus(QObject):
         self.last_update_time = time.time()  # Add this attribute
         self.scancard_status = "Unknown"
         self.printing = False
+        self.build_estimate: Dict[str, Any] = {}
 
     def updateTemperatures(self, frame: Any, chamberTemperatures: Dict[str, float]):
         """Update the model with a new frame and temperature values."""
@@ -47,6 +50,10 @@ class PrinterStatus(QObject):
         self.temperatures_updated.emit(frame, chamberTemperatures)
         self.last_update_time = time.time()  # Update the last update time
 
+    def setChamberTemperatureSetpoint(self, value: float):
+        self.chamberTemperatureSetpoint = value
+        self.setpoint_updated.emit(float(value))
+
     def updateRGBFrame(self, frame: Any):
         """Update the model with a new RGB frame."""
         self.rgb_frame = frame
@@ -111,4 +118,9 @@ class PrinterStatus(QObject):
         self.maxtemp_updated.emit(value)  # Emit the maxtemp_updated signal
     
     def updateScancardStatus(self, status: str):
-        self.scancard_status = status
\ No newline at end of file
+        self.scancard_status = status
+        self.scancard_status_updated.emit(status)
+
+    def updateBuildEstimate(self, estimate: Dict[str, Any]):
+        self.build_estimate = estimate
+        self.build_estimate_updated.emit(estimate)
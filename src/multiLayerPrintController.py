@@ -1,17 +1,19 @@
 import os
-import time
 import logging
-from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtCore import QObject, pyqtSignal
 
 from layerManager.layerQueueManager import LayerQueueManager
 from layerManager.printStateManager import PrintStateManager
-from utils.helpers import run_async
+from layerManager.layerExecutionEngine import LayerExecutionEngine
+from processAutomationController.processAutomationController import replace_placeholders
 
 class MultiLayerPrintController(QObject):
     """
     Controller for managing multi-layer printing process.
     Coordinates the layer queue, print state, and automation processes.
+    Layers are run by a LayerExecutionEngine whose steps are implemented here on
+    top of the process automation controller.
     """
     
     # Signals
@@ -45,6 +47,28 @@ class MultiLayerPrintController(QObject):
         self.aborted = False
         self.current_operation = "idle"
         self.current_state_file = None
+        self.heat_settle_time = 2  # seconds the layer heats through once the setpoint is reached
+        self._prepared = {}  # layer index -> Future of its preparation, started during the previous recoat
+
+        # Sends recoat G-code so an abort does not wait for the move in progress
+        self.motion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recoat")
+
+        self.engine = LayerExecutionEngine(
+            {
+                "setup": self._setup_step,
+                "prepare_wait": self._prepare_wait_step,
+                "heat_wait": self._heat_wait_step,
+                "mark": self._mark_step,
+                "recoat": self._recoat_step,
+                "checkpoint": self._checkpoint_step,
+                "finish": self._finish_step,
+            },
+            self.process_automation.events,
+            profiler=self.process_automation.profiler,
+            on_state=self._on_engine_state,
+            on_layer_started=self._on_layer_started,
+            on_layer_done=self._on_layer_done,
+        )
         
         # Configure logging
         self.logger = logging.getLogger(__name__)
@@ -76,195 +100,322 @@ class MultiLayerPrintController(QObject):
         
         return layer_files
     
-    @run_async
     def start_multi_layer_print(self):
         """
         Start the multi-layer print process.
+
+        Returns:
+            Future: Resolves to the engine's build result, or None if the print did not start
         """
         if len(self.layer_manager.layer_files) == 0:
             self.logger.error("No layer files loaded")
             self.print_aborted_signal.emit("No layer files loaded")
-            return
-            
+            return None
+
         if self.print_in_progress:
             self.logger.warning("Print already in progress")
-            return
-            
-        self.print_in_progress = True
-        self.paused = False
-        self.aborted = False
-        
+            return None
+
+        if not self._load_parameter_schedule():
+            return None
+
         # Reset layer manager to start from the beginning
         self.layer_manager.reset()
-        
-        # Save initial state
-        self._save_current_state()
-        
+
         self.logger.info("Starting multi-layer print process")
         self.status_update_signal.emit("Starting print process")
-        
-        try:
-            # Initial setup
-            yield from self._perform_initial_setup()
-            
-            if self.aborted:
-                self.logger.info("Print aborted during initial setup")
-                self.print_aborted_signal.emit("Aborted during initial setup")
-                return
-                
-            # Process each layer
-            while self.layer_manager.get_next_layer() is not None:
-                if self.aborted:
-                    self.logger.info("Print aborted")
-                    self.print_aborted_signal.emit("Aborted by user")
-                    return
-                    
-                # Handle pause state
-                yield from self._handle_pause_state()
-                
-                if self.aborted:
-                    self.logger.info("Print aborted during pause")
-                    self.print_aborted_signal.emit("Aborted during pause")
-                    return
-                
-                # Process the current layer
-                current_layer = self.layer_manager.get_current_layer()
-                current_index = self.layer_manager.current_layer_index
-                
-                # Update UI
-                self.progress_update_signal.emit(self.layer_manager.progress_percentage())
-                self.layer_changed_signal.emit(current_index, current_layer)
-                
-                # Process the layer
-                yield from self._process_layer(current_layer)
-                
-                # Save state after each layer
-                self._save_current_state()
-                
-            # Finalize print
-            if not self.aborted:
-                yield from self._finalize_print()
-                self.print_completed_signal.emit()
-                
-        except Exception as e:
-            self.logger.error(f"Error in multi-layer print: {e}", exc_info=True)
-            self.print_aborted_signal.emit(f"Error: {str(e)}")
-            
-        finally:
-            self.print_in_progress = False
-            self.current_operation = "idle"
-            self.status_update_signal.emit("Print process ended")
-    
-    @run_async
+
+        self.process_automation.profiler.start_build()
+
+        return self._run_layers(0)
+
+    def load_print_state(self, state_file):
+        """
+        Load a saved print state into the layer queue.
+
+        Args:
+            state_file (str): Path to the state file
+
+        Returns:
+            bool: True if the state was loaded
+        """
+        state = self.state_manager.load_print_state(state_file)
+        if not state:
+            self.logger.error(f"Failed to load state from {state_file}")
+            return False
+
+        self.layer_manager.layer_files = state['layer_files']
+        self.layer_manager.total_layers = state['total_layers']
+        self.layer_manager.set_current_layer_index(state['current_layer_index'])
+        self.current_state_file = state_file
+
+        # Resume with the parameter schedule the build was started with
+        self.process_automation.parameter_schedule_file = state.get('parameter_schedule_file')
+
+        # Keep appending to the interrupted build's phase profile
+        profile_file = state.get('profile_file')
+        if profile_file:
+            self.process_automation.profiler.profile_file = profile_file
+        return True
+
     def resume_multi_layer_print(self, state_file=None):
         """
         Resume printing from a saved state.
-        
+
         Args:
             state_file (str, optional): Path to the state file to resume from.
                 If None, uses the most recently saved state.
+
+        Returns:
+            Future: Resolves to the engine's build result, or None if the print did not start
         """
+        if self.print_in_progress:
+            self.logger.warning("Print already in progress")
+            return None
+
         # If no state file provided, use the current one
         if state_file is None:
             state_file = self.current_state_file
-            
+
         if state_file is None:
             saved_states = self.state_manager.list_saved_states()
             if not saved_states:
                 self.logger.error("No saved states found to resume from")
                 self.print_aborted_signal.emit("No saved states found")
-                return
-                
+                return None
+
             # Use the most recent state
             state_file = saved_states[0]['file_path']
-            
-        # Load the state
-        state = self.state_manager.load_print_state(state_file)
-        if not state:
-            self.logger.error(f"Failed to load state from {state_file}")
+
+        if not self.load_print_state(state_file):
             self.print_aborted_signal.emit("Failed to load state")
-            return
-            
-        # Restore the state
-        self.layer_manager.layer_files = state['layer_files']
-        self.layer_manager.total_layers = state['total_layers']
-        current_layer_index = state['current_layer_index']
-        
-        # Set the current layer
-        self.layer_manager.set_current_layer_index(current_layer_index)
-        
-        # Start/resume the print
-        self.current_state_file = state_file
+            return None
+
+        if not self._load_parameter_schedule():
+            return None
+
+        # The saved index is the last layer that was completed
+        start_index = self.layer_manager.current_layer_index + 1
+        self.logger.info(f"Resuming print from layer {start_index + 1} of {self.layer_manager.total_layers}")
+        self.status_update_signal.emit(f"Resuming print from layer {start_index + 1}")
+        self.print_resumed_signal.emit()
+        self.progress_update_signal.emit(self.layer_manager.progress_percentage())
+
+        return self._run_layers(start_index)
+
+    def _load_parameter_schedule(self):
+        """
+        Compile and validate the layer parameter schedule the user picked for the loaded layers.
+
+        Returns:
+            bool: False if the schedule is invalid; the print is reported as aborted.
+        """
+        try:
+            self.process_automation.load_parameter_schedule(self.layer_manager.total_layers)
+        except ValueError as e:
+            self.logger.error(f"Print not started: {e}")
+            self.print_aborted_signal.emit(str(e))
+            return False
+        return True
+
+    def _run_layers(self, start_index):
+        """Start the engine on the layers from start_index and report its outcome."""
         self.print_in_progress = True
         self.paused = False
         self.aborted = False
-        
-        self.logger.info(f"Resuming print from layer {current_layer_index + 1} of {self.layer_manager.total_layers}")
-        self.status_update_signal.emit(f"Resuming print from layer {current_layer_index + 1}")
-        self.print_resumed_signal.emit()
-        
+        self._prepared = {}
+
+        # Save initial state
+        self._save_current_state()
+
+        self.process_automation.start_build_estimate(self.layer_manager.total_layers, start_index)
+        scancard = self.scancard
+        future = self.engine.run(
+            self.layer_manager.total_layers,
+            start_index,
+            # Wake a wait for the end of the mark and stop the laser at once
+            cancel_callbacks=[scancard.status_service.interrupt, scancard.stop_mark,
+                              scancard.geometry_index.cancel_build, self._cancel_prepared],
+        )
+        future.add_done_callback(self._on_build_finished)
+        return future
+
+    def _cancel_prepared(self):
+        """Drop next-layer preparations that have not started yet."""
+        for future in list(self._prepared.values()):
+            future.cancel()
+
+    def _on_build_finished(self, future):
+        """Report the outcome of a build run by the engine."""
         try:
-            # Update UI
-            self.progress_update_signal.emit(self.layer_manager.progress_percentage())
-            current_layer = self.layer_manager.get_current_layer()
-            if current_layer:
-                self.layer_changed_signal.emit(current_layer_index, current_layer)
-            
-            # Process each remaining layer
-            while self.layer_manager.get_next_layer() is not None:
-                if self.aborted:
-                    self.logger.info("Print aborted")
-                    self.print_aborted_signal.emit("Aborted by user")
-                    return
-                    
-                # Handle pause state
-                yield from self._handle_pause_state()
-                
-                if self.aborted:
-                    self.logger.info("Print aborted during pause")
-                    self.print_aborted_signal.emit("Aborted during pause")
-                    return
-                
-                # Process the current layer
-                current_layer = self.layer_manager.get_current_layer()
-                current_index = self.layer_manager.current_layer_index
-                
-                # Update UI
-                self.progress_update_signal.emit(self.layer_manager.progress_percentage())
-                self.layer_changed_signal.emit(current_index, current_layer)
-                
-                # Process the layer
-                yield from self._process_layer(current_layer)
-                
-                # Save state after each layer
-                self._save_current_state()
-                
-            # Finalize print
-            if not self.aborted:
-                yield from self._finalize_print()
-                self.print_completed_signal.emit()
-                
+            result = future.result()
         except Exception as e:
-            self.logger.error(f"Error in resuming multi-layer print: {e}", exc_info=True)
-            self.print_aborted_signal.emit(f"Error: {str(e)}")
-            
+            result = {"state": LayerExecutionEngine.FAILED, "reason": str(e)}
+
+        self.print_in_progress = False
+        self.current_operation = "idle"
+        self._prepared = {}
+
+        if result["state"] == LayerExecutionEngine.COMPLETED:
+            self.logger.info("Multi-layer print completed")
+            print(self.process_automation.profiler.format_summary())
+            self.progress_update_signal.emit(100)
+            self.print_completed_signal.emit()
+        elif result["state"] == LayerExecutionEngine.ABORTED:
+            self.aborted = True
+            self.print_aborted_signal.emit(result["reason"])
+        else:
+            self.logger.error(f"Error in multi-layer print: {result['reason']}")
+            self.print_aborted_signal.emit(f"Error: {result['reason']}")
+        self.status_update_signal.emit("Print process ended")
+
+    def _setup_step(self, token):
+        """
+        Lay the initial levelling and heated buffer layers before the first layer of a new build.
+        The card is idle meanwhile, so the layers' entity geometry is indexed in the background.
+        """
+        printer_status = self.main_window.printer_status
+        # Indexing switches the file open on the card, so it must be over before layer 1 is prepared
+        indexing = self.process_automation.index_layer_geometry(self.layer_manager.layer_files)
+        try:
+            self.status_update_signal.emit("Initial levelling recoat")
+            if not self._repeat_recoat(printer_status.initialLevellingRecoatingSequence,
+                                       int(printer_status.initialLevellingHeight / printer_status.layerHeight), token):
+                return False
+            self.status_update_signal.emit("Heated buffer recoat")
+            return self._repeat_recoat(printer_status.heatedBufferRecoatingSequence,
+                                       int(printer_status.heatedBufferHeight / printer_status.layerHeight), token, heated=True)
         finally:
-            self.print_in_progress = False
-            self.current_operation = "idle"
-            self.status_update_signal.emit("Print process ended")
-    
-    def pause_print(self):
-        """Pause the print process."""
-        if self.print_in_progress and not self.paused:
+            # Files not indexed by now are indexed on a later build
+            self.scancard.geometry_index.cancel_build()
+            indexing.result()
+
+    def _finish_step(self, token):
+        """Cover the last layer with the final heated buffer."""
+        printer_status = self.main_window.printer_status
+        self.status_update_signal.emit("Final heated buffer recoat")
+        return self._repeat_recoat(printer_status.heatedBufferRecoatingSequence,
+                                   int(printer_status.heatedBufferHeight / printer_status.layerHeight), token, heated=True)
+
+    def _repeat_recoat(self, sequence, count, token, heated=False):
+        """Run a recoating sequence count times; heated recoats wait for the chamber setpoint first."""
+        for _ in range(count):
+            if heated:
+                self._heat_wait_step(None, token)
+            token.wait_while_paused()
+            if not self._send_gcode(sequence, token):
+                return False
+        return True
+
+    def _send_gcode(self, sequence, token):
+        """Send a G-code sequence on the motion worker; an abort takes effect between lines."""
+        printer_status = self.main_window.printer_status
+        lines = replace_placeholders(sequence, printer_status).split('\n')
+
+        def send():
+            for line in lines:
+                if token.cancelled:
+                    return False
+                self.main_window.moonraker_api.send_gcode(line)
+            return True
+
+        return token.wait_for_future(self.motion_executor.submit(send))
+
+    def _prepare_wait_step(self, index, token):
+        """Wait for the layer's file and parameters to be on the card."""
+        layer = index + 1
+        future = self._prepared.pop(index, None)
+        if future is None:
+            future = self.process_automation.prepare_layer(self.layer_manager.layer_files[index], layer, token)
+        return token.wait_for_future(future)
+
+    def _heat_wait_step(self, index, token):
+        """Wait for the chamber setpoint, then let the layer heat through. Pausable."""
+        while True:
+            token.wait_while_paused()
+            token.wait_for(lambda: self.process_automation.chamber_temperature_reached() or token.paused)
+            if not token.paused:
+                break
+        token.sleep(self.heat_settle_time)
+        return True
+
+    def _mark_step(self, index, token):
+        """Mark the layer, then start preparing the next one for the time of the recoat."""
+        layer = index + 1
+        self.scancard.error_capture.set_layer(layer)
+        if not self.process_automation.mark_loaded_layer(layer):
+            return False
+        if index + 1 < self.layer_manager.total_layers:
+            self._prepared[index + 1] = self.process_automation.prepare_layer(
+                self.layer_manager.layer_files[index + 1], layer + 1, token)
+        return True
+
+    def _recoat_step(self, index, token):
+        """Dose and recoat the next layer; an abort takes effect between G-code lines."""
+        return self._send_gcode(self.main_window.printer_status.printingRecoatingSequence, token)
+
+    def _checkpoint_step(self, index, token):
+        """Save the print state with the layer as the last completed one."""
+        self.layer_manager.set_current_layer_index(index)
+        if self._save_current_state() is None:
+            self.logger.warning(f"Print state not saved after layer {index + 1}, resuming will repeat it")
+        return True
+
+    def _save_current_state(self):
+        """
+        Save the current print state.
+
+        Returns:
+            str: Path to the state file, or None on failure
+        """
+        state_file = self.state_manager.save_print_state({
+            'current_layer_index': self.layer_manager.current_layer_index,
+            'total_layers': self.layer_manager.total_layers,
+            'layer_files': self.layer_manager.layer_files,
+            'profile_file': self.process_automation.profiler.profile_file,
+            'parameter_schedule_file': self.process_automation.parameter_schedule_file
+        })
+        if state_file is not None:
+            self.current_state_file = state_file
+        return state_file
+
+    def _on_layer_started(self, index):
+        """Publish the layer the engine starts."""
+        self.process_automation.build_estimator.layer_started()
+        self.layer_changed_signal.emit(index, self.layer_manager.layer_files[index])
+
+    def _on_layer_done(self, index):
+        """Publish the progress after a finished layer."""
+        self.process_automation.build_estimator.layer_finished()
+        self.process_automation.publish_build_estimate()
+        self.progress_update_signal.emit(int((index + 1) / self.layer_manager.total_layers * 100))
+
+    def _on_engine_state(self, state, layer, step):
+        """Mirror the engine state and publish pause and resume."""
+        self.current_operation = step or state
+        if state == LayerExecutionEngine.PAUSED and not self.paused:
             self.paused = True
-            self.logger.info("Print paused")
-            self.status_update_signal.emit("Print paused")
+            self.status_update_signal.emit(f"Print paused on layer {layer}" if layer else f"Print paused during {step}")
             self.print_paused_signal.emit()
-    
+        elif state == LayerExecutionEngine.RUNNING and self.paused:
+            self.paused = False
+            self.status_update_signal.emit(f"Print resumed on layer {layer}" if layer else f"Print resumed during {step}")
+            self.print_resumed_signal.emit()
+
+    def pause_print(self):
+        """Pause the print process at the next step or pausable wait."""
+        if self.print_in_progress and not self.paused:
+            self.logger.info("Print pause requested")
+            self.engine.pause()
+
     def resume_print(self):
         """Resume a paused print."""
-        if self.print_in_progress and self.paused:
-            self.paused = False
-            self.logger.info("Print resumed")
-            self.status_update_signal.emit("Print resumed")
-            self.print_resumed_signal.emit()
\ No newline at end of file
+        if self.print_in_progress:
+            self.logger.info("Print resume requested")
+            self.engine.resume()
+
+    def abort_print(self, reason="Aborted by user"):
+        """Abort the print process; the current step is interrupted."""
+        if self.print_in_progress:
+            self.logger.info(f"Print abort requested: {reason}")
+            self.engine.abort(reason)
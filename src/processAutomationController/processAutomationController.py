@@ -1,9 +1,15 @@
-from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
 from utils.helpers import run_async
 import time
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from layerManager.printStateManager import PrintStateManager
+from layerManager.layerProfiler import LayerProfiler
+from layerManager.buildTimeEstimator import BuildTimeEstimator
+from Feeltek.markOrderOptimizer import MarkOrderOptimizer
+from Feeltek.layerSchedule import LayerParameterSchedule
+from processAutomationController.processEvents import ProcessEvents
 
 class ProcessAutomationController(QObject):
     progress_update_signal = pyqtSignal(int)
@@ -11,15 +17,225 @@ class ProcessAutomationController(QObject):
     def __init__(self, main_window):
         super(ProcessAutomationController, self).__init__()
         self.main_window = main_window
+        # Run, pause and stop state plus device updates, waited on instead of polled
+        self.events = ProcessEvents()
         self.process_running = False
         self.print_state_manager = PrintStateManager()
         self.current_layer_index = -1
         self.total_layers = 0
         self.layer_files = []
+        self.parameter_schedule = None
+        self.parameter_schedule_file = None  # picked by the user; builds use no schedule without one
+        self.mark_order_optimizer = None
+        self.profiler = LayerProfiler()
+        self.build_estimator = BuildTimeEstimator()
+
+        # Opens and parameterises the next layer while the current one is recoated
+        self.prepare_executor = ThreadPoolExecutor(max_workers=1)
+
+        # Wake temperature waits straight from the camera thread and on setpoint changes
+        printer_status = self.main_window.printer_status
+        printer_status.temperatures_updated.connect(self.events.notify, Qt.DirectConnection)
+        printer_status.setpoint_updated.connect(self.events.notify, Qt.DirectConnection)
 
         # Connect the progress update signal to the slot
         self.progress_update_signal.connect(self.update_progress_bar)
 
+    @property
+    def process_running(self):
+        return self.events.running
+
+    @process_running.setter
+    def process_running(self, running):
+        if running:
+            self.events.start()
+        else:
+            self.events.stop()
+            # Release a worker blocked on the end of a mark and stop switching files for the geometry index
+            scancard = getattr(self.main_window, "scancard", None)
+            if scancard is not None:
+                scancard.status_service.interrupt()
+                scancard.geometry_index.cancel_build()
+
+    def pause(self):
+        """Hold the process before its next recoat or layer."""
+        self.events.pause()
+
+    def resume(self):
+        """Continue a paused process."""
+        self.events.resume()
+
+    def chamber_temperature_reached(self):
+        """Check whether the chamber has reached its setpoint."""
+        setpoint = self.main_window.printer_status.chamberTemperatureSetpoint
+        temps = self.main_window.printer_status.chamberTemperatures
+        return all(temps.get(pos, 0) >= setpoint for pos in ['middle-center'])
+
+    def wait_for_chamber_temperature(self, settle_time=2):
+        """
+        Wait until the chamber reaches its setpoint, then let the layer heat through.
+        Woken by every temperature and setpoint update instead of polling.
+
+        Args:
+            settle_time: Seconds to wait once the setpoint is reached.
+
+        Returns:
+            bool: False if the process was stopped while waiting.
+        """
+        if not self.events.wait_for(self.chamber_temperature_reached):
+            return False
+        return self.events.sleep(settle_time)
+
+    def set_parameter_schedule(self, schedule, total_layers=None):
+        """
+        Compile and set the per-layer parameter schedule of the next build.
+
+        Args:
+            schedule: A LayerParameterSchedule, or None to leave the card's parameters alone.
+            total_layers: Number of layers; defaults to the loaded layer files or the part height.
+
+        Raises:
+            ValueError: If the schedule is invalid for the build.
+        """
+        if schedule is None:
+            self.parameter_schedule = None
+            return
+        if total_layers is None:
+            total_layers = len(self.layer_files) or int(
+                self.main_window.printer_status.partHeight / self.main_window.printer_status.layerHeight)
+        self.parameter_schedule = schedule.compile(total_layers)
+
+    def set_parameter_schedule_file(self, path, total_layers=None):
+        """
+        Choose the schedule file of the next builds, checking it first.
+        The schedule is validated again against the build when the build starts.
+
+        Args:
+            path: YAML schedule file, or None to build without a schedule.
+            total_layers: Number of layers to validate against, if already known.
+
+        Raises:
+            ValueError: If the file cannot be read or the schedule is invalid; the previous choice is kept.
+        """
+        if path is not None:
+            schedule = LayerParameterSchedule.from_yaml(path)
+            if total_layers:
+                schedule.compile(total_layers)
+        self.parameter_schedule_file = path
+
+    def load_parameter_schedule(self, total_layers=None):
+        """
+        Load, compile and set the per-layer parameter schedule of the next build from
+        the schedule file the user picked. Without one the card's parameters are left alone.
+
+        Args:
+            total_layers: Number of layers; see set_parameter_schedule.
+
+        Raises:
+            ValueError: If the file cannot be read or the schedule is invalid for the build.
+        """
+        if self.parameter_schedule_file is None:
+            self.set_parameter_schedule(None)
+            return
+        self.set_parameter_schedule(LayerParameterSchedule.from_yaml(self.parameter_schedule_file), total_layers)
+
+    def apply_layer_parameters(self, layer):
+        """
+        Push the scheduled parameters of a layer to the scancard.
+
+        Args:
+            layer: Build layer, 1-based.
+
+        Returns:
+            bool: True if there is no schedule or all writes succeeded.
+        """
+        schedule = self.parameter_schedule
+        if schedule is None or layer > schedule.total_layers:
+            return True
+        summary = schedule.apply(self.main_window.scancard, layer).result()
+        download = summary["download"]
+        if summary["failed"] or (download is not None and download.get("ret_value") != 1):
+            print(f"Failed to apply parameters of layer {layer}: {summary['failed'] or download.get('error', download.get('ret_value'))}")
+            return False
+        if summary["written"]:
+            print(f"Applied parameters of layer {layer}: {len(summary['written'])} parameter set(s) changed")
+        return True
+
+    def set_mark_order_optimization(self, enabled, **options):
+        """
+        Mark layers entity by entity in a jump-minimising order instead of file order.
+
+        Args:
+            enabled: True to use the mark order optimizer, False for start_mark.
+            **options: Passed to MarkOrderOptimizer, e.g. jump_speed or heat_radius.
+        """
+        self.mark_order_optimizer = MarkOrderOptimizer(self.main_window.scancard, **options) if enabled else None
+
+    def mark_layer_optimized(self, layer):
+        """
+        Mark the loaded layer with the mark order optimizer.
+
+        Args:
+            layer: Build layer, 1-based, used in messages.
+
+        Returns:
+            bool: True if every entity was marked.
+        """
+        result = self.mark_order_optimizer.mark_layer(should_stop=lambda: not self.process_running).result()
+        if not result["ok"]:
+            print(f"Failed to mark layer {layer}: {result['error']}")
+            return False
+        plan = result["plan"]
+        if not plan["use_order"]:
+            print(f"Marked layer {layer} in file order: {plan['estimated_saving'] * 1000:.1f} ms of jumps saved would "
+                  f"not cover {plan['overhead'] * 1000:.1f} ms of per-entity overhead")
+            return True
+        print(f"Marked layer {layer} in optimized order: {plan['optimized_distance']:.1f} mm of jumps instead of "
+              f"{plan['file_order_distance']:.1f} mm, about {(plan['estimated_saving'] - plan['overhead']) * 1000:.1f} ms saved")
+        return True
+
+    def index_layer_geometry(self, layer_files=None):
+        """
+        Index the entity geometry of the layer files in the background, e.g. during preheat.
+        Files already in the index are not opened again. Indexing switches the file open
+        on the card, so cancel it and wait for it before the first layer is prepared;
+        multi-layer prints do so at the end of their setup. Stopping the process cancels it.
+
+        Args:
+            layer_files: Layer files to index; defaults to the loaded layer files.
+
+        Returns:
+            Future: Resolves to the build summary {"indexed", "cached", "failed", "cancelled"}.
+        """
+        scancard = self.main_window.scancard
+        future = scancard.geometry_index.build(scancard, list(layer_files if layer_files is not None else self.layer_files))
+
+        def report(f):
+            summary = f.result()
+            print(f"Layer geometry indexed: {summary['indexed']} new, {summary['cached']} already indexed, "
+                  f"{len(summary['failed'])} failed")
+        future.add_done_callback(report)
+        return future
+
+    def start_build_estimate(self, total_layers, layers_done=0):
+        """Seed the build time estimate from past builds and publish it."""
+        self.build_estimator.load_history(self.profiler)
+        self.build_estimator.start_build(total_layers, layers_done)
+        self.publish_build_estimate()
+
+    def publish_build_estimate(self):
+        """Publish the current build time estimate on the printer status."""
+        self.main_window.printer_status.updateBuildEstimate(self.build_estimator.estimate())
+
+    def build_estimate(self):
+        """
+        Get the current build time estimate.
+
+        Returns:
+            dict: layers_done, total_layers, progress, layer_time, remaining (s) and finish (Unix time).
+        """
+        return self.build_estimator.estimate()
+
     def update_progress_bar(self, value):
         """Slot to update the progress bar value."""
         self.main_window.home_screen.printProgressBar.setValue(value)
@@ -38,12 +254,7 @@ class ProcessAutomationController(QObject):
                 break
 
             # Pause handling
-            while not self.main_window.home_screen.playPauseButton.isChecked():
-                if not self.process_running:
-                    break
-                time.sleep(1)  # Sleep for a short duration to avoid busy waiting
-
-            if not self.process_running:
+            if not self.events.wait_while_paused():
                 break
 
             # Perform recoat operation
@@ -66,24 +277,12 @@ class ProcessAutomationController(QObject):
             if not self.process_running:
                 break
 
-            while True:
-                setpoint = self.main_window.printer_status.chamberTemperatureSetpoint
-                temps = self.main_window.printer_status.chamberTemperatures
-                if all(temps.get(pos, 0) >= setpoint for pos in ['middle-center']):
-                    time.sleep(2) #wait 20 secs atleast for layer to heat
-                    break
-                if not self.process_running:
-                    self.progress_update_signal.emit(0)
-                    break
-                time.sleep(1)  # Sleep for a short duration to avoid busy waiting
+            if not self.wait_for_chamber_temperature():
+                self.progress_update_signal.emit(0)
+                break
 
             # Pause handling
-            while not self.main_window.home_screen.playPauseButton.isChecked():
-                if not self.process_running:
-                    break
-                time.sleep(1)  # Sleep for a short duration to avoid busy waiting
-
-            if not self.process_running:
+            if not self.events.wait_while_paused():
                 break
 
             # Perform recoat operation
@@ -136,6 +335,19 @@ class ProcessAutomationController(QObject):
         self.set_motion_control_buttons_enabled(False)
         self.progress_update_signal.emit(0)
 
+        layerHeight = self.main_window.printer_status.layerHeight
+        partHeight = self.main_window.printer_status.partHeight
+        recoatCount = int(partHeight / layerHeight)
+
+        # Compile and validate the layer parameter schedule before anything moves
+        try:
+            self.load_parameter_schedule(recoatCount)
+        except ValueError as e:
+            print(f"Print not started: {e}")
+            self.process_running = False
+            self.set_motion_control_buttons_enabled(True)
+            return
+
         # Step 1: Initial Levelling Recoat
         self.initialLevellingRecoat()
         self.progress_update_signal.emit(10)
@@ -147,102 +359,164 @@ class ProcessAutomationController(QObject):
         print("Heated Buffer Recoat done")
 
         # Step 3 and 4: Mark laser and dose recoat layer until partHeight is achieved
-        layerHeight = self.main_window.printer_status.layerHeight
-        partHeight = self.main_window.printer_status.partHeight
-        recoatCount = int(partHeight / layerHeight)
-
+        self.profiler.start_build()
+        self.start_build_estimate(recoatCount)
         for i in range(recoatCount):
             if not self.process_running:
                 self.progress_update_signal.emit(0)
                 break
+            self.build_estimator.layer_started()
 
+            layer = i + 1
             # Pause handling
-            while not self.main_window.home_screen.playPauseButton.isChecked():
-                if not self.process_running:
-                    self.progress_update_signal.emit(0)
-                    break
-                time.sleep(1)  # Sleep for a short duration to avoid busy waiting
-
-            while True:
-                setpoint = self.main_window.printer_status.chamberTemperatureSetpoint
-                temps = self.main_window.printer_status.chamberTemperatures
-                if all(temps.get(pos, 0) >= setpoint for pos in ['middle-center']):
-                    time.sleep(2) #wait 20 secs atleast for layer to heat
-                    break
-                if not self.process_running:
-                    self.progress_update_signal.emit(0)
-                    break
-                time.sleep(1)  # Sleep for a short duration to avoid busy waiting
+            with self.profiler.span(layer, "pause"):
+                self.events.wait_while_paused()
+
+            with self.profiler.span(layer, "temperature_wait"):
+                self.wait_for_chamber_temperature()
 
             if not self.process_running:
                 self.progress_update_signal.emit(0)
                 break
 
+            self.main_window.scancard.error_capture.set_layer(layer)
+            with self.profiler.span(layer, "parameters"):
+                parameters_applied = self.apply_layer_parameters(layer)
+            if not parameters_applied:
+                self.process_running = False
+                self.progress_update_signal.emit(0)
+                break
+
             print("Marking layer number: ", i)
-            # Mark laser until the command is successfully sent
-            future = self.main_window.scancard.start_mark()
-            response = future.result()
-            time.sleep(5)  # Sleep for a short duration to avoid busy waiting \\ to ensure we get latest status
-            while self.main_window.printer_status.scancard_status == "Marking":
-                time.sleep(1)
-                if not self.process_running:
-                    self.progress_update_signal.emit(0)
-                    break
+            with self.profiler.span(layer, "mark"):
+                if not self.mark_loaded_layer(layer):
+                    self.process_running = False
 
             if not self.process_running:
                 self.progress_update_signal.emit(0)
                 break
 
             # Dose recoat layer
-            self.dose_recoat_layer()
+            with self.profiler.span(layer, "recoat"):
+                self.dose_recoat_layer()
+            self.profiler.end_layer(layer)
+            self.build_estimator.layer_finished()
+            self.publish_build_estimate()
             progress = int((i + 1) / recoatCount * 60) + 20
             self.progress_update_signal.emit(progress)
 
+        if self.profiler.records:
+            print(self.profiler.format_summary())
+
         # Step 5: Final Heated Buffer Recoat
         self.heatedBufferRecoat()
         self.progress_update_signal.emit(100)
 
         self.set_motion_control_buttons_enabled(True)
 
+    def prepare_layer(self, layer_file, layer, token=None):
+        """
+        Get a layer ready to mark: open its file and write its scheduled parameters.
+        Runs on the preparation worker, so it can overlap the recoat of the previous layer.
+        Once the token is cancelled the preparation sends nothing more to the card;
+        a preparation still queued is not started at all.
+
+        Args:
+            layer_file: Path of the layer's .emd file.
+            layer: Build layer, 1-based.
+            token: CancellationToken of the build, checked between card operations.
+
+        Returns:
+            Future: Resolves to True if the layer is ready to mark.
+        """
+        def task():
+            with self.profiler.span(layer, "prepare"):
+                return self._prepare(layer_file, layer, token)
+
+        return self.prepare_executor.submit(task)
+
+    def _prepare(self, layer_file, layer, token=None):
+        """Open a layer file and write the layer's parameters; see prepare_layer."""
+        cancelled = lambda: token is not None and token.cancelled
+        if cancelled():
+            return False
+        scancard = self.main_window.scancard
+        scancard.error_capture.set_layer(layer)
+
+        # Open the layer file; identical consecutive layer files stay loaded
+        result = scancard.load_file(layer_file).result()
+        if result.get("ret_value") != 1:
+            print(f"Failed to open layer {layer} ({os.path.basename(layer_file)}): {result.get('error', result.get('ret_value'))}")
+            return False
+        if cancelled():
+            return False
+
+        # Opening a file reloads its parameters, so push the scheduled ones again
+        return self.apply_layer_parameters(layer)
+
+    def mark_loaded_layer(self, layer):
+        """
+        Mark the layer whose file and parameters are on the card and wait until it is done.
+
+        Args:
+            layer: Build layer, 1-based.
+
+        Returns:
+            bool: True if the layer was marked.
+        """
+        if self.mark_order_optimizer is not None:
+            return self.mark_layer_optimized(layer)
+
+        scancard = self.main_window.scancard
+        response = scancard.start_mark().result()
+        if response.get("ret_value") != 1:
+            print(f"Failed to start marking layer {layer}: {response.get('error', response.get('ret_value'))}")
+            return False
+        health = scancard.health
+        stopped = lambda: not self.process_running
+        # stop_process interrupts the wait; the timeout only bounds how late a dead card is noticed
+        while not scancard.status_service.wait_for_mark_complete(timeout=1.0, should_stop=stopped):
+            if not self.process_running:
+                return False
+            if health.state == health.DOWN:
+                print(f"Scancard went down while marking layer {layer}: {health.last_error}")
+                return False
+        return True
+
+    def _finish_layer(self, layer):
+        """Recoat for the next layer, save the print state and write the layer's phase times."""
+        with self.profiler.span(layer, "recoat"):
+            self.dose_recoat_layer()
+        with self.profiler.span(layer, "save_state"):
+            self.print_state_manager.save_print_state({
+                'current_layer_index': self.current_layer_index,
+                'total_layers': self.total_layers,
+                'layer_files': self.layer_files,
+                'profile_file': self.profiler.profile_file
+            })
+        self.profiler.end_layer(layer)
+
     def process_layer(self, layer_file):
-        """Process a single layer file."""
-        # Open the layer file
-        future = self.main_window.scancard.open_file(layer_file)
-        future.result()  # Wait for completion
-        
-        # Print the layer
+        """Process a single layer file. Returns False if the layer could not be started."""
+        layer = self.current_layer_index + 1
+        if not self.prepare_layer(layer_file, layer).result():
+            return False
         print(f"Processing layer: {os.path.basename(layer_file)}")
-        
-        # Start marking
-        future = self.main_window.scancard.start_mark()
-        future.result()  # Wait for completion
-        
-        # Wait for marking to complete
-        self._wait_for_marking_complete()
-        
-        # Recoat for the next layer
-        self.dose_recoat_layer()
-        
-        # Save current state
-        self.print_state_manager.save_print_state({
-            'current_layer_index': self.current_layer_index,
-            'total_layers': self.total_layers,
-            'layer_files': self.layer_files
-        })
-        
+        with self.profiler.span(layer, "mark"):
+            if not self.mark_loaded_layer(layer):
+                return False
+        self._finish_layer(layer)
+        return True
+
     def _wait_for_marking_complete(self):
         """Wait for marking to complete."""
-        while True:
-            future = self.main_window.scancard.get_working_status()
-            status = future.result()
-            if status == "Waiting":
-                break
-            time.sleep(1)  # Sleep for a short duration
+        self.main_window.scancard.status_service.wait_for_mark_complete()
 
     def stop_process(self):
         """Stop the recoat process."""
         self.process_running = False
         self.main_window.home_screen.playPauseButton.setChecked(False)
+        self.main_window.home_screen.is_paused = False
         self.progress_update_signal.emit(0)
 
     def set_motion_control_buttons_enabled(self, enabled):
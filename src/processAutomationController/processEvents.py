@@ -0,0 +1,123 @@
+import threading
+import time
+
+class ProcessEvents:
+    """
+    Condition-based waits for the process automation worker.
+    The run, pause and stop state lives here instead of in widgets, and every change
+    to it, as well as every temperature or setpoint update from the device threads,
+    notifies one condition. Waits re-check their condition when notified, so they
+    return within milliseconds of the event instead of on the next sleep tick.
+    Stop and pause requests are timestamped so their latency can be measured.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._running = False
+        self._paused = False
+        self.stop_requested_at = None
+        self.pause_requested_at = None
+        self._pause_latency = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def start(self):
+        """Mark the process as running and not paused."""
+        with self._condition:
+            self._running = True
+            self._paused = False
+            self.stop_requested_at = None
+            self.pause_requested_at = None
+            self._pause_latency = None
+            self._condition.notify_all()
+
+    def stop(self):
+        """Stop the process; every wait returns False."""
+        with self._condition:
+            if self._running:
+                self.stop_requested_at = time.monotonic()
+            self._running = False
+            self._paused = False
+            self._condition.notify_all()
+
+    def pause(self):
+        """Hold the process at its next wait_while_paused."""
+        with self._condition:
+            if not self._paused:
+                self.pause_requested_at = time.monotonic()
+                self._pause_latency = None
+            self._paused = True
+            self._condition.notify_all()
+
+    def resume(self):
+        """Release a paused process."""
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+
+    def notify(self, *args):
+        """Wake the waits to re-check their conditions, e.g. after a temperature update."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait_for(self, predicate, timeout=None):
+        """
+        Block until a condition holds or the process is stopped.
+
+        Args:
+            predicate (callable): Condition to wait for, re-checked on every notify
+            timeout (float, optional): Maximum time to wait in seconds
+
+        Returns:
+            bool: True if the condition holds, False if stopped or timed out
+        """
+        with self._condition:
+            result = self._condition.wait_for(lambda: not self._running or predicate(), timeout)
+            return bool(result) and self._running
+
+    def wait_while_paused(self, timeout=None):
+        """
+        Block while the process is paused.
+
+        Returns:
+            bool: True once running and not paused, False if stopped or timed out
+        """
+        with self._condition:
+            if self._paused and self._pause_latency is None and self.pause_requested_at is not None:
+                self._pause_latency = time.monotonic() - self.pause_requested_at
+        return self.wait_for(lambda: not self._paused, timeout)
+
+    def take_pause_latency(self):
+        """
+        Get and clear the time from the last pause request until a wait held on it.
+
+        Returns:
+            float: Seconds, or None if no pause was honoured since the last call
+        """
+        with self._condition:
+            latency, self._pause_latency = self._pause_latency, None
+            if latency is not None:
+                self.pause_requested_at = None
+            return latency
+
+    def sleep(self, seconds):
+        """
+        Sleep unless the process is stopped first.
+
+        Returns:
+            bool: True if the full time passed, False if stopped
+        """
+        deadline = time.monotonic() + seconds
+        with self._condition:
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+            return False
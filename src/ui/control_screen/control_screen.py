@@ -8,6 +8,7 @@ import numpy as np
 from ui.custom_widgets import ImageWidget
 from utils.helpers import run_async
 import time
+import os
 from processAutomationController.processAutomationController import ProcessAutomationController
 from ui.layer_management.layer_queue_widget import LayerQueueWidget
 from ui.laser_parameters.laser_parameters_dialog import LaserParametersDialog
@@ -200,6 +201,19 @@ class ControlScreen(QWidget):
             # Layer queue widget
             self.layer_queue_widget = LayerQueueWidget()
             multi_layer_layout.addWidget(self.layer_queue_widget)
+
+            # Optional per-layer parameter schedule; builds leave the card's parameters alone without one
+            schedule_layout = QHBoxLayout()
+            self.parameter_schedule_label = QLabel("Parameter schedule: none")
+            schedule_layout.addWidget(self.parameter_schedule_label)
+            self.select_schedule_btn = QPushButton("Select Schedule")
+            self.select_schedule_btn.clicked.connect(self.select_parameter_schedule)
+            schedule_layout.addWidget(self.select_schedule_btn)
+            self.clear_schedule_btn = QPushButton("Clear Schedule")
+            self.clear_schedule_btn.clicked.connect(self.clear_parameter_schedule)
+            self.clear_schedule_btn.setEnabled(False)
+            schedule_layout.addWidget(self.clear_schedule_btn)
+            multi_layer_layout.addLayout(schedule_layout)
             
             # Start/resume buttons
             buttons_layout = QHBoxLayout()
@@ -265,9 +279,30 @@ class ControlScreen(QWidget):
         folder_path = QFileDialog.getExistingDirectory(self, "Select Layers Folder")
         if folder_path:
             layer_files = self.main_window.multi_layer_controller.load_layer_files(folder_path)
+            self.layer_queue_widget.geometry_index = self.main_window.scancard.geometry_index
             self.layer_queue_widget.set_layer_files(layer_files)
             self.start_multi_print_btn.setEnabled(len(layer_files) > 0)
 
+    def select_parameter_schedule(self):
+        """Open a file dialog to pick the per-layer parameter schedule of the next builds."""
+        schedule_file, _ = QFileDialog.getOpenFileName(self, "Select Parameter Schedule", "", "Parameter Schedules (*.yaml *.yml)")
+        if not schedule_file:
+            return
+        total_layers = self.main_window.multi_layer_controller.layer_manager.total_layers
+        try:
+            self.main_window.process_automation_controller.set_parameter_schedule_file(schedule_file, total_layers)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Parameter Schedule", str(e))
+            return
+        self.parameter_schedule_label.setText(f"Parameter schedule: {os.path.basename(schedule_file)}")
+        self.clear_schedule_btn.setEnabled(True)
+
+    def clear_parameter_schedule(self):
+        """Build without a parameter schedule."""
+        self.main_window.process_automation_controller.set_parameter_schedule_file(None)
+        self.parameter_schedule_label.setText("Parameter schedule: none")
+        self.clear_schedule_btn.setEnabled(False)
+
     def start_multi_layer_print(self):
         """Start the multi-layer print process."""
         self.main_window.multi_layer_controller.start_multi_layer_print()
@@ -328,12 +363,12 @@ class ControlScreen(QWidget):
 
     def update_setpoint(self, value):
         """Update the chamber temperature setpoint in the PrinterStatus model."""
-        self.main_window.printer_status.chamberTemperatureSetpoint = value
+        self.main_window.printer_status.setChamberTemperatureSetpoint(value)
         print(f"Chamber temperature setpoint updated to {value}")
 
     def cooldown(self):
         """Cooldown the chamber."""
-        self.main_window.printer_status.chamberTemperatureSetpoint = 0
+        self.main_window.printer_status.setChamberTemperatureSetpoint(0)
         self.chamberTempSpinBox.setValue(0)
 
     def setStep(self, stepRate):
@@ -7,6 +7,7 @@ import numpy as np
 import pyqtgraph as pg
 from ui.custom_widgets import ImageWidget
 from utils.helpers import run_async  # Import the run_async decorator
+from layerManager.buildTimeEstimator import BuildTimeEstimator
 
 class HomeScreen(QWidget):
     def __init__(self, main_window):
@@ -49,6 +50,12 @@ class HomeScreen(QWidget):
         self.volumeTempBar = self.findChild(QProgressBar, "volumeTempBar")
         self.chamberTempBar = self.findChild(QProgressBar, "chamberTempBar")
 
+        # Remaining build time, shown under the print progress bar
+        self.buildEstimateLabel = QLabel("", self)
+        self.buildEstimateLabel.setFont(self.printProgressBar.font())
+        progress_layout = self.printProgressBar.parentWidget().layout()
+        progress_layout.insertWidget(progress_layout.indexOf(self.printProgressBar) + 1, self.buildEstimateLabel)
+
         # Initialize additional widget elements (graph and camera feed areas)
         self.chamberTempGraphWidget = self.findChild(QWidget, "chamberTempGraphWidget")
         self.layerPreviewWidget = self.findChild(QWidget, "layerPreviewWidget")
@@ -71,6 +78,7 @@ class HomeScreen(QWidget):
         self.main_window.printer_status.temperatures_updated.connect(self.update_thermal_camera_widget)
         self.main_window.printer_status.rgb_frame_updated.connect(self.update_rgb_camera_widget)
         self.main_window.printer_status.maxtemp_updated.connect(self.update_max_temp_label)  # Connect the maxtemp_updated signal
+        self.main_window.printer_status.build_estimate_updated.connect(self.update_build_estimate_label)
 
         # Initialize the plot for max temperature
         self.max_temp_plot = pg.PlotWidget()
@@ -89,14 +97,17 @@ class HomeScreen(QWidget):
         self.main_window.process_automation_controller.start_printing_sequence()
 
     def toggle_printing(self):
+        controller = self.main_window.process_automation_controller
         if self.playPauseButton.isChecked():
             if self.is_paused:
                 self.is_paused = False
+                controller.resume()
             else:
-                self.main_window.process_automation_controller.process_running = True
+                controller.process_running = True
                 self.start_printing_sequence()  # Call the decorated method
         else:
             self.is_paused = True  # Set the pause flag
+            controller.pause()
 
     def stop_printing(self):
         self.main_window.process_automation_controller.stop_process()
@@ -121,6 +132,11 @@ class HomeScreen(QWidget):
         self.maxTempLabel.setText(f"Max Temp: {max_temp:.2f}°C")
         self.update_max_temp_plot(max_temp)
 
+    @pyqtSlot(dict)
+    def update_build_estimate_label(self, estimate):
+        """Slot to show the remaining build time and finish time."""
+        self.buildEstimateLabel.setText(BuildTimeEstimator.format_estimate(estimate))
+
     def update_max_temp_plot(self, max_temp):
         """Update the max temperature plot with the new value."""
         self.max_temp_data.append(max_temp)
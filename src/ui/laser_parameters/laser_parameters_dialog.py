@@ -2,12 +2,22 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QTabWidget, QWidget,
                              QFormLayout, QLabel, QDoubleSpinBox, QSpinBox, 
                              QComboBox, QCheckBox, QDialogButtonBox, QGroupBox,
                              QScrollArea, QMessageBox, QProgressDialog, QHBoxLayout)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 import yaml
 import os
 import re
 
 class LaserParametersDialog(QDialog):
+    # Results of background scancard jobs, delivered to the GUI thread; the first
+    # argument is the job id so results of a superseded job are ignored
+    parameters_loaded = pyqtSignal(int, str, object)   # job id, "marking"/"fill", result
+    layer_validated = pyqtSignal(int, int, object)     # job id, layer, validation result
+    validation_finished = pyqtSignal(int)
+    apply_submitted = pyqtSignal(int, object, object)  # job id, write futures by cache key, download future
+    layer_applied = pyqtSignal(int, object, object)    # job id, cache key, write result
+    apply_finished = pyqtSignal(int)
+    download_finished = pyqtSignal(int)
+
     def __init__(self, scancard, parent=None, layer_count=0):
         super().__init__(parent)
         
@@ -315,81 +325,133 @@ class LaserParametersDialog(QDialog):
         # Add the options layout
         main_layout.addLayout(apply_options_layout)
         
+        # Progress of background jobs
+        self.status_label = QLabel("")
+        main_layout.addWidget(self.status_label)
+
         # Dialog Buttons
-        button_box = QDialogButtonBox(
+        self.button_box = QDialogButtonBox(
             QDialogButtonBox.Save | QDialogButtonBox.Cancel
         )
-        button_box.accepted.connect(self.save_parameters)
-        button_box.rejected.connect(self.reject)
-        main_layout.addWidget(button_box)
-        
+        self.button_box.accepted.connect(self.save_parameters)
+        self.button_box.rejected.connect(self.reject)
+        main_layout.addWidget(self.button_box)
+
+        # Background job state; results are only ever handled on the GUI thread
+        self._job_id = 0
+        self._job = None
+        self._pending_loads = 0
+        self.progress = None
+        self.parameters_loaded.connect(self._on_parameters_loaded, Qt.QueuedConnection)
+        self.layer_validated.connect(self._on_layer_validated, Qt.QueuedConnection)
+        self.validation_finished.connect(self._on_validation_finished, Qt.QueuedConnection)
+        self.apply_submitted.connect(self._on_apply_submitted, Qt.QueuedConnection)
+        self.layer_applied.connect(self._on_layer_applied, Qt.QueuedConnection)
+        self.apply_finished.connect(self._on_apply_finished, Qt.QueuedConnection)
+        self.download_finished.connect(self._on_download_finished, Qt.QueuedConnection)
+
         # Initialize scancard and load parameters
         self.scancard = scancard
         self.load_parameters()
 
         
     
+    def _emit(self, signal, *args):
+        """Emit a result signal from a worker thread; ignored once the dialog is gone."""
+        try:
+            signal.emit(*args)
+        except RuntimeError:
+            pass
+
+    def _set_busy(self, busy, message=""):
+        """Lock the form and Save button while a scancard job runs."""
+        self.tab_widget.setEnabled(not busy)
+        self.button_box.button(QDialogButtonBox.Save).setEnabled(not busy)
+        self.status_label.setText(message)
+
     def load_parameters(self):
-        """Load parameters from scancard and update UI."""
+        """Load parameters from scancard in the background and update UI as they arrive."""
+        self._job_id += 1
+        job_id = self._job_id
+
+        def task():
+            # Marking parameters for layer 1 and fill parameters for index 1, from the cache when already read
+            cache = self.scancard.parameter_cache
+            cache.get_mark_parameters(1).add_done_callback(
+                lambda f: self._emit(self.parameters_loaded, job_id, "marking", f.result()))
+            cache.get_fill_parameters(1, 1).add_done_callback(
+                lambda f: self._emit(self.parameters_loaded, job_id, "fill", f.result()))
+
+        def failed(f):
+            if f.exception() is not None:
+                for kind in ("marking", "fill"):
+                    self._emit(self.parameters_loaded, job_id, kind, {"ret_value": -1, "error": str(f.exception())})
+
         try:
-            # Get the marking parameters for layer 1
-            future = self.scancard.get_markParameters_by_layer(1)
-            response = future.result()
-            
-            if response and response.get("ret_value") == 1:
-                data = response.get("response", {}).get("data", {})
-                
-                # Update UI with marking parameters
-                self.mark_speed_spinbox.setValue(data.get("markSpeed", 3000))
-                self.jump_speed_spinbox.setValue(data.get("jumpSpeed", 5000))
-                self.jump_delay_spinbox.setValue(data.get("jumpDelay", 100))
-                self.laser_on_delay_spinbox.setValue(data.get("laserOnDelay", 100))
-                self.polygon_delay_spinbox.setValue(data.get("polygonDelay", 100))
-                self.laser_off_delay_spinbox.setValue(data.get("laserOffDelay", 100))
-                self.polygon_killer_time_spinbox.setValue(data.get("polygonKillerTime", 100))
-                self.laser_frequency_spinbox.setValue(data.get("laserFrequency", 100))
-                self.current_spinbox.setValue(data.get("current", 100))
-                self.first_pulse_killer_length_spinbox.setValue(data.get("firstPulseKillerLength", 100))
-                self.pulse_width_spinbox.setValue(data.get("pulseWidth", 100))
-                self.first_pulse_width_spinbox.setValue(data.get("firstPulseWidth", 100))
-                self.increment_step_spinbox.setValue(data.get("incrementStep", 100))
-            
-            # Get the fill parameters for index 1
-            future = self.scancard.get_entity_fill_property_by_index(1, 1)
-            response = future.result()
-            
-            if response and response.get("ret_value") == 1:
-                data = response.get("response", {}).get("data", {})
-                
-                # Update UI with fill parameters
-                self.fill_mode_combobox.setCurrentIndex(data.get("fill_mode", 0))
-                self.equal_distance_checkbox.setChecked(data.get("bEqualDistance", False))
-                self.second_fill_checkbox.setChecked(data.get("bSecondFill", False))
-                self.rotate_angle_checkbox.setChecked(data.get("bRotateAngle", False))
-                self.fill_as_one_checkbox.setChecked(data.get("bFillAsOne", False))
-                self.more_intact_checkbox.setChecked(data.get("bMoreIntact", False))
-                self.fill_3d_checkbox.setChecked(data.get("bFill3D", False))
-                self.loop_num_spinbox.setValue(data.get("loopNum", 1))
-                self.fill_mark_times_spinbox.setValue(data.get("iFillMarkTimes", 1))
-                self.cur_mark_times_spinbox.setValue(data.get("iCurMarkTimes", 12))
-                self.layer_id_spinbox.setValue(data.get("layerId", 1))
-                self.fill_space_spinbox.setValue(data.get("fillSpace", 100))
-                self.fill_angle_spinbox.setValue(data.get("fillAngle", 100))
-                self.fill_edge_offset_spinbox.setValue(data.get("fillEdgeOffset", 100))
-                self.fill_start_offset_spinbox.setValue(data.get("fillStartOffset", 100))
-                self.fill_end_offset_spinbox.setValue(data.get("fillEndOffset", 100))
-                self.fill_line_reduction_spinbox.setValue(data.get("fillLineReduction", 100))
-                self.loop_space_spinbox.setValue(data.get("loopSpace", 100))
-                self.second_angle_spinbox.setValue(data.get("secondAngle", 100))
-                self.rotate_angle_spinbox.setValue(data.get("dRotateAngle", 100))
-            
+            # Submitting commands waits for the command queue, so it is done off the GUI thread
+            self._pending_loads = 2
+            self._set_busy(True, "Loading parameters from Scancard...")
+            self.scancard.job_executor.submit(task).add_done_callback(failed)
         except Exception as e:
+            self._set_busy(False)
             QMessageBox.warning(
                 self,
                 "Parameter Load Error",
                 f"Failed to load parameters from Scancard: {str(e)}"
             )
             self.reset_to_defaults()
+
+    def _on_parameters_loaded(self, job_id, kind, response):
+        """Slot receiving the marking or fill parameters read by load_parameters."""
+        if job_id != self._job_id:
+            return
+        self._pending_loads -= 1
+        if self._pending_loads == 0:
+            self._set_busy(False)
+
+        if not response or response.get("ret_value") != 1:
+            self.status_label.setText(f"Could not read {kind} parameters: "
+                                      f"{response.get('error', response.get('ret_value')) if response else 'no reply'}")
+            return
+
+        data = response.get("response", {}).get("data", {})
+        if kind == "marking":
+            # Update UI with marking parameters
+            self.mark_speed_spinbox.setValue(data.get("markSpeed", 3000))
+            self.jump_speed_spinbox.setValue(data.get("jumpSpeed", 5000))
+            self.jump_delay_spinbox.setValue(data.get("jumpDelay", 100))
+            self.laser_on_delay_spinbox.setValue(data.get("laserOnDelay", 100))
+            self.polygon_delay_spinbox.setValue(data.get("polygonDelay", 100))
+            self.laser_off_delay_spinbox.setValue(data.get("laserOffDelay", 100))
+            self.polygon_killer_time_spinbox.setValue(data.get("polygonKillerTime", 100))
+            self.laser_frequency_spinbox.setValue(data.get("laserFrequency", 100))
+            self.current_spinbox.setValue(data.get("current", 100))
+            self.first_pulse_killer_length_spinbox.setValue(data.get("firstPulseKillerLength", 100))
+            self.pulse_width_spinbox.setValue(data.get("pulseWidth", 100))
+            self.first_pulse_width_spinbox.setValue(data.get("firstPulseWidth", 100))
+            self.increment_step_spinbox.setValue(data.get("incrementStep", 100))
+        else:
+            # Update UI with fill parameters
+            self.fill_mode_combobox.setCurrentIndex(data.get("fill_mode", 0))
+            self.equal_distance_checkbox.setChecked(data.get("bEqualDistance", False))
+            self.second_fill_checkbox.setChecked(data.get("bSecondFill", False))
+            self.rotate_angle_checkbox.setChecked(data.get("bRotateAngle", False))
+            self.fill_as_one_checkbox.setChecked(data.get("bFillAsOne", False))
+            self.more_intact_checkbox.setChecked(data.get("bMoreIntact", False))
+            self.fill_3d_checkbox.setChecked(data.get("bFill3D", False))
+            self.loop_num_spinbox.setValue(data.get("loopNum", 1))
+            self.fill_mark_times_spinbox.setValue(data.get("iFillMarkTimes", 1))
+            self.cur_mark_times_spinbox.setValue(data.get("iCurMarkTimes", 12))
+            self.layer_id_spinbox.setValue(data.get("layerId", 1))
+            self.fill_space_spinbox.setValue(data.get("fillSpace", 100))
+            self.fill_angle_spinbox.setValue(data.get("fillAngle", 100))
+            self.fill_edge_offset_spinbox.setValue(data.get("fillEdgeOffset", 100))
+            self.fill_start_offset_spinbox.setValue(data.get("fillStartOffset", 100))
+            self.fill_end_offset_spinbox.setValue(data.get("fillEndOffset", 100))
+            self.fill_line_reduction_spinbox.setValue(data.get("fillLineReduction", 100))
+            self.loop_space_spinbox.setValue(data.get("loopSpace", 100))
+            self.second_angle_spinbox.setValue(data.get("secondAngle", 100))
+            self.rotate_angle_spinbox.setValue(data.get("dRotateAngle", 100))
     
     def reset_to_defaults(self):
         """Set default parameter values."""
@@ -430,10 +492,9 @@ class LaserParametersDialog(QDialog):
         self.second_angle_spinbox.setValue(100)
         self.rotate_angle_spinbox.setValue(100)
     
-    def save_parameters(self):
-        """Save parameters to scancard with improved error handling and cancellation support."""
-        # Collect marking parameters
-        marking_params = {
+    def collect_marking_parameters(self):
+        """Collect marking parameters from the form."""
+        return {
             "markSpeed": self.mark_speed_spinbox.value(),
             "jumpSpeed": self.jump_speed_spinbox.value(),
             "jumpDelay": self.jump_delay_spinbox.value(),
@@ -448,9 +509,10 @@ class LaserParametersDialog(QDialog):
             "firstPulseWidth": self.first_pulse_width_spinbox.value(),
             "incrementStep": self.increment_step_spinbox.value()
         }
-        
-        # Collect fill parameters
-        fill_params = {
+
+    def collect_fill_parameters(self):
+        """Collect fill parameters from the form."""
+        return {
             "fill_mode": self.fill_mode_combobox.currentIndex(),
             "bEqualDistance": self.equal_distance_checkbox.isChecked(),
             "bSecondFill": self.second_fill_checkbox.isChecked(),
@@ -472,208 +534,355 @@ class LaserParametersDialog(QDialog):
             "secondAngle": self.second_angle_spinbox.value(),
             "dRotateAngle": self.rotate_angle_spinbox.value()
         }
-        
+
+    def save_parameters(self):
+        """
+        Save parameters to scancard as a background job.
+        Layers are validated, then written in one pipelined batch followed by a download.
+        Results arrive through queued signals that drive the progress dialog; nothing
+        here waits on the card.
+        """
+        # Check if we should apply to all layers
+        apply_all = self.apply_all_layers_checkbox.isChecked()
+        max_layer = self.max_layer_spinbox.value() if apply_all else 1
+
+        self._job_id += 1
+        self._job = {
+            "id": self._job_id,
+            "phase": "validating",
+            "marking": self.collect_marking_parameters(),
+            "fill": self.collect_fill_parameters(),
+            "apply_all": apply_all,
+            "layers": list(range(1, max_layer + 1)),
+            "valid": [],
+            "invalid": [],
+            "futures": {},
+            "results": {},
+            "download": None,
+            "cancelled": False,
+        }
+        job_id = self._job_id
+
+        # Create progress dialog
+        self.progress = QProgressDialog("Validating layers...", "Cancel", 0, max_layer, self)
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(0)
+        self.progress.setAutoClose(False)
+        self.progress.setAutoReset(False)
+        self.progress.canceled.connect(self.cancel_job)
+        self.progress.setValue(0)
+        self.progress.show()
+        self._set_busy(True, "Validating layers...")
+
         try:
-            # Check if we should apply to all layers
-            apply_all = self.apply_all_layers_checkbox.isChecked()
-            max_layer = self.max_layer_spinbox.value() if apply_all else 1
-            
-            if apply_all:
-                # Create progress dialog
-                progress = QProgressDialog("Validating layers...", "Cancel", 0, max_layer, self)
-                progress.setWindowModality(Qt.WindowModal)
-                progress.setMinimumDuration(0)
-                progress.setValue(0)
-                progress.show()
-                
-                # First validate all layers and entities exist
-                valid_layers = []
-                invalid_layers = []
-                
-                for layer in range(1, max_layer + 1):
-                    if progress.wasCanceled():
-                        if valid_layers:
-                            # Ask user if they want to proceed with validated layers only
-                            reply = QMessageBox.question(
-                                self, 
-                                "Validation Canceled", 
-                                f"Continue with {len(valid_layers)} validated layers only?",
-                                QMessageBox.Yes | QMessageBox.No, 
-                                QMessageBox.No
-                            )
-                            if reply != QMessageBox.Yes:
-                                progress.close()
-                                return
-                        else:
-                            progress.close()
-                            return
-                    
-                    progress.setValue(layer)
-                    progress.setLabelText(f"Validating layer {layer} of {max_layer}...")
-                    
-                    # Validate layer and entity
-                    future = self.scancard.validate_layer_entity(layer)
-                    result = future.result()
-                    
-                    if result.get("valid", False):
-                        valid_layers.append(layer)
-                    else:
-                        invalid_layers.append((layer, result.get("message", "Unknown error")))
-                
-                # Report validation results
-                if invalid_layers:
-                    message = "The following layers could not be validated:\n\n"
-                    message += "\n".join([f"Layer {layer}: {msg}" for layer, msg in invalid_layers])
-                    message += "\n\nDo you want to continue with valid layers only?"
-                    
-                    reply = QMessageBox.question(
-                        self, 
-                        "Validation Results", 
-                        message,
-                        QMessageBox.Yes | QMessageBox.No, 
-                        QMessageBox.No
-                    )
-                    if reply != QMessageBox.Yes:
-                        progress.close()
-                        return
-                
-                # Proceed with valid layers only
-                if not valid_layers:
-                    QMessageBox.critical(
-                        self,
-                        "Validation Error",
-                        "No valid layers found to apply parameters to."
-                    )
-                    progress.close()
-                    return
-                
-                # Reset progress for applying parameters
-                progress.setLabelText("Applying parameters...")
-                progress.setRange(0, len(valid_layers))
-                progress.setValue(0)
-                
-                # Track failures
-                failures = []
-                successful_layers = []
-                
-                # Apply to valid layers
-                for i, layer in enumerate(valid_layers):
-                    if progress.wasCanceled():
-                        if successful_layers:
-                            reply = QMessageBox.question(
-                                self, 
-                                "Operation Canceled", 
-                                f"Parameters were applied to {len(successful_layers)} layers.\n\n"
-                                "Do you want to download these changes to the device?",
-                                QMessageBox.Yes | QMessageBox.No, 
-                                QMessageBox.Yes
-                            )
-                            if reply == QMessageBox.Yes:
-                                break  # Continue to download step
-                            else:
-                                progress.close()
-                                return  # Cancel without downloading
-                        else:
-                            progress.close()
-                            return
-                    
-                    progress.setValue(i)
-                    progress.setLabelText(f"Applying parameters to layer {layer}...")
-                    
-                    # Update marking parameters for the current layer
-                    future = self.scancard.set_markParameters_by_layer(layer, marking_params)
-                    response = future.result()
-                    
-                    if not response or response.get("ret_value") != 1:
-                        failures.append(f"Layer {layer} marking parameters")
-                        continue
-                    
-                    # Update fill parameters for the current entity in the current layer
-                    future = self.scancard.set_entity_fill_property_by_index(layer, 1, fill_params)
-                    response = future.result()
-                    
-                    if not response or response.get("ret_value") != 1:
-                        failures.append(f"Layer {layer} fill parameters")
-                        continue
-                    
-                    successful_layers.append(layer)
-                
-                # Download parameters to apply changes
-                progress.setLabelText("Downloading parameters to device...")
-                progress.setValue(len(valid_layers))
-                
-                future = self.scancard.download_parameters()
-                response = future.result()
-                
-                if not response or response.get("ret_value") != 1:
-                    failures.append("Downloading parameters")
-                
-                progress.setValue(len(valid_layers))
-                progress.close()
-                
-                # Report results
-                if failures:
-                    QMessageBox.warning(
-                        self,
-                        "Parameter Update Warning",
-                        f"Parameters were applied to {len(successful_layers)} out of {len(valid_layers)} layers, but with some failures:\n" + 
-                        "\n".join(failures)
-                    )
-                else:
-                    QMessageBox.information(
-                        self,
-                        "Success",
-                        f"Parameters applied to {len(successful_layers)} layers successfully"
-                    )
-            else:
-                # Apply only to layer 1 (original behavior)
-                # Validate layer 1 first
-                future = self.scancard.validate_layer_entity(1)
-                result = future.result()
-                
-                if not result.get("valid", False):
-                    QMessageBox.critical(
-                        self,
-                        "Validation Error",
-                        f"Cannot apply parameters to layer 1: {result.get('message', 'Unknown error')}"
-                    )
-                    return
-                
-                future = self.scancard.set_markParameters_by_layer(1, marking_params)
-                response = future.result()
-                
-                if not response or response.get("ret_value") != 1:
-                    raise Exception("Failed to set marking parameters")
-                
-                future = self.scancard.set_entity_fill_property_by_index(1, 1, fill_params)
-                response = future.result()
-                
-                if not response or response.get("ret_value") != 1:
-                    raise Exception("Failed to set fill parameters")
-                
-                future = self.scancard.download_parameters()
-                response = future.result()
-                
-                if not response or response.get("ret_value") != 1:
-                    raise Exception("Failed to download parameters")
-                
-                QMessageBox.information(
-                    self,
-                    "Success",
-                    "Parameters saved to layer 1 successfully"
-                )
-            
-            # Save to YAML for future reference
-            self.save_to_yaml(marking_params, fill_params)
-            
-            self.accept()
-            
+            # Validate all layers and entities exist, in one pipelined batch
+            futures, aggregate = self.scancard.validate_layers(
+                1, max_layer,
+                on_result=lambda layer, result: self._emit(self.layer_validated, job_id, layer, result))
+            self._job["futures"] = futures
+            aggregate.add_done_callback(lambda f: self._emit(self.validation_finished, job_id))
         except Exception as e:
+            self._finish_job()
             QMessageBox.critical(
                 self,
                 "Parameter Update Error",
                 f"Failed to update parameters: {str(e)}"
             )
+
+    def cancel_job(self):
+        """Cancel the running job; commands not sent to the card yet are dropped."""
+        job = self._job
+        if job is None or job["cancelled"]:
+            return
+        job["cancelled"] = True
+        for future in job["futures"].values():
+            future.cancel()
+        if job["download"] is not None:
+            job["download"].cancel()
+        self.status_label.setText("Cancelling...")
+        if job["phase"] == "applying" and not job["submitted"]:
+            # Finished by _on_apply_submitted once the batch exists
+            return
+        if job["phase"] == "validating":
+            self._on_validation_finished(job["id"])
+        else:
+            self._on_apply_finished(job["id"])
+
+    def _finish_job(self):
+        if self.progress is not None:
+            self.progress.canceled.disconnect(self.cancel_job)
+            self.progress.close()
+            self.progress = None
+        self._job = None
+        self._set_busy(False)
+
+    def _on_layer_validated(self, job_id, layer, result):
+        """Slot receiving the validation result of one layer."""
+        job = self._job
+        if job is None or job_id != job["id"] or job["phase"] != "validating":
+            return
+        if result.get("valid", False):
+            job["valid"].append(layer)
+        else:
+            job["invalid"].append((layer, result.get("message", "Unknown error")))
+        done = len(job["valid"]) + len(job["invalid"])
+        self.progress.setValue(done)
+        self.progress.setLabelText(f"Validated layer {layer} ({done} of {len(job['layers'])})...")
+
+    def _on_validation_finished(self, job_id):
+        """Slot run once validation completed or was cancelled; asks how to go on and starts writing."""
+        job = self._job
+        if job is None or job_id != job["id"] or job["phase"] != "validating":
+            return
+        if not job["cancelled"] and len(job["valid"]) + len(job["invalid"]) < len(job["layers"]):
+            return
+        job["phase"] = "confirming"
+        valid_layers = sorted(job["valid"])
+
+        if job["cancelled"]:
+            if not valid_layers:
+                self._finish_job()
+                return
+            # Ask user if they want to proceed with validated layers only
+            reply = QMessageBox.question(
+                self,
+                "Validation Canceled",
+                f"Continue with {len(valid_layers)} validated layers only?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                self._finish_job()
+                return
+            job["cancelled"] = False
+
+        # Report validation results
+        if job["invalid"]:
+            if not job["apply_all"]:
+                QMessageBox.critical(
+                    self,
+                    "Validation Error",
+                    f"Cannot apply parameters to layer 1: {job['invalid'][0][1]}"
+                )
+                self._finish_job()
+                return
+            message = "The following layers could not be validated:\n\n"
+            message += "\n".join([f"Layer {layer}: {msg}" for layer, msg in sorted(job["invalid"])])
+            message += "\n\nDo you want to continue with valid layers only?"
+            reply = QMessageBox.question(
+                self,
+                "Validation Results",
+                message,
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                self._finish_job()
+                return
+
+        # Proceed with valid layers only
+        if not valid_layers:
+            QMessageBox.critical(
+                self,
+                "Validation Error",
+                "No valid layers found to apply parameters to."
+            )
+            self._finish_job()
+            return
+
+        self._start_apply(valid_layers)
+
+    def _start_apply(self, valid_layers):
+        """Update the cache for every valid layer and write only what changed, in one batch."""
+        job = self._job
+        job_id = job["id"]
+        job["phase"] = "applying"
+        job["valid"] = valid_layers
+        job["results"] = {}
+
+        self.progress.setLabelText("Applying parameters...")
+        self.progress.setRange(0, len(valid_layers))
+        self.progress.setValue(0)
+        self.status_label.setText("Applying parameters...")
+
+        cache = self.scancard.parameter_cache
+        for layer in valid_layers:
+            cache.set_mark_parameters(layer, job["marking"])
+            cache.set_fill_parameters(layer, 1, job["fill"])
+
+        def task():
+            # The batch waits for the command queue, so it is submitted off the GUI thread
+            try:
+                futures, aggregate = cache.flush()
+            except Exception as e:
+                self._emit(self.apply_submitted, job_id, None, e)
+                return
+            download = futures.pop(cache.DOWNLOAD_KEY, None)
+            # Queued after apply_submitted, so the slot knows the futures before any result
+            self._emit(self.apply_submitted, job_id, futures, download)
+            for key, future in futures.items():
+                future.add_done_callback(
+                    lambda f, key=key: self._emit(self.layer_applied, job_id, key, None if f.cancelled() else f.result()))
+            aggregate.add_done_callback(lambda f: self._emit(self.apply_finished, job_id))
+
+        job["submitted"] = False
+        self.scancard.job_executor.submit(task)
+
+    def _on_apply_submitted(self, job_id, futures, download):
+        """Slot receiving the write futures of the batch started by _start_apply."""
+        job = self._job
+        if futures is None:
+            # The batch could not be started; download holds the error
+            if job is not None and job_id == job["id"]:
+                self._finish_job()
+                QMessageBox.critical(
+                    self,
+                    "Parameter Update Error",
+                    f"Failed to update parameters: {str(download)}"
+                )
+            return
+        if job is None or job_id != job["id"] or job["phase"] != "applying":
+            # Closed or superseded meanwhile; drop what has not been sent yet
+            for future in futures.values():
+                future.cancel()
+            if download is not None:
+                download.cancel()
+            return
+        job["futures"] = futures
+        job["download"] = download
+        job["submitted"] = True
+        if job["cancelled"]:
+            # Cancelled before the batch was submitted
+            job["cancelled"] = False
+            self.cancel_job()
+
+    def _on_layer_applied(self, job_id, key, result):
+        """Slot receiving the result of one parameter write."""
+        job = self._job
+        if job is None or job_id != job["id"] or job["phase"] != "applying":
+            return
+        job["results"][key] = result
+        # Layers without a write were unchanged; count a layer once all its writes answered
+        layer = key[1]
+        cache = self.scancard.parameter_cache
+        keys = [k for k in ((cache.MARK, layer), (cache.FILL, layer, 1)) if k in job["futures"]]
+        if all(k in job["results"] for k in keys):
+            done = sum(1 for l in job["valid"]
+                       if all(k in job["results"] for k in ((cache.MARK, l), (cache.FILL, l, 1)) if k in job["futures"]))
+            self.progress.setValue(done)
+            self.progress.setLabelText(f"Applied parameters to layer {layer} ({done} of {len(job['valid'])})...")
+
+    def _on_apply_finished(self, job_id):
+        """Slot run once all writes answered or were cancelled; reports partial results."""
+        job = self._job
+        if job is None or job_id != job["id"] or job["phase"] != "applying":
+            return
+        cache = self.scancard.parameter_cache
+        if not job["cancelled"] and not all(f.done() for f in job["futures"].values()):
+            return
+        job["phase"] = "reporting"
+
+        successful_layers, failures, not_sent = [], [], []
+        for layer in job["valid"]:
+            outcome = "ok"
+            for key, label in (((cache.MARK, layer), "marking"), ((cache.FILL, layer, 1), "fill")):
+                future = job["futures"].get(key)
+                if future is None:
+                    continue
+                if future.cancelled():
+                    outcome = "not sent"
+                elif not future.done():
+                    outcome = outcome if outcome != "ok" else "pending"
+                elif future.result().get("ret_value") != 1:
+                    failures.append(f"Layer {layer} {label} parameters")
+                    outcome = "failed"
+            if outcome == "ok":
+                successful_layers.append(layer)
+            elif outcome in ("not sent", "pending"):
+                not_sent.append(layer)
+
+        if job["cancelled"]:
+            # The queued download was cancelled with the writes; send one for the applied layers if wanted
+            if successful_layers:
+                reply = QMessageBox.question(
+                    self,
+                    "Operation Canceled",
+                    f"Parameters were applied to {len(successful_layers)} layers.\n\n"
+                    "Do you want to download these changes to the device?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.Yes
+                )
+                if reply == QMessageBox.Yes:
+                    job["summary"] = (successful_layers, failures, not_sent)
+                    self.progress.setLabelText("Downloading parameters to device...")
+                    self.status_label.setText("Downloading parameters to device...")
+
+                    def task():
+                        if job_id != self._job_id:
+                            return  # the dialog was closed meanwhile
+                        job["download"] = self.scancard.download_parameters()
+                        job["download"].add_done_callback(lambda f: self._emit(self.download_finished, job_id))
+
+                    self.scancard.job_executor.submit(task)
+                    return
+            self._finish_job()
+            return
+
+        # The download was queued behind the writes and has answered with them
+        job["summary"] = (successful_layers, failures, not_sent)
+        self._on_download_finished(job_id)
+
+    def _on_download_finished(self, job_id):
+        """Slot run once the download answered; shows the summary and closes the dialog."""
+        job = self._job
+        if job is None or job_id != job["id"] or "summary" not in job:
+            return
+        successful_layers, failures, not_sent = job.pop("summary")
+        download = job["download"]
+        if download is not None:
+            response = None if download.cancelled() else download.result()
+            if not response or response.get("ret_value") != 1:
+                failures.append("Downloading parameters")
+        valid_count = len(job["valid"])
+        marking_params, fill_params, apply_all = job["marking"], job["fill"], job["apply_all"]
+        self._finish_job()
+
+        # Report results
+        if failures or not_sent:
+            message = f"Parameters were applied to {len(successful_layers)} out of {valid_count} layers"
+            if failures:
+                message += ", but with some failures:\n" + "\n".join(failures)
+            if not_sent:
+                message += f"\n\nNot sent or not confirmed: layers {', '.join(str(layer) for layer in not_sent)}"
+            if not apply_all:
+                QMessageBox.critical(self, "Parameter Update Error", f"Failed to update parameters: {message}")
+                return
+            QMessageBox.warning(self, "Parameter Update Warning", message)
+        else:
+            QMessageBox.information(
+                self,
+                "Success",
+                f"Parameters applied to {len(successful_layers)} layers successfully" if apply_all
+                else "Parameters saved to layer 1 successfully"
+            )
+
+        # Save to YAML for future reference
+        self.save_to_yaml(marking_params, fill_params)
+
+        self.accept()
+
+    def reject(self):
+        """Cancel any running job before closing."""
+        self._job_id += 1
+        if self._job is not None:
+            self._job["cancelled"] = True
+            for future in self._job["futures"].values():
+                future.cancel()
+            if self._job["download"] is not None:
+                self._job["download"].cancel()
+            self._finish_job()
+        super().reject()
+
     def get_last_used_layer_folder(self):
         """
         Retrieve the last used layer folder path.
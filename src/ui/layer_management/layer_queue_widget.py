@@ -18,6 +18,7 @@ class LayerQueueWidget(QWidget):
         super().__init__()
         self.layer_files = []
         self.current_layer_index = -1
+        self.geometry_index = None  # LayerGeometryIndex used for layer details, if set
         
         # Configure logging
         self.logger = logging.getLogger(__name__)
@@ -193,6 +194,12 @@ class LayerQueueWidget(QWidget):
             details = f"Layer: {index + 1}/{len(self.layer_files)}\n"
             details += f"Filename: {filename}\n"
             details += f"Full path: {filepath}\n"
+            geometry = self.geometry_index.get(filepath) if self.geometry_index is not None else None
+            if geometry is not None:
+                details += f"Entities: {geometry.count()}\n"
+                bounds = geometry.bounds()
+                if bounds is not None:
+                    details += f"Extent: {bounds[2] - bounds[0]:.2f} x {bounds[3] - bounds[1]:.2f} mm\n"
             details += f"Status: {'Completed' if index < self.current_layer_index else 'Current' if index == self.current_layer_index else 'Pending'}"
             
             QMessageBox.information(self, "Layer Details", details)
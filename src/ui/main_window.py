@@ -1,11 +1,14 @@
-from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QStackedWidget
+from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QStackedWidget, QMessageBox
 from ui.loading_screen.loading_screen import LoadingScreen
 from ui.tab_screen.tab_screen import TabScreen
 from config import Config
 from models.printer_status import PrinterStatus
-from PyQt5.QtCore import QTimer
 from temperatureController.chamberTemperatureController import ChamberTemperatureController
 from Feeltek.scanCard import Scancard
+from Feeltek.statusService import ScancardStatusService
+from Feeltek.scancardHealth import ScancardHealth
+from Feeltek.laserErrorLogging import LaserErrorCapture
+from Feeltek.geometryIndex import LayerGeometryIndex
 from processAutomationController.processAutomationController import ProcessAutomationController
 from layerManager.layerQueueManager import LayerQueueManager
 from multiLayerPrintController import MultiLayerPrintController
@@ -62,11 +65,21 @@ class MainWindow(QMainWindow):
         else:
             self.moonraker_api = MockMoonrakerAPI()
 
-        self.scancard = Scancard(self) if not Config.DEVELOPMENT_MODE else MockScancard(self)
+        if Config.DEVELOPMENT_MODE and Config.SCANCARD_SIMULATOR_PROFILE:
+            # Exercise the real client against a local simulator instead of the mock
+            from Feeltek.scancardSimulator import ScancardSimulator
+            self.scancard_simulator = ScancardSimulator(profile=Config.SCANCARD_SIMULATOR_PROFILE)
+            self.scancard_simulator.start()
+            self.scancard = Scancard(self)
+        else:
+            self.scancard = Scancard(self) if not Config.DEVELOPMENT_MODE else MockScancard(self)
+
+        # The status service polls fast while marking and backs off while idle
+        self.scancard.status_service.status_changed.connect(self.update_scancard_status)
+        self.scancard.status_service.start()
 
-        self.scancard_timer = QTimer(self)
-        self.scancard_timer.timeout.connect(self.handle_scancard_status_change)
-        self.scancard_timer.start(5000)
+        # Commands fail fast while the card host is down; show it instead of stalling
+        self.scancard.health.state_changed.connect(self.update_scancard_health)
 
         self.load_loading_screen()
         self.load_tab_screen()
@@ -80,6 +93,7 @@ class MainWindow(QMainWindow):
         self.layer_queue_manager = LayerQueueManager()
         self.print_state_manager = PrintStateManager()
         self.multi_layer_controller = MultiLayerPrintController(self)
+        self.multi_layer_controller.print_aborted_signal.connect(self.show_print_aborted)
 
     def update_progress_bar(self, value):
         self.home_screen.printProgressBar.setValue(value)
@@ -119,39 +133,23 @@ class MainWindow(QMainWindow):
     def stop_scancard_mark(self):
         self.scancard.stop_mark()
         
-    @run_async
-    def handle_scancard_status_change(self):
-        future = self.scancard.get_working_status()
-        future.add_done_callback(self.update_scancard_status)
-
-    def update_scancard_status(self, future):
+    def update_scancard_status(self, status: str):
         try:
-            status = future.result()
             self.printer_status.updateScancardStatus(status)
             self.control_screen.scanCardStatusLabel.setText("Status: " + self.printer_status.scancard_status)
         except Exception as e:
             print(f"Failed to update Scancard status: {e}")
 
-    def open_scancard_file(self, file_path: str):
-        close_future = self.scancard.close_file()
-        close_future.add_done_callback(lambda f: self._handle_close_file_result_and_open(f, file_path))
-
-    def _handle_close_file_result_and_open(self, future, file_path: str):
-        try:
-            result = future.result()
-            if result is None:
-                raise ValueError("No result returned from close_file command")
-            meaning = self._get_scancard_return_meaning(result.get("ret_value"))
-            print(f"Close file result: {result} - {meaning}")
-        except Exception as e:
-            print(f"Failed to close Scancard file: {e}")
-        finally:
-            print("Executing finally block")
-            self._open_scancard_file(file_path)
+    def update_scancard_health(self, state: str):
+        if state == ScancardHealth.DOWN:
+            self.update_scancard_status(f"Disconnected ({self.scancard.health.last_error})")
+        elif state == ScancardHealth.CONNECTED:
+            # Replace the disconnected text with the actual status
+            self.scancard.status_service.request_status()
 
-    def _open_scancard_file(self, file_path: str):
+    def open_scancard_file(self, file_path: str):
         print(f"Opening Scancard file: {file_path}")
-        future = self.scancard.open_file(file_path)
+        future = self.scancard.load_file(file_path)
         future.add_done_callback(lambda f: self._handle_open_file_result(f, file_path))
 
     def _handle_open_file_result(self, future, file_path: str):
@@ -159,8 +157,11 @@ class MainWindow(QMainWindow):
             result = future.result()
             if result is None:
                 raise ValueError("No result returned from open_file command")
-            meaning = self._get_scancard_return_meaning(result.get("ret_value"))
-            print(f"Open file result: {result} - {meaning}")
+            if result.get("skipped"):
+                print("Identical file already loaded on the Scancard, open skipped")
+            else:
+                meaning = self._get_scancard_return_meaning(result.get("ret_value"))
+                print(f"Open file result: {result} - {meaning}")
             self.update_file_info_label(file_path)
         except Exception as e:
             print(f"Failed to open Scancard file: {e}")
@@ -177,6 +178,10 @@ class MainWindow(QMainWindow):
     def update_file_info_label(self, file_path: str):
         self.home_screen.fileInfoLabel.setText(file_path)
         
+    def show_print_aborted(self, reason):
+        """Tell the user why a multi-layer print stopped or did not start."""
+        QMessageBox.warning(self, "Print Aborted", reason)
+
     def resume_print_from_saved_state(self, state_file):
         """Resume a print from a saved state file."""
         if self.multi_layer_controller.load_print_state(state_file):
@@ -204,9 +209,16 @@ class MockMoonrakerAPI:
 class MockScancard:
     def __init__(self, main_window):
         print("MockScancard initialized")
+        self.timeout = 5
+        self.status_service = ScancardStatusService(self)
+        self.health = ScancardHealth("localhost", 50000)
+        self.error_capture = LaserErrorCapture(self)
+        self.geometry_index = LayerGeometryIndex()
+        self.geometry_changed = False
 
     def start_mark(self):
         print("MockScancard.start_mark called")
+        self.status_service.notify_mark_started()
         return MockFuture()
 
     def stop_mark(self):
@@ -215,7 +227,7 @@ class MockScancard:
 
     def get_working_status(self):
         print("MockScancard.get_working_status called")
-        return MockFuture()
+        return MockFuture("Waiting")
 
     def open_file(self, file_path):
         print(f"MockScancard.open_file called with file_path: {file_path}")
@@ -225,12 +237,25 @@ class MockScancard:
         print("MockScancard.close_file called")
         return MockFuture()
 
+    def load_file(self, file_path):
+        print(f"MockScancard.load_file called with file_path: {file_path}")
+        return MockFuture()
+
+    def log_info(self, message):
+        print(f"MockScancard info: {message}")
+
+    def log_error(self, message):
+        print(f"MockScancard error: {message}")
+
 
 class MockFuture:
+    def __init__(self, value=None):
+        self.value = value if value is not None else {"ret_value": 1}  # Simulated response
+
     def add_done_callback(self, callback):
         print("MockFuture.add_done_callback called")
         callback(self)
 
-    def result(self):
+    def result(self, timeout=None):
         print("MockFuture.result called")
-        return {"ret_value": 1}  # Simulated response
\ No newline at end of file
+        return self.value
\ No newline at end of file
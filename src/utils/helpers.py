@@ -66,4 +66,88 @@ def run_async(func):
         QThreadPool.globalInstance().start(worker)
         return worker
 
-    return async_func
\ No newline at end of file
+    return async_func
+
+class QtAsyncBridge(QObject):
+    """
+    Runs an asyncio event loop in a background thread for Qt code.
+    Coroutines, e.g. those of Feeltek.asyncScancard.AsyncScancard, are scheduled on the
+    loop from any thread. Results come back either as concurrent futures, which
+    worker threads can block on, or through a queued signal so that callbacks run on
+    the thread owning the bridge, normally the GUI thread.
+    Methods:
+        start(self): Starts the event loop thread.
+        stop(self): Stops the event loop and joins its thread.
+        submit(self, coro): Schedules a coroutine and returns a concurrent future.
+        call(self, coro, on_result, on_error): Schedules a coroutine and calls back on the Qt thread.
+        run_sync(self, coro, timeout): Schedules a coroutine and waits for its result.
+    """
+
+    _finished = pyqtSignal(object, object, object)  # callback, result, error
+
+    def __init__(self):
+        super().__init__()
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        self._finished.connect(self._deliver)
+
+    def start(self):
+        """Start the event loop thread."""
+        import threading
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.loop.run_forever, name="asyncio-bridge", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the event loop and join its thread."""
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the loop.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the coroutine's result.
+        """
+        import asyncio
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, on_result=None, on_error=None):
+        """
+        Schedule a coroutine and hand its outcome to a callback on the bridge's thread.
+
+        Args:
+            coro: The coroutine to run.
+            on_result: Called with the result.
+            on_error: Called with the exception, printed if not given.
+
+        Returns:
+            concurrent.futures.Future: The future of the scheduled coroutine.
+        """
+        future = self.submit(coro)
+
+        def done(f):
+            if f.cancelled():
+                return
+            error = f.exception()
+            if error is not None:
+                self._finished.emit(on_error or (lambda e: print(f"Error in coroutine: {e}")), None, error)
+            elif on_result is not None:
+                self._finished.emit(on_result, f.result(), None)
+
+        future.add_done_callback(done)
+        return future
+
+    def run_sync(self, coro, timeout=None):
+        """Schedule a coroutine and block until it finishes. Not for use on the GUI thread."""
+        return self.submit(coro).result(timeout=timeout)
+
+    def _deliver(self, callback, result, error):
+        callback(error if error is not None else result)
@@ -0,0 +1,85 @@
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from Feeltek.laserErrorLogging import LaserErrorCapture, LaserErrorLogger
+from Feeltek.scanCard import Scancard
+from Feeltek.scancardSimulator import ScancardSimulator
+
+
+def free_port():
+    """Get a local port nothing listens on."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+def connect_scancard(host, port, directory):
+    """Create a Scancard whose geometry index and laser log live in directory."""
+    card = Scancard(host=host, port=port)
+    card.geometry_index.directory = os.path.join(directory, "geometry_index")
+    # Errors are logged after the test returns, so the log file must not follow the working directory
+    card.error_capture = LaserErrorCapture(card, logger=LaserErrorLogger())
+    return card
+
+
+def close_scancard(card):
+    card.status_service.stop()
+    card.connection_pool.close_all()
+    card.priority_pool.close_all()
+    for executor in (card.executor, card.job_executor, card.priority_executor, card.hash_executor):
+        executor.shutdown(wait=True)
+    card.error_capture._logger.stop()
+
+
+class RecordingSimulator(ScancardSimulator):
+    """Simulator that keeps every request it handled, in order."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def handle_command(self, request):
+        self.requests.append(request)
+        return super().handle_command(request)
+
+    def commands(self, cmd=None):
+        """Names of the handled commands, or the requests of one command."""
+        if cmd is None:
+            return [request.get("cmd") for request in self.requests]
+        return [request for request in self.requests if request.get("cmd") == cmd]
+
+
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    # Laser logs, print states and profiles are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def simulator():
+    sim = RecordingSimulator(port=free_port(), profile="ideal", entity_count=4, seed=0)
+    sim.start()
+    yield sim
+    sim.stop()
+
+
+@pytest.fixture
+def scancard(simulator, tmp_path):
+    card = connect_scancard(simulator.host, simulator.port, str(tmp_path))
+    yield card
+    close_scancard(card)
+
+
+@pytest.fixture
+def layer_file(tmp_path):
+    """Factory writing a layer file with the given content."""
+    def make(name, content=b"layer"):
+        path = tmp_path / name
+        path.write_bytes(content)
+        return str(path)
+    return make
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from layerManager.buildTimeEstimator import BuildTimeEstimator
+from layerManager.layerProfiler import LayerProfiler
+
+
+def write_profile(directory, name, layers):
+    with open(directory / name, "w") as f:
+        for layer, phases in enumerate(layers, 1):
+            f.write(json.dumps({"layer": layer, "phases": phases}) + "\n")
+
+
+def test_history_sums_per_phase_means_without_pauses(tmp_path):
+    write_profile(tmp_path, "build_a.jsonl", [
+        {"mark": 2.0, "recoat": 3.0, "prepare": 1.0, "pause": 100.0},
+        {"mark": 4.0, "recoat": 3.0, "heat_wait": 6.0},
+    ])
+    estimator = BuildTimeEstimator()
+    assert estimator.load_history(LayerProfiler(str(tmp_path))) == pytest.approx(9.0)
+    assert estimator.history_phase_times == {"mark": 3.0, "recoat": 3.0, "heat_wait": 3.0}
+
+    estimator.start_build(10)
+    assert estimator.estimate()["remaining"] == pytest.approx(90.0)
+
+
+def test_without_history_the_live_layers_are_used(tmp_path):
+    estimator = BuildTimeEstimator(alpha=0.5)
+    assert estimator.load_history(LayerProfiler(str(tmp_path))) is None
+    estimator.start_build(4)
+    assert estimator.estimate()["remaining"] is None
+    estimator.layer_finished(10.0)
+    estimator.layer_finished(20.0)
+    estimate = estimator.estimate()
+    assert estimate["layer_time"] == 15.0
+    assert estimate["remaining"] == pytest.approx(30.0)
+    assert estimate["progress"] == 50
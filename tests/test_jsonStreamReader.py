@@ -0,0 +1,98 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from Feeltek.connectionPool import ScancardConnection
+from Feeltek.jsonStreamReader import JsonStreamReader
+
+# Trailing bytes of these GB18030 characters are an ASCII backslash and closing brace
+TRICKY_TEXT = "乗亇 {\"[名称]\"}"
+
+
+def reply(cmd="get_name_by_index", **data):
+    return {"sid": 0, "cmd": cmd, "ret": 1, "data": data}
+
+
+def encode(document):
+    return json.dumps(document, ensure_ascii=False).encode("GB18030")
+
+
+def test_document_split_across_every_byte():
+    document = reply(name=TRICKY_TEXT)
+    reader = JsonStreamReader()
+    raw = encode(document)
+    for byte in raw[:-1]:
+        reader.feed(bytes([byte]))
+        assert reader.next_document() is None
+    reader.feed(raw[-1:])
+    assert reader.next_document() == document
+    assert reader.buffered == 0
+
+
+def test_pipelined_documents_split_at_every_offset():
+    documents = [reply(index=index, name=TRICKY_TEXT) for index in range(3)]
+    raw = b"".join(encode(document) for document in documents)
+    for split in range(1, len(raw)):
+        reader = JsonStreamReader()
+        received = []
+        for chunk in (raw[:split], raw[split:]):
+            reader.feed(chunk)
+            document = reader.next_document()
+            while document is not None:
+                received.append(document)
+                document = reader.next_document()
+        assert received == documents, split
+
+
+def test_read_document_keeps_the_rest_for_the_next_reply():
+    first, second = reply(index=1), reply(index=2)
+    chunks = [encode(first)[:5], encode(first)[5:] + encode(second)[:7], encode(second)[7:]]
+    reader = JsonStreamReader()
+    recv = lambda bufsize: chunks.pop(0)
+    assert reader.read_document(recv) == first
+    assert reader.read_document(recv) == second
+
+
+def test_read_document_fails_when_the_peer_closes_mid_reply():
+    chunks = [encode(reply())[:10], b""]
+    with pytest.raises(ConnectionResetError):
+        JsonStreamReader().read_document(lambda bufsize: chunks.pop(0))
+
+
+def test_oversized_reply_is_rejected():
+    reader = JsonStreamReader(max_document_size=64)
+    reader.feed(b'{"data": "' + b"x" * 100)
+    with pytest.raises(ValueError):
+        reader.next_document()
+
+
+def test_connection_reads_a_reply_sent_in_pieces():
+    document = reply(name=TRICKY_TEXT)
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("localhost", 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            conn.recv(1024)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            raw = encode(document)
+            for offset in range(0, len(raw), 3):
+                conn.sendall(raw[offset:offset + 3])
+                time.sleep(0.001)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    conn = ScancardConnection("localhost", server.getsockname()[1], 2)
+    try:
+        conn.connect()
+        conn.send(json.dumps({"sid": 0, "cmd": "get_name_by_index"}).encode())
+        assert conn.read_response() == document
+    finally:
+        conn.close()
+        server.close()
+    thread.join(2)
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from layerManager.layerExecutionEngine import LayerExecutionEngine
+from processAutomationController.processEvents import ProcessEvents
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.002)
+    return predicate()
+
+
+@pytest.fixture
+def build(simulator, scancard, layer_file):
+    """Engine whose mark step marks the loaded layer on the simulator."""
+    simulator.mark_times = [("*", 0.3)]
+    scancard.load_file(layer_file("layer.emd")).result(timeout=5)
+    calls = []
+
+    def mark(index, token):
+        calls.append(("mark", index))
+        if scancard.start_mark().result(timeout=5)["ret_value"] != 1:
+            return False
+        token.wait_for(lambda: False, timeout=0.3)
+        return True
+
+    def step(name):
+        def run(index, token):
+            calls.append((name, index))
+            return True
+        return run
+
+    steps = {name: step(name) for name in ("prepare_wait", "heat_wait", "recoat", "checkpoint")}
+    steps["mark"] = mark
+    steps["setup"] = lambda token: calls.append(("setup", None)) or True
+    steps["finish"] = lambda token: calls.append(("finish", None)) or True
+    engine = LayerExecutionEngine(steps, ProcessEvents())
+    engine.calls = calls
+    yield engine
+    engine.abort("Test finished")
+    engine.executor.shutdown(wait=True)
+
+
+def test_build_runs_every_step_of_every_layer(build, scancard):
+    result = build.run(2, cancel_callbacks=[scancard.stop_mark]).result(timeout=10)
+    assert result["state"] == build.COMPLETED
+    assert result["layers_done"] == 2
+    layer_steps = [("prepare_wait", 0), ("heat_wait", 0), ("mark", 0), ("recoat", 0), ("checkpoint", 0)]
+    assert build.calls == [("setup", None)] + layer_steps + [(name, 1) for name, _ in layer_steps] + [("finish", None)]
+
+
+def test_resumed_build_skips_setup(build, scancard):
+    result = build.run(2, start_index=1, cancel_callbacks=[scancard.stop_mark]).result(timeout=10)
+    assert result["layers_done"] == 1
+    assert build.calls[0] == ("prepare_wait", 1)
+    assert build.calls[-1] == ("finish", None)
+
+
+def test_abort_during_mark_stops_the_laser(build, simulator, scancard):
+    future = build.run(3, cancel_callbacks=[scancard.stop_mark])
+    assert wait_until(lambda: build.current_step == "mark" and simulator.commands("start_mark"))
+    build.abort("Operator abort")
+    result = future.result(timeout=5)
+    assert result["state"] == build.ABORTED
+    assert result["reason"] == "Operator abort"
+    assert result["abort_latency"] < 0.1
+    assert wait_until(lambda: simulator.commands("stop_mark"))
+    assert len(simulator.commands("start_mark")) == 1
+    assert ("recoat", 0) not in build.calls
+    assert scancard.status_service.refresh(timeout=5) == "Waiting"
+
+
+def test_failed_step_stops_the_laser(build, simulator, scancard):
+    def recoat(index, token):
+        build.calls.append(("recoat", index))
+        return index == 0
+
+    build.steps["recoat"] = recoat
+    result = build.run(3, cancel_callbacks=[scancard.stop_mark]).result(timeout=10)
+    assert result["state"] == build.FAILED
+    assert result["layers_done"] == 1
+    assert "recoat" in result["reason"]
+    assert wait_until(lambda: len(simulator.commands("stop_mark")) == 1)
+    assert ("finish", None) not in build.calls
+
+
+def test_step_exception_stops_the_laser(build, simulator, scancard):
+    def heat_wait(index, token):
+        raise RuntimeError("Heater not responding")
+
+    build.steps["heat_wait"] = heat_wait
+    result = build.run(2, cancel_callbacks=[scancard.stop_mark]).result(timeout=10)
+    assert result["state"] == build.FAILED
+    assert result["reason"] == "Heater not responding"
+    assert wait_until(lambda: len(simulator.commands("stop_mark")) == 1)
+    assert simulator.commands("start_mark") == []
+
+
+def test_pause_holds_before_the_next_step(build, scancard):
+    future = build.run(2, cancel_callbacks=[scancard.stop_mark])
+    assert wait_until(lambda: build.current_step == "mark")
+    build.pause()
+    assert wait_until(lambda: build.state == build.PAUSED)
+    held = len(build.calls)
+    time.sleep(0.1)
+    assert len(build.calls) == held
+    build.resume()
+    result = future.result(timeout=10)
+    assert result["state"] == build.COMPLETED
+    assert len(result["pause_latencies"]) == 1
@@ -0,0 +1,25 @@
+from layerManager.layerProfiler import LayerProfiler
+
+
+def test_layer_total_leaves_out_overlapping_phases(tmp_path):
+    profiler = LayerProfiler(str(tmp_path))
+    profile_file = profiler.start_build()
+    for phase, seconds in (("prepare", 1.5), ("heat_wait", 2.0), ("mark", 3.0), ("recoat", 4.0), ("pause", 5.0)):
+        profiler.record(1, phase, seconds)
+    record = profiler.end_layer(1)
+    assert record["total"] == 14.0
+    assert record["phases"]["prepare"] == 1.5
+    assert LayerProfiler.load(profile_file) == [record]
+
+
+def test_summary_per_phase(tmp_path):
+    profiler = LayerProfiler(str(tmp_path))
+    profiler.start_build()
+    for layer, seconds in ((1, 1.0), (2, 3.0)):
+        profiler.record(layer, "mark", seconds)
+        profiler.record(layer, "recoat", 1.0)
+        profiler.end_layer(layer)
+    summary = profiler.summary()
+    assert summary["mark"]["mean"] == 2.0
+    assert summary["mark"]["worst_layer"] == 2
+    assert summary["recoat"]["share"] == 2.0 / 6.0
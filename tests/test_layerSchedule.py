@@ -0,0 +1,63 @@
+import pytest
+
+from Feeltek.layerSchedule import LayerParameterSchedule
+
+
+def schedule():
+    return LayerParameterSchedule.from_dict({
+        "marking_parameters": {"markSpeed": 1000.0, "current": 10.0},
+        "fill_parameters": {"fillSpace": 0.1},
+        "fill_entities": [0, 2],
+        "layer_ranges": [
+            {"first": 1, "last": 3, "name": "first layers", "marking_parameters": {"markSpeed": 500.0}},
+            {"first": 3, "marking_parameters": {"current": 12.0}, "fill_parameters": {"fillAngle": 90.0}},
+        ],
+    })
+
+
+def test_compiled_layers_merge_ranges_in_order():
+    compiled = schedule().compile(5)
+    assert compiled.parameters_for(1) == ({"markSpeed": 500.0, "current": 10.0}, {"fillSpace": 0.1})
+    assert compiled.parameters_for(3) == ({"markSpeed": 500.0, "current": 12.0}, {"fillSpace": 0.1, "fillAngle": 90.0})
+    assert compiled.parameters_for(5) == ({"markSpeed": 1000.0, "current": 12.0}, {"fillSpace": 0.1, "fillAngle": 90.0})
+    with pytest.raises(ValueError):
+        compiled.parameters_for(6)
+
+
+def test_validation_lists_every_problem():
+    bad = LayerParameterSchedule({"markSpeed": -1.0, "laserPower": 3.0}, {"fill_mode": 7})
+    bad.add_range(4, 2, marking={"current": 1.0})
+    with pytest.raises(ValueError) as error:
+        bad.compile(3)
+    message = str(error.value)
+    for problem in ("'markSpeed' must not be negative", "unknown parameter 'laserPower'",
+                    "'fill_mode' must be 0 to 4", "no target entities", "invalid layer range 4-2"):
+        assert problem in message
+
+
+def test_unreadable_schedule_file(tmp_path):
+    path = tmp_path / "schedule.yaml"
+    path.write_text("- just\n- a list\n")
+    with pytest.raises(ValueError):
+        LayerParameterSchedule.from_yaml(str(path))
+    with pytest.raises(ValueError):
+        LayerParameterSchedule.from_yaml(str(tmp_path / "missing.yaml"))
+
+
+def test_apply_writes_only_the_change_between_layers(simulator, scancard, layer_file):
+    compiled = schedule().compile(5)
+    scancard.load_file(layer_file("layer.emd")).result(timeout=5)
+
+    compiled.apply(scancard, 2).result(timeout=5)
+    marks = simulator.commands("set_markParameters_by_layer")
+    fills = simulator.commands("set_entity_fill_property_by_index")
+    assert len(marks) == 1
+    assert sorted(request["data"]["index"] for request in fills) == [0, 2]
+
+    compiled.apply(scancard, 3).result(timeout=5)
+    marks = simulator.commands("set_markParameters_by_layer")
+    fills = simulator.commands("set_entity_fill_property_by_index")
+    assert marks[-1]["data"] == {"layer_id": 1, "current": 12.0}
+    assert [request["data"] for request in fills[2:]] == [
+        {"index": 0, "in_index": 1, "fillAngle": 90.0}, {"index": 2, "in_index": 1, "fillAngle": 90.0}]
+    assert simulator.mark_parameters[1] == {"markSpeed": 500.0, "current": 12.0}
@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+
+from Feeltek.markOrderOptimizer import MarkOrderOptimizer, nearest_neighbour, path_cost, two_opt
+
+X_POSITIONS = [50.0, -50.0, 40.0, -40.0, 30.0, -30.0]
+
+
+def place_entities(simulator):
+    simulator.entity_count = len(X_POSITIONS)
+    for index, x in enumerate(X_POSITIONS):
+        simulator.positions[index] = {"xPos": x, "yPos": 0.0, "zPos": 0.0, "xSize": 5.0, "ySize": 5.0, "zSize": 0.0}
+
+
+def test_two_opt_never_lengthens_the_path():
+    points = np.random.default_rng(0).random((41, 2)) * 100
+    cost = np.linalg.norm(points[:, None] - points[None], axis=2)
+    greedy = nearest_neighbour(cost)
+    improved = two_opt(cost, greedy)
+    assert sorted(improved) == list(range(40))
+    assert path_cost(cost, improved) <= path_cost(cost, greedy) <= path_cost(cost, list(range(40)))
+
+
+def test_plan_shortens_jumps_and_is_cached(simulator, scancard, layer_file):
+    scancard.load_file(layer_file("layer.emd")).result(timeout=5)
+    place_entities(simulator)
+    optimizer = MarkOrderOptimizer(scancard)
+    plan = optimizer.plan()
+    assert sorted(plan["order"]) == list(range(len(X_POSITIONS)))
+    assert plan["optimized_distance"] < plan["file_order_distance"]
+    reads = len(simulator.commands("get_pos_size_by_index"))
+    assert optimizer.plan()["order"] == plan["order"]
+    assert len(simulator.commands("get_pos_size_by_index")) == reads
+
+
+def test_mark_layer_marks_each_entity_once_without_flooding_status(simulator, scancard, layer_file):
+    simulator.mark_times = [("*", 1.8)]
+    scancard.load_file(layer_file("layer.emd")).result(timeout=5)
+    place_entities(simulator)
+    # A slow galvo makes the saved jumps worth marking entity by entity
+    optimizer = MarkOrderOptimizer(scancard, jump_speed=1.0)
+    result = optimizer.mark_layer().result(timeout=10)
+    assert result["ok"]
+    assert result["plan"]["use_order"]
+    marked = [request["data"]["index"] for request in simulator.commands("mark_by_index")]
+    assert marked == result["plan"]["order"]
+    assert simulator.commands("start_mark") == []
+    # Polling every 20 ms would query the 0.3 s entities about fifteen times each
+    assert len(simulator.commands("get_working_status")) <= 6 * len(X_POSITIONS)
+
+
+def test_mark_layer_falls_back_to_start_mark(simulator, scancard, layer_file):
+    simulator.mark_times = [("*", 0.2)]
+    scancard.load_file(layer_file("layer.emd")).result(timeout=5)
+    place_entities(simulator)
+    result = MarkOrderOptimizer(scancard).mark_layer().result(timeout=10)
+    assert result["ok"]
+    assert not result["plan"]["use_order"]
+    assert len(simulator.commands("start_mark")) == 1
+    assert simulator.commands("mark_by_index") == []
+
+
+def test_mark_layer_stops_between_entities(simulator, scancard, layer_file):
+    simulator.mark_times = [("*", 3.0)]
+    scancard.load_file(layer_file("layer.emd")).result(timeout=5)
+    place_entities(simulator)
+    stop = []
+    optimizer = MarkOrderOptimizer(scancard, jump_speed=1.0)
+    future = optimizer.mark_layer(should_stop=lambda: bool(stop))
+    deadline = time.monotonic() + 5
+    while not simulator.commands("mark_by_index") and time.monotonic() < deadline:
+        time.sleep(0.005)
+    stop.append(True)
+    scancard.status_service.interrupt()
+    result = future.result(timeout=5)
+    assert not result["ok"]
+    assert len(simulator.commands("mark_by_index")) == 1
+    scancard.stop_mark().result(timeout=5)
@@ -0,0 +1,64 @@
+from Feeltek.parameterCache import MarkParameterCache
+
+
+def written_fields(simulator, cmd="set_markParameters_by_layer"):
+    return [{k: v for k, v in request["data"].items() if k not in ("layer_id", "index", "in_index")}
+            for request in simulator.commands(cmd)]
+
+
+def test_reads_are_served_from_memory(simulator, scancard):
+    cache = scancard.parameter_cache
+    first = cache.get_mark_parameters(1).result(timeout=5)
+    second = cache.get_mark_parameters(1).result(timeout=5)
+    assert second["cached"]
+    assert second["response"]["data"] == first["response"]["data"]
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert len(simulator.commands("get_markParameters_by_layer")) == 1
+
+
+def test_flush_writes_only_changed_fields(simulator, scancard):
+    cache = scancard.parameter_cache
+    current = cache.get_mark_parameters(1).result(timeout=5)["response"]["data"]
+    changed = cache.set_mark_parameters(1, {"markSpeed": current["markSpeed"], "jumpSpeed": current["jumpSpeed"] + 100})
+    assert changed == 1
+
+    summary = cache.flush()[1].result(timeout=5)
+    assert summary["written"] == [(MarkParameterCache.MARK, 1)]
+    assert written_fields(simulator) == [{"jumpSpeed": current["jumpSpeed"] + 100}]
+    assert len(simulator.commands("download_Parameters")) == 1
+    assert simulator.mark_parameters[1] == {"jumpSpeed": current["jumpSpeed"] + 100}
+
+    # Nothing is dirty any more, so a second flush sends nothing
+    assert cache.dirty_keys() == []
+    assert cache.flush()[1].result(timeout=5) == {"written": [], "failed": [], "download": None}
+    assert len(simulator.commands("set_markParameters_by_layer")) == 1
+
+
+def test_fill_fields_are_written_per_entity(simulator, scancard):
+    cache = scancard.parameter_cache
+    cache.get_fill_parameters(2, 1).result(timeout=5)
+    cache.set_fill_parameters(2, 1, {"fillSpace": 0.05, "fill_mode": 1})
+    cache.flush(download=False)[1].result(timeout=5)
+    assert written_fields(simulator, "set_entity_fill_property_by_index") == [{"fillSpace": 0.05}]
+    assert simulator.commands("download_Parameters") == []
+
+
+def test_failed_write_stays_dirty(simulator, scancard):
+    cache = scancard.parameter_cache
+    simulator.fail_commands["set_markParameters_by_layer"] = 14
+    cache.set_mark_parameters(1, {"markSpeed": 1200})
+    summary = cache.flush()[1].result(timeout=5)
+    assert summary["failed"] == [(MarkParameterCache.MARK, 1)]
+    assert cache.dirty_keys() == [(MarkParameterCache.MARK, 1)]
+
+    del simulator.fail_commands["set_markParameters_by_layer"]
+    assert cache.flush()[1].result(timeout=5)["written"] == [(MarkParameterCache.MARK, 1)]
+    assert simulator.mark_parameters[1] == {"markSpeed": 1200}
+
+
+def test_opening_a_file_drops_the_cache(simulator, scancard, layer_file):
+    cache = scancard.parameter_cache
+    cache.get_mark_parameters(1).result(timeout=5)
+    scancard.load_file(layer_file("layer1.emd")).result(timeout=5)
+    cache.get_mark_parameters(1).result(timeout=5)
+    assert len(simulator.commands("get_markParameters_by_layer")) == 2
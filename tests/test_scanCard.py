@@ -0,0 +1,75 @@
+import pytest
+
+
+@pytest.mark.parametrize("fault", ["disconnect_rate", "partial_rate"])
+def test_non_idempotent_command_is_not_resent(simulator, scancard, fault):
+    simulator.profile[fault] = 1.0
+    result = scancard.execute_command("start_mark", retry_delay=0.01).result(timeout=10)
+    assert result["ret_value"] == -1
+    assert "not resent" in result["error"]
+    assert len(simulator.commands("start_mark")) == 1
+
+
+def test_idempotent_command_is_retried(simulator, scancard):
+    simulator.profile["disconnect_rate"] = 1.0
+    result = scancard.execute_command("get_entity_count", retries=3, retry_delay=0.01).result(timeout=10)
+    assert result["ret_value"] == -1
+    assert len(simulator.commands("get_entity_count")) == 3
+
+
+
+def test_batch_results_follow_command_order(simulator, scancard):
+    simulator.profile.update(latency=0.001, jitter=0.002)
+    commands = [("get_name_by_index", {"index": index}) for index in range(40)]
+    futures, batch = scancard.execute_batch(commands, pipeline_depth=4)
+    results = batch.result(timeout=10)
+    assert [result["response"]["data"]["name"] for result in results] == [f"entity_{index}" for index in range(40)]
+    assert [future.result() for future in futures] == results
+    assert [request["data"]["index"] for request in simulator.commands("get_name_by_index")] == list(range(40))
+
+
+def test_batch_stops_on_error(simulator, scancard):
+    simulator.fail_commands["set_markParameters_by_layer"] = 14
+    commands = [("get_entity_count", None), ("set_markParameters_by_layer", {"layer_id": 1, "markSpeed": 1000})] \
+        + [("get_name_by_index", {"index": index}) for index in range(20)]
+    results = scancard.execute_batch(commands, stop_on_error=True, pipeline_depth=1)[1].result(timeout=10)
+    assert results[0]["ret_value"] == 1
+    assert results[1]["ret_value"] == 0
+    assert all(result["error"].startswith("Skipped") for result in results[2:])
+    assert simulator.commands("get_name_by_index") == []
+
+
+def test_batch_does_not_resend_unanswered_non_idempotent_commands(simulator, scancard):
+    simulator.profile["disconnect_rate"] = 1.0
+    commands = [("translate_entity_by_index", {"index": index, "x": 1.0, "y": 0.0}) for index in range(3)]
+    results = scancard.execute_batch(commands, retries=3, retry_delay=0.01)[1].result(timeout=10)
+    assert all(result["ret_value"] == -1 and "not resent" in result["error"] for result in results)
+    sent = [request["data"]["index"] for request in simulator.commands("translate_entity_by_index")]
+    assert len(sent) == len(set(sent))
+
+
+def test_identical_layer_file_is_not_reopened(simulator, scancard, layer_file):
+    first = layer_file("layer1.emd", b"same content")
+    second = layer_file("layer2.emd", b"same content")
+    other = layer_file("layer3.emd", b"other content")
+
+    assert scancard.load_file(first).result(timeout=5)["ret_value"] == 1
+    result = scancard.load_file(second).result(timeout=5)
+    assert result["skipped"]
+    assert scancard.current_file == second
+    assert scancard.file_swaps_skipped == 1
+    assert len(simulator.commands("open_file")) == 1
+
+    assert not scancard.load_file(other).result(timeout=5).get("skipped")
+    assert [request["data"]["path"] for request in simulator.commands("open_file")] == [first, other]
+
+
+def test_file_is_reopened_after_losing_the_card(simulator, scancard, layer_file):
+    path = layer_file("layer1.emd")
+    scancard.load_file(path).result(timeout=5)
+    scancard.health.probe_interval = 60
+    for _ in range(scancard.health.failure_threshold):
+        scancard.health.record_failure(ConnectionResetError("reset"))
+    scancard.health.record_success()
+    assert not scancard.load_file(path).result(timeout=5).get("skipped")
+    assert len(simulator.commands("open_file")) == 2
@@ -0,0 +1,65 @@
+import time
+
+from conftest import RecordingSimulator, close_scancard, connect_scancard, free_port
+from Feeltek.scancardHealth import ScancardHealth
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_breaker_transitions(simulator):
+    health = ScancardHealth(simulator.host, simulator.port, failure_threshold=3, probe_interval=0.05)
+    states = []
+    health.add_listener(states.append)
+
+    health.record_failure(ConnectionRefusedError("refused"))
+    assert health.state == health.DEGRADED
+    assert health.allow_request()
+    health.record_success()
+    assert health.state == health.CONNECTED
+
+    for _ in range(3):
+        health.record_failure(ConnectionRefusedError("refused"))
+    assert health.state == health.DOWN
+    assert not health.allow_request()
+    assert health.unavailable_result()["error"] == "Scancard unavailable: refused"
+
+    # The simulator answers the probe, which closes the breaker again
+    assert wait_until(lambda: health.state == health.CONNECTED)
+    assert states == [health.DEGRADED, health.CONNECTED, health.DEGRADED, health.DOWN, health.CONNECTED]
+    stats = health.stats()
+    assert stats["times_opened"] == 1
+    assert stats["probes"] >= 1
+    assert stats["fast_failures"] == 1
+
+
+def test_scancard_fails_fast_while_down_and_recovers(tmp_path):
+    port = free_port()
+    card = connect_scancard("localhost", port, str(tmp_path))
+    card.health.probe_interval = 0.05
+    card.health.max_probe_interval = 0.05
+    simulator = None
+    try:
+        result = card.execute_command("get_entity_count", retries=3, retry_delay=0.01).result(timeout=5)
+        assert result["ret_value"] == -1
+        assert card.health.state == card.health.DOWN
+
+        started = time.monotonic()
+        result = card.execute_command("get_entity_count").result(timeout=5)
+        assert result["error"].startswith("Scancard unavailable")
+        assert time.monotonic() - started < 0.1
+
+        simulator = RecordingSimulator(port=port, profile="ideal")
+        simulator.start()
+        assert wait_until(lambda: card.health.state == card.health.CONNECTED)
+        assert card.execute_command("get_entity_count").result(timeout=5)["ret_value"] == 1
+        assert len(simulator.commands("get_entity_count")) == 1
+    finally:
+        card.health.record_success()
+        close_scancard(card)
+        if simulator is not None:
+            simulator.stop()
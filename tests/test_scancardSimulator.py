@@ -0,0 +1,46 @@
+import json
+import socket
+
+from Feeltek.jsonStreamReader import JsonStreamReader
+
+
+def send(simulator, *requests):
+    """Send requests over one raw connection and read one reply each."""
+    reader = JsonStreamReader()
+    with socket.create_connection((simulator.host, simulator.port), timeout=2) as conn:
+        conn.sendall(b"".join(json.dumps(request).encode() for request in requests))
+        return [reader.read_document(conn.recv) for _ in requests]
+
+
+def test_replies_in_request_order(simulator):
+    replies = send(simulator, {"sid": 0, "cmd": "open_file", "data": {"path": "a.emd"}},
+                   {"sid": 0, "cmd": "get_entity_count"}, {"sid": 0, "cmd": "get_working_status"})
+    assert [reply["cmd"] for reply in replies] == ["open_file", "get_entity_count", "get_working_status"]
+    assert replies[1]["data"]["count"] == simulator.entity_count
+    assert replies[2]["ret"] == 0
+
+
+def test_marking_reports_busy_until_stopped(simulator):
+    replies = send(simulator, {"sid": 0, "cmd": "open_file", "data": {"path": "a.emd"}},
+                   {"sid": 0, "cmd": "start_mark"}, {"sid": 0, "cmd": "start_mark"},
+                   {"sid": 0, "cmd": "get_working_status"}, {"sid": 0, "cmd": "stop_mark"},
+                   {"sid": 0, "cmd": "get_working_status"})
+    assert replies[1]["ret"] == 1
+    assert replies[2]["ret"] == 0  # already marking
+    assert replies[3]["ret"] == 1
+    assert replies[5]["ret"] == 0
+
+
+def test_forced_failure(simulator):
+    simulator.fail_commands["download_Parameters"] = 14
+    reply, error = send(simulator, {"sid": 0, "cmd": "download_Parameters"}, {"sid": 0, "cmd": "get_error"})
+    assert reply["ret"] == 0
+    assert error["ret"] == 14
+
+
+def test_disconnect_fault_closes_without_reply(simulator):
+    simulator.profile["disconnect_rate"] = 1.0
+    with socket.create_connection((simulator.host, simulator.port), timeout=2) as conn:
+        conn.sendall(json.dumps({"sid": 0, "cmd": "get_working_status"}).encode())
+        assert conn.recv(1024) == b""
+    assert simulator.stats["disconnected"] == 1
@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_requests_share_one_query(simulator, scancard):
+    simulator.profile["command_latency"] = {"get_working_status": 0.2}
+    service = scancard.status_service
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = list(pool.map(lambda _: service.request_status(), range(8)))
+    assert len({id(future) for future in futures}) == 1
+    assert futures[0].result(timeout=5) == "Waiting"
+    assert len(simulator.commands("get_working_status")) == 1
+    assert service.merged_requests == 7
+
+    # Once answered, the next request queries again
+    assert service.refresh(timeout=5) == "Waiting"
+    assert len(simulator.commands("get_working_status")) == 2
+
+
+def test_wait_for_mark_complete(simulator, scancard, layer_file):
+    simulator.mark_times = [("*", 0.3)]
+    service = scancard.status_service
+    service.fast_interval = 0.05
+    assert scancard.load_file(layer_file("layer1.emd")).result(timeout=5)["ret_value"] == 1
+    started = time.monotonic()
+    assert scancard.start_mark().result(timeout=5)["ret_value"] == 1
+    assert service.wait_for_mark_complete(timeout=5)
+    assert 0.3 <= time.monotonic() - started < 1.0
+    assert service.status == "Waiting"
+
+
+def test_wait_for_mark_complete_gives_up_on_stop(simulator, scancard, layer_file):
+    simulator.mark_times = [("*", 5.0)]
+    service = scancard.status_service
+    scancard.load_file(layer_file("layer1.emd")).result(timeout=5)
+    scancard.start_mark().result(timeout=5)
+    stop = []
+    started = time.monotonic()
+    ThreadPoolExecutor(max_workers=1).submit(lambda: (time.sleep(0.1), stop.append(True), service.interrupt()))
+    assert not service.wait_for_mark_complete(timeout=5, should_stop=lambda: bool(stop))
+    assert time.monotonic() - started < 1.0
+    scancard.stop_mark().result(timeout=5)
+
+
+def test_listener_errors_go_to_the_scancard_log(simulator, scancard, monkeypatch):
+    errors = []
+    monkeypatch.setattr(scancard, "log_error", errors.append)
+
+    def listener(status):
+        raise RuntimeError("listener broke")
+
+    scancard.status_service.add_listener(listener)
+    assert scancard.status_service.refresh(timeout=5) == "Waiting"
+    # Listeners run in the query's done callback, right after the result is set
+    deadline = time.monotonic() + 2
+    while not errors and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert errors == ["Scancard status listener failed: listener broke"]
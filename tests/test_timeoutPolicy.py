@@ -0,0 +1,42 @@
+import pytest
+
+from Feeltek.timeoutPolicy import TimeoutPolicy
+
+
+def test_timeout_is_learned_from_latency():
+    policy = TimeoutPolicy(min_samples=5, multiplier=3.0, default_limits=(0.1, 10.0))
+    assert policy.timeout_for("get_entity_count") == 10.0
+    for _ in range(5):
+        policy.record_latency("get_entity_count", 0.2)
+    assert policy.timeout_for("get_entity_count") == pytest.approx(0.6)
+
+    # Clamped to the command's floor
+    for _ in range(5):
+        policy.record_latency("get_working_status", 0.001)
+    assert policy.timeout_for("get_working_status") == 0.5
+
+
+def test_timeouts_in_a_row_back_off_until_a_reply():
+    policy = TimeoutPolicy(min_samples=1, default_limits=(0.1, 1.0))
+    policy.record_latency("get_entity_count", 0.1)
+    policy.record_timeout("get_entity_count")
+    assert policy.timeout_for("get_entity_count") == pytest.approx(0.6)
+    policy.record_timeout("get_entity_count")
+    assert policy.timeout_for("get_entity_count") == 1.0
+    policy.record_latency("get_entity_count", 0.1)
+    assert policy.timeout_for("get_entity_count") == pytest.approx(0.3)
+
+
+def test_non_idempotent_commands_keep_their_ceiling():
+    policy = TimeoutPolicy(min_samples=1, default_limits=(0.1, 10.0))
+    policy.record_latency("start_mark", 0.01)
+    assert policy.timeout_for("start_mark") == 10.0
+
+
+def test_scancard_learns_from_simulated_latency(simulator, scancard):
+    simulator.profile["latency"] = 0.01
+    for _ in range(scancard.timeout_policy.min_samples):
+        assert scancard.execute_command("get_entity_count").result(timeout=5)["ret_value"] == 1
+    timeout = scancard.command_timeouts()["get_entity_count"]["timeout"]
+    floor, ceiling = scancard.timeout_policy.default_limits
+    assert floor <= timeout < ceiling